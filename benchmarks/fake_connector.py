@@ -0,0 +1,300 @@
+# benchmarks/fake_connector.py
+"""A local stand-in for `snowflake.connector` serving synthetic catalog rows with configurable latency."""
+import itertools
+import json
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import snowflake.connector
+
+from snowflake_dbml.catalog import TABLE_FIELDS
+from snowflake_dbml.extract import SHOW_ROW_LIMIT
+
+QUERY_IDS = itertools.count()
+# INFORMATION_SCHEMA data types that SHOW COLUMNS reports under another name
+SHOW_DATA_TYPES = {'NUMBER': 'FIXED', 'FLOAT': 'REAL'}
+
+# Rows derived from a catalog, kept across connections and runs so benchmarks don't time their construction
+_derived_rows = {}
+_derived_lock = threading.RLock()  # builders call each other
+
+
+def derived_rows(data, name, build):
+    """Returns `build(data)`, computed once per catalog object and `name`."""
+    with _derived_lock:
+        entry = _derived_rows.setdefault(id(data), (data, {}))
+        if entry[0] is not data:
+            entry = _derived_rows[id(data)] = (data, {})
+        if name not in entry[1]:
+            entry[1][name] = build(data)
+        return entry[1][name]
+
+
+def group_rows(rows, *fields):
+    """Groups `rows` by the tuple of their `fields` values, keeping their order."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row[field] for field in fields), []).append(row)
+    return groups
+
+
+def parse_list(text):
+    return {item.strip().strip("'") for item in text.split(',')}
+
+
+def apply_schema_filters(rows, sql):
+    """Applies the `TABLE_SCHEMA IN/NOT IN` and per-table predicates of an INFORMATION_SCHEMA query."""
+    included = re.search(r"TABLE_SCHEMA IN \(([^)]*)\)", sql)
+    if included:
+        schemas = parse_list(included.group(1))
+        rows = [row for row in rows if row['TABLE_SCHEMA'] in schemas]
+    excluded = re.search(r"TABLE_SCHEMA NOT IN \(([^)]*)\)", sql)
+    if excluded:
+        schemas = parse_list(excluded.group(1))
+        rows = [row for row in rows if row['TABLE_SCHEMA'] not in schemas]
+    tables = set(re.findall(r"c\.TABLE_SCHEMA = '([^']*)' AND c\.TABLE_NAME = '([^']*)'", sql))
+    if tables:
+        rows = [row for row in rows if (row['TABLE_SCHEMA'], row['TABLE_NAME']) in tables]
+    return rows
+
+
+class FakeCursor:
+    """Cursor answering the queries `snowflake_dbml` issues from the connection's catalog."""
+
+    def __init__(self, connection, dict_rows):
+        self.connection = connection
+        self.dict_rows = dict_rows
+        self.description = []
+        self.sfqid = None
+        self._rows = []
+
+    def _run(self, sql):
+        data = self.connection.data
+        command = sql.lstrip()
+        if not command.startswith('SHOW'):
+            self.connection.use_warehouse()
+        if 'RESULT_SCAN' in sql:
+            column, excluded = re.search(r'"(\w+)" NOT IN \(([^)]*)\)', sql).groups()
+            excluded = parse_list(excluded)
+            rows = [row for row in self.connection.last_result if row[column] not in excluded]
+        elif command.startswith('SHOW SCHEMAS'):
+            rows = [{'name': schema} for schema in dict.fromkeys(row['TABLE_SCHEMA'] for row in data['tables'])]
+        elif command.startswith('SHOW PRIMARY KEYS'):
+            rows = self._scope(data['primary_keys'], sql, 'schema_name')
+        elif command.startswith('SHOW IMPORTED KEYS'):
+            rows = self._scope(data['foreign_keys'], sql, 'fk_schema_name')
+        elif command.startswith('SHOW TABLES'):
+            rows = self._scope(derived_rows(data, 'show_tables', lambda data: [show_table(row) for row in table_rows(data) if row['TABLE_TYPE'] != 'VIEW']),
+                               sql, 'schema_name')
+        elif command.startswith('SHOW VIEWS'):
+            rows = self._scope(derived_rows(data, 'show_views', lambda data: [show_view(row) for row in table_rows(data) if row['TABLE_TYPE'] == 'VIEW']),
+                               sql, 'schema_name')
+        elif command.startswith('SHOW COLUMNS'):
+            rows = self._scope(derived_rows(data, 'show_columns', lambda data: [show_column(row) for row in column_rows(data)]), sql, 'schema_name')
+        elif command.startswith('SHOW TERSE OBJECTS'):
+            rows = self._scope(derived_rows(data, 'show_objects', lambda data: [show_object(row) for row in table_rows(data)]), sql, 'schema_name')
+        elif 'AS CANDIDATE' in sql:
+            rows = [validation_row(query) for query in sql.split('\nUNION ALL\n')]
+        elif 'LEFT JOIN' in sql:
+            rows = apply_schema_filters(data['tables'], sql)
+        elif 'INFORMATION_SCHEMA.COLUMNS' in sql:
+            rows = apply_schema_filters(column_rows(data), sql)
+        elif 'INFORMATION_SCHEMA.TABLES' in sql:
+            rows = apply_schema_filters(table_rows(data), sql)
+        else:
+            raise snowflake.connector.errors.ProgrammingError(f"Unsupported query: {sql.strip()[:80]}")
+        if command.startswith('SHOW') and 'KEYS' not in command:
+            rows = self._page(rows, sql)
+        self.connection.last_result = rows
+        self.description = [(name,) for name in (rows[0] if rows else {})]
+        self._rows = rows
+        self.connection.query_count += 1
+
+    @staticmethod
+    def _scope(rows, sql, schema_column):
+        schema = re.search(r'IN SCHEMA "[^"]*"\."([^"]*)"', sql)
+        if schema:
+            return derived_rows(rows, f"by_{schema_column}", lambda rows: group_rows(rows, schema_column)).get((schema.group(1),), [])
+        table = re.search(r'IN (?:TABLE|VIEW) "[^"]*"\."([^"]*)"\."([^"]*)"', sql)
+        if table:
+            return derived_rows(rows, 'by_table', lambda rows: group_rows(rows, schema_column, 'table_name')).get(table.groups(), [])
+        return rows
+
+    def _page(self, rows, sql):
+        """Applies `LIMIT ... FROM` to a SHOW result, and truncates it to the connection's `show_limit` like Snowflake."""
+        page = re.search(r"LIMIT (\d+)(?: FROM '([^']*)')?", sql)
+        if page:
+            rows = sorted(rows, key=lambda row: row['name'])
+            if page.group(2) is not None:
+                rows = [row for row in rows if row['name'] > page.group(2)]
+            rows = rows[:int(page.group(1))]
+        if self.connection.show_limit is not None:
+            rows = rows[:self.connection.show_limit]
+        return rows
+
+    def _convert(self, rows):
+        # New objects per row, as the connector builds them, so peak memory counts the result set
+        return [dict(row) for row in rows] if self.dict_rows else [tuple(row.values()) for row in rows]
+
+    def execute(self, sql, timeout=None):
+        time.sleep(self.connection.latency)
+        self._run(sql)
+        return self
+
+    def execute_async(self, sql):
+        self.sfqid = f"fake-{next(QUERY_IDS)}"
+        self.connection.async_queries[self.sfqid] = (time.monotonic() + self.connection.latency, sql)
+
+    def get_results_from_sfqid(self, sfqid):
+        self._run(self.connection.async_queries.pop(sfqid)[1])
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return self._convert(rows)
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return self._convert(rows)
+
+
+class FakeWarehouse:
+    """
+    Warehouse shared by the connections of one `fake_snowflake` context. It starts suspended: the first query that
+    needs it waits `resume_latency` seconds (concurrent queries wait along), later ones don't.
+    """
+
+    def __init__(self, resume_latency=0.0):
+        self.resume_latency = resume_latency
+        self.resumed = False
+        self._lock = threading.Lock()
+
+    def use(self):
+        with self._lock:
+            if not self.resumed:
+                time.sleep(self.resume_latency)
+                self.resumed = True
+
+
+class FakeConnection:
+    """
+    Connection serving `data` (shaped like `fetch_data` output), sleeping `latency` seconds per query.
+    Queries other than SHOW commands fail like Snowflake's when no `warehouse` was given to `connect`.
+    SHOW commands other than the key ones return at most `show_limit` rows, like Snowflake's, when it is set.
+    """
+
+    def __init__(self, data, latency=0.0, warehouse=None, show_limit=SHOW_ROW_LIMIT):
+        self.data = data
+        self.latency = latency
+        self.warehouse = warehouse
+        self.show_limit = show_limit
+        self.async_queries = {}
+        self.last_result = []
+        self.query_count = 0
+
+    def use_warehouse(self):
+        if self.warehouse is None:
+            raise snowflake.connector.errors.ProgrammingError(
+                "No active warehouse selected in the current session. Select an active warehouse with the 'use warehouse' command.")
+        self.warehouse.use()
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self, dict_rows=cursor_class is not None)
+
+    def get_query_status_throw_if_error(self, sfqid):
+        due, _ = self.async_queries[sfqid]
+        return 'RUNNING' if time.monotonic() < due else 'SUCCESS'
+
+    def is_still_running(self, status):
+        return status == 'RUNNING'
+
+    def close(self):
+        pass
+
+
+def table_rows(data):
+    """Returns the table-level rows of the catalog, one per table."""
+    def build(data):
+        return list({(row['TABLE_SCHEMA'], row['TABLE_NAME']): {field: row[field] for field in TABLE_FIELDS}
+                     for row in data['tables']}.values())
+    return derived_rows(data, 'tables', build)
+
+
+def column_rows(data):
+    """Returns the column-level rows of the catalog, with ordinal positions."""
+    def build(data):
+        positions = {}
+        rows = []
+        for row in data['tables']:
+            key = (row['TABLE_SCHEMA'], row['TABLE_NAME'])
+            positions[key] = positions.get(key, 0) + 1
+            rows.append({'TABLE_SCHEMA': key[0], 'TABLE_NAME': key[1], 'ORDINAL_POSITION': positions[key],
+                         'COLUMN_NAME': row['COLUMN_NAME'], 'DATA_TYPE': row['DATA_TYPE'], 'COMMENT': row['COMMENT']})
+        return rows
+    return derived_rows(data, 'columns', build)
+
+
+def validation_row(query):
+    """
+    Returns the result row of one relationship validation query; about one in four candidates fails, and with
+    approximate counts another one in four references too many values to be decided.
+    """
+    candidate = int(re.search(r'(\d+) AS CANDIDATE', query).group(1))
+    outcome = zlib.crc32(re.sub(r'\d+ AS CANDIDATE', '', query).encode('utf-8')) % 4
+    target = (100000 if outcome == 1 else 1000) if 'APPROX_COUNT_DISTINCT' in query else None
+    return {'CANDIDATE': candidate, 'CHECKED': 1000, 'MISSING': 500 if outcome == 0 else 0, 'TARGET': target}
+
+
+def show_table(row):
+    """Returns the `SHOW TABLES` row for a table-level row."""
+    return {'created_on': row['CREATED'], 'name': row['TABLE_NAME'], 'database_name': 'BENCH', 'schema_name': row['TABLE_SCHEMA'],
+            'kind': 'TABLE', 'comment': row['TABLE_COMMENT'] or '', 'cluster_by': row['CLUSTERING_KEY'] or '',
+            'rows': row['ROW_COUNT'], 'bytes': row['BYTES'], 'owner': row['TABLE_OWNER'], 'retention_time': '1',
+            'automatic_clustering': 'ON' if row['AUTO_CLUSTERING_ON'] == 'YES' else 'OFF', 'change_tracking': 'OFF',
+            'is_external': 'N', 'is_event': 'N', 'is_dynamic': 'Y' if row['IS_DYNAMIC'] == 'YES' else 'N'}
+
+
+def show_view(row):
+    """Returns the `SHOW VIEWS` row for a table-level row."""
+    return {'created_on': row['CREATED'], 'name': row['TABLE_NAME'], 'reserved': '', 'database_name': 'BENCH',
+            'schema_name': row['TABLE_SCHEMA'], 'owner': row['TABLE_OWNER'], 'comment': row['TABLE_COMMENT'] or '',
+            'text': f"create view {row['TABLE_NAME']} as select 1", 'is_secure': 'false', 'is_materialized': 'false'}
+
+
+def show_object(row):
+    """Returns the `SHOW TERSE OBJECTS` row for a table-level row."""
+    return {'created_on': row['CREATED'], 'name': row['TABLE_NAME'], 'kind': 'VIEW' if row['TABLE_TYPE'] == 'VIEW' else 'TABLE',
+            'database_name': 'BENCH', 'schema_name': row['TABLE_SCHEMA']}
+
+
+def show_column(row):
+    """Returns the `SHOW COLUMNS` row for a column-level row."""
+    data_type = {'type': SHOW_DATA_TYPES.get(row['DATA_TYPE'], row['DATA_TYPE']), 'nullable': True}
+    return {'table_name': row['TABLE_NAME'], 'schema_name': row['TABLE_SCHEMA'], 'column_name': row['COLUMN_NAME'],
+            'data_type': json.dumps(data_type), 'null?': 'true', 'default': '', 'kind': 'COLUMN', 'expression': '',
+            'comment': row['COMMENT'] or '', 'database_name': 'BENCH', 'autoincrement': ''}
+
+
+@contextmanager
+def fake_snowflake(data, latency=0.0, resume_latency=0.0, show_limit=SHOW_ROW_LIMIT):
+    """
+    Replaces `snowflake.connector.connect` with one returning `FakeConnection`s over `data`; yields the opened connections.
+    Connections given a warehouse share one that takes `resume_latency` seconds to resume (see `FakeWarehouse`),
+    and truncate SHOW results to `show_limit` rows (none with None).
+    """
+    connections = []
+    original_connect = snowflake.connector.connect
+    warehouse = FakeWarehouse(resume_latency)
+
+    def connect(**connection_params):
+        connection = FakeConnection(data, latency, warehouse if connection_params.get('warehouse') else None, show_limit)
+        connections.append(connection)
+        return connection
+
+    snowflake.connector.connect = connect
+    try:
+        yield connections
+    finally:
+        snowflake.connector.connect = original_connect
@@ -0,0 +1,99 @@
+# benchmarks/import_time.py
+"""
+Checks that importing `snowflake_dbml` and running `snowflake-dbml --help` / `--version` stay cheap:
+no heavy dependency or branch-only module is imported, and the package import fits a time budget (from
+`python -X importtime`). Lists the package modules each one imports.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 100
+
+Exits with status 1 when a check fails.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET_MS = 150  # cumulative import time of the package, best of the runs
+DEFAULT_RUNS = 5
+# Loaded only on the code paths that need them
+HEAVY_MODULES = ('snowflake.connector', 'pydbml', 'dotenv')
+# Imported only by the `run_generator` branches that use them (--serve, --source, --cache-dir, --validate-relationships,
+# --output, ...), along with the standard library modules behind them
+LAZY_MODULES = (
+    'snowflake_dbml.cache', 'snowflake_dbml.changes', 'snowflake_dbml.rules', 'snowflake_dbml.service', 'snowflake_dbml.sources',
+    'snowflake_dbml.validation', 'snowflake_dbml.writer', 'http.server', 'concurrent.futures.process',
+)
+
+SCRIPTS = {
+    'import': "import snowflake_dbml",
+    '--help': "import sys; sys.argv = ['snowflake-dbml', '--help']; from snowflake_dbml.generator import main; main()",
+    '--version': "import sys; sys.argv = ['snowflake-dbml', '--version']; from snowflake_dbml.generator import main; main()",
+}
+IMPORT_TIME_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)")
+
+
+def import_times(script):
+    """
+    Runs `script` under `-X importtime` and returns {module: cumulative import time in microseconds}.
+    Runs from a scratch directory, as `main` writes its log file to the working directory.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (REPO_ROOT, os.environ.get('PYTHONPATH')))))
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], cwd=workdir, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            times[match.group(2)] = int(match.group(1))
+    if result.returncode not in (0, None) and not times:
+        raise RuntimeError(f"Running {script!r} failed: {result.stderr.strip()[-500:]}")
+    return times
+
+
+def check(script, budget_ms, runs):
+    """
+    Returns (best cumulative package import time in ms, package modules imported, list of problems) for one script.
+    """
+    problems = []
+    best = None
+    modules = []
+    for _ in range(runs):
+        times = import_times(script)
+        modules = sorted(module for module in times if module.startswith('snowflake_dbml.'))
+        heavy = sorted(module for module in times if module.startswith(HEAVY_MODULES) or module in LAZY_MODULES)
+        if heavy:
+            problems.append(f"imports {', '.join(heavy[:5])}{' ...' if len(heavy) > 5 else ''}")
+            break
+        package_ms = times.get('snowflake_dbml', 0) / 1000
+        best = package_ms if best is None else min(best, package_ms)
+    if best is not None and best > budget_ms:
+        problems.append(f"package import took {best:.1f}ms, over the {budget_ms}ms budget")
+    return best, modules, problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the import time of snowflake_dbml against a budget.")
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS, help='Allowed cumulative package import time')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help='Runs per check; the fastest is kept')
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for name, script in SCRIPTS.items():
+        best, modules, problems = check(script, args.budget_ms, args.runs)
+        status = 'FAIL ' + '; '.join(problems) if problems else 'ok'
+        print(f"  {name:<10} {best if best is not None else float('nan'):>8.1f}ms  {status}")
+        print(f"  {'':<10} imports {', '.join(module[len('snowflake_dbml.'):] for module in modules) or 'no package modules'}")
+        failed += bool(problems)
+    if failed:
+        print(f"{failed} import checks failed")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
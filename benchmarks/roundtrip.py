@@ -0,0 +1,135 @@
+# benchmarks/roundtrip.py
+"""
+Checks that the streaming writer and `generate_dbml` describe the same model: both outputs are parsed with
+PyDBML and their tables, columns, references, notes, table groups and project are compared.
+
+    python -m benchmarks.roundtrip
+
+The catalog covers the `public` schema (written without a schema prefix), quotes and triple quotes in table
+and column comments, multi-line notes, views and dynamic tables, foreign keys, relationships inferred from
+primary key hints and from relationship rules, and both the row-dict and the streamed `Catalog` input.
+Exits with status 1 when a check fails.
+"""
+import io
+import re
+import sys
+
+from benchmarks.synthetic import SURROGATE_KEY_RULES, TPCDS_TABLES, TPCH_TABLES, build_catalog, build_hints
+from snowflake_dbml.catalog import Catalog
+from snowflake_dbml.generator import generate_dbml
+from snowflake_dbml.rules import RelationshipRules
+from snowflake_dbml.writer import write_dbml
+
+CONNECTION_PARAMS = {'database': 'BENCH', 'user': 'BENCH_USER', 'included_schemas': 'PUBLIC,SALES'}
+VISUALIZATION_PARAMS = {'table_color': '#111111', 'view_color': '#222222', 'dynamic_table_color': '#333333'}
+# The project note starts with the generation time, which differs between the two runs
+GENERATED_LINE = re.compile(r"Generated using snowflake-dbml on [^\n]*")
+# Comments exercising note quoting: quotes, triple quotes, several lines and surrounding whitespace
+COMMENTS = ("it's quoted", "first line\nit's the ''' second line", "  padded\n\nwith a blank line  ", 'a "double" quote')
+
+
+def build_roundtrip_catalog():
+    """Returns (data, hints): TPC-H tables in `PUBLIC` and TPC-DS tables in `SALES`, with quoted multi-line comments."""
+    specs = [('PUBLIC', name, columns, refs) for name, columns, refs in TPCH_TABLES]
+    specs += [('SALES', name, columns, refs) for name, columns, refs in TPCDS_TABLES]
+    data = build_catalog(specs)
+    for index, row in enumerate(data['tables']):
+        if index % 3 == 0:
+            row['COMMENT'] = COMMENTS[index % len(COMMENTS)]
+        if row['TABLE_COMMENT'] is not None or index % 7 == 0:
+            row['TABLE_COMMENT'] = COMMENTS[(index // 7) % len(COMMENTS)]
+    # Table-level fields are the same on every row of a table
+    comments = {}
+    for row in data['tables']:
+        row['TABLE_COMMENT'] = comments.setdefault((row['TABLE_SCHEMA'], row['TABLE_NAME']), row['TABLE_COMMENT'])
+    return data, build_hints(specs)
+
+
+def as_catalog(data):
+    """Returns `data` as a streamed `Catalog`."""
+    catalog = Catalog()
+    for row in data['tables']:
+        catalog.add_row(row)
+    catalog.primary_keys = data['primary_keys']
+    catalog.foreign_keys = data['foreign_keys']
+    return catalog
+
+
+def note_text(note):
+    return None if note is None else note.text
+
+
+def describe(text):
+    """Parses DBML `text` with PyDBML and returns its model as plain, comparable values."""
+    from pydbml import PyDBML
+
+    database = PyDBML(GENERATED_LINE.sub('Generated using snowflake-dbml', text))
+
+    def table_name(table):
+        return f"{table.schema}.{table.name}"
+
+    def column_names(columns):
+        return tuple(f"{table_name(column.table)}.{column.name}" for column in columns)
+
+    return {
+        'project': (database.project.name, note_text(database.project.note)),
+        'tables': [(table_name(table), table.header_color, note_text(table.note),
+                    [(column.name, column.type, column.pk, note_text(column.note)) for column in table.columns])
+                   for table in database.tables],
+        'references': sorted((column_names(ref.col1), ref.type, column_names(ref.col2), ref.comment) for ref in database.refs),
+        'table groups': [(group.name, [table_name(table) for table in group.items]) for group in database.table_groups],
+    }
+
+
+def compare(expected, actual):
+    """Returns a description of each part of the model that differs, with its first differing entry."""
+    problems = []
+    for part, values in expected.items():
+        if values == actual[part]:
+            continue
+        if isinstance(values, list):
+            if len(values) != len(actual[part]):
+                problems.append(f"{part}: {len(values)} from generate_dbml, {len(actual[part])} from write_dbml")
+                continue
+            values, other = next((value, other) for value, other in zip(values, actual[part]) if value != other)
+        else:
+            other = actual[part]
+        problems.append(f"{part}: {values!r:.300} from generate_dbml, {other!r:.300} from write_dbml")
+    return problems
+
+
+def check(data, hints, rules):
+    """Returns (model, problems) comparing the parsed `generate_dbml` and `write_dbml` outputs for `data`."""
+    from pyparsing import ParseBaseException
+
+    expected = describe(generate_dbml(data, CONNECTION_PARAMS, hints, VISUALIZATION_PARAMS, relationship_rules=rules))
+    output = io.StringIO()
+    write_dbml(data, output, CONNECTION_PARAMS, hints, VISUALIZATION_PARAMS, relationship_rules=rules)
+    try:
+        actual = describe(output.getvalue())
+    except ParseBaseException as e:
+        return expected, [f"write_dbml output does not parse: {e}"]
+    return expected, compare(expected, actual)
+
+
+def main():
+    data, hints = build_roundtrip_catalog()
+    cases = {
+        'rows': (lambda: data, hints, None),
+        'catalog': (lambda: as_catalog(data), hints, None),
+        'rules': (lambda: data, {}, RelationshipRules(SURROGATE_KEY_RULES)),
+    }
+    failed = 0
+    for name, (build_data, case_hints, rules) in cases.items():
+        model, problems = check(build_data(), case_hints, rules)
+        summary = f"{len(model['tables'])} tables, {len(model['references'])} refs, {len(model['table groups'])} groups"
+        print(f"  {name:<10} {summary:<40} {'FAIL ' + '; '.join(problems) if problems else 'ok'}")
+        failed += bool(problems)
+    if failed:
+        print(f"{failed} round-trip checks failed")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,390 @@
+# benchmarks/run.py
+"""
+Runs the benchmark suite against synthetic catalogs and compares wall time and peak memory to stored baselines.
+
+    python -m benchmarks.run                       # TPC-H and TPC-DS presets
+    python -m benchmarks.run --preset wide         # 10k tables x 100 columns
+    python -m benchmarks.run --update-baselines    # record the current numbers as baselines
+
+Exits with status 1 when a benchmark is slower or uses more memory than its baseline beyond the tolerance.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest import mock
+
+from pydbml import Database
+from pydbml.classes import Column, Table
+
+from benchmarks.fake_connector import fake_snowflake
+from benchmarks.synthetic import PRESETS, SURROGATE_KEY_RULES, distinct_copies, preset, replicate, write_hints
+from snowflake_dbml import generator, metrics
+from snowflake_dbml.changes import TableManifest
+from snowflake_dbml.extract import iter_partitions
+from snowflake_dbml.model import infer_relationships, iter_tables
+from snowflake_dbml.rules import RelationshipRules
+from snowflake_dbml.service import CatalogService, make_server
+from snowflake_dbml.writer import index_table, write_dbml, write_shards
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+DEFAULT_PRESETS = ('tpch', 'tpcds')
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.25  # allowed relative slowdown or memory growth before a regression is flagged
+MIN_WALL_DELTA = 0.005  # seconds; smaller differences are timer noise
+MIN_MEMORY_DELTA = 256 * 1024  # bytes
+DEFAULT_LATENCY = 0.02  # seconds per query in the end-to-end benchmarks
+DEFAULT_RESUME_LATENCY = 0.0  # seconds the fake warehouse takes to resume in the end-to-end benchmarks
+# pydbml renders in roughly cubic time, so the in-memory `generate_dbml` path is only run on small catalogs
+MAX_PYDBML_COLUMNS = 5000
+SERVICE_REQUESTS = 8  # concurrent requests in the service benchmark
+SCALING_COLUMNS = (25000, 50000, 100000)  # catalog sizes of the scaling benchmark, in columns
+SCALING_STAGES = ('render.tables', 'render.references')  # `generate_dbml` stages timed by the scaling benchmark
+# Time per column or match at the largest scaling size over the smallest; 1.0 is linear. Only this limit is checked:
+# the ratio varies by about 0.2 between identical runs, too much to compare against a baseline
+MAX_GROWTH = 1.5
+GROWTH_METRICS = {'time_per_column_growth': 'per column', 'time_per_match_growth': 'per match'}
+
+CONNECTION_PARAMS = {'user': 'bench', 'password': 'bench', 'account': 'bench', 'warehouse': 'BENCH_WH',
+                     'database': 'BENCH', 'role': 'BENCH_ROLE'}
+
+
+@contextmanager
+def paused_gc():
+    """Pauses the cyclic garbage collector, whose passes over a growing heap add a superlinear cost of their own."""
+    gc.collect()
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+
+def scaling_catalogs(data):
+    """Returns copies of the catalog of `SCALING_COLUMNS` columns, or None when it is larger than the smallest."""
+    if len(data['tables']) > SCALING_COLUMNS[0]:
+        return None
+    return [replicate(data, -(-columns // len(data['tables']))) for columns in SCALING_COLUMNS]
+
+
+def bench_fetch_data(data, hints, workdir, latency, resume_latency):
+    """`fetch_data` post-processing over a zero-latency fake connection."""
+    def run():
+        with fake_snowflake(data):
+            generator.fetch_data(dict(CONNECTION_PARAMS))
+    return run
+
+
+def bench_fetch_data_stream(data, hints, workdir, latency, resume_latency):
+    """`fetch_data` streaming into a `Catalog`."""
+    def run():
+        with fake_snowflake(data):
+            generator.fetch_data(dict(CONNECTION_PARAMS), stream=True)
+    return run
+
+
+def bench_fetch_data_show(data, hints, workdir, latency, resume_latency):
+    """`fetch_data` normalizing SHOW command rows, without a warehouse."""
+    def run():
+        with fake_snowflake(data):
+            generator.fetch_data(dict(CONNECTION_PARAMS, warehouse=None), query_mode='show')
+    return run
+
+
+def bench_generate_dbml(data, hints, workdir, latency, resume_latency):
+    """The in-memory pydbml rendering path."""
+    if len(data['tables']) > MAX_PYDBML_COLUMNS:
+        return None
+    return lambda: generator.generate_dbml(data, CONNECTION_PARAMS, hints, {})
+
+
+def bench_write_dbml(data, hints, workdir, latency, resume_latency):
+    """The streaming DBML writer, writing to the null device so the output itself isn't measured."""
+    def run():
+        with open(os.devnull, 'w') as output:
+            write_dbml(data, output, CONNECTION_PARAMS, hints, {})
+    return run
+
+
+def bench_write_dbml_changes(data, hints, workdir, latency, resume_latency):
+    """
+    The streaming writer with `--changed-only` against the manifest of an earlier run over the same catalog, so
+    every table is fingerprinted and left out, including loading and saving the manifest.
+    """
+    def run():
+        changes = TableManifest(os.path.join(workdir, 'manifests'), key='bench')
+        with open(os.devnull, 'w') as output:
+            write_dbml(data, output, CONNECTION_PARAMS, hints, {}, changes=changes)
+        changes.save()
+    # Records the manifest the timed runs compare against
+    run()
+    return run
+
+
+def bench_generate_dbml_scaling(data, hints, workdir, latency, resume_latency):
+    """
+    `generate_dbml` over copies of the catalog of `SCALING_COLUMNS` columns, with the catalog's hints, reporting how
+    the time per column of its `SCALING_STAGES` grows from the smallest to the largest (1.0 when linear), as timed
+    by a `MetricsReport`. pydbml's text rendering (`render.dbml`) is quadratic on its own, so it is skipped, and the
+    garbage collector is paused.
+    """
+    catalogs = scaling_catalogs(data)
+    if catalogs is None:
+        return None
+
+    def run():
+        seconds_per_column = []
+        for catalog in catalogs:
+            with paused_gc(), mock.patch.object(Database, 'dbml', new_callable=mock.PropertyMock, return_value=''), \
+                    metrics.MetricsReport() as report:
+                generator.generate_dbml(catalog, CONNECTION_PARAMS, hints, {})
+            seconds = sum(report.stages[name]['wall_seconds'] for name in SCALING_STAGES)
+            seconds_per_column.append(seconds / len(catalog['tables']))
+        return {'time_per_column_growth': round(seconds_per_column[-1] / seconds_per_column[0], 3)}
+    return run
+
+
+def bench_write_shards(data, hints, workdir, latency, resume_latency):
+    """Schema shards written as each schema is fetched from a zero-latency fake connection."""
+    def run():
+        with fake_snowflake(data):
+            write_shards(iter_partitions(dict(CONNECTION_PARAMS), stream=True), os.path.join(workdir, 'shards'),
+                         CONNECTION_PARAMS, hints, {})
+    return run
+
+
+def pydbml_tables(data):
+    """Returns {DBML table name: pydbml Table} with the columns of `data`."""
+    tables = {}
+    for table_row, column_rows in iter_tables(data):
+        table = Table(schema=table_row['TABLE_SCHEMA'].lower(), name=table_row['TABLE_NAME'].lower())
+        for row in column_rows:
+            table.add_column(Column(name=row['COLUMN_NAME'], type=row['DATA_TYPE']))
+        tables[f"{table.schema}.{table.name}"] = table
+    return tables
+
+
+def bench_infer_relationships(data, hints, workdir, latency, resume_latency):
+    """
+    `infer_relationships` over pydbml tables built up front. Catalogs small enough are copied to `SCALING_COLUMNS`
+    columns with `distinct_copies`, so the hinted tables grow with the catalog while each hint still matches its
+    own copy, and the run reports how the time per inferred relationship grows from the smallest size to the
+    largest: 1.0 when the time follows the matches, rather than hinted tables x tables. The garbage collector is
+    paused while timing.
+    """
+    if len(data['tables']) > SCALING_COLUMNS[0]:
+        catalogs = [(pydbml_tables(data), hints)]
+    else:
+        catalogs = []
+        for columns in SCALING_COLUMNS:
+            catalog, catalog_hints = distinct_copies(data, hints, -(-columns // len(data['tables'])))
+            catalogs.append((pydbml_tables(catalog), catalog_hints))
+
+    def run():
+        seconds_per_match = []
+        for tables, catalog_hints in catalogs:
+            with paused_gc():
+                start = time.perf_counter()
+                matches = len(infer_relationships(tables, catalog_hints))
+                seconds_per_match.append((time.perf_counter() - start) / max(matches, 1))
+        if len(catalogs) > 1:
+            return {'time_per_match_growth': round(seconds_per_match[-1] / seconds_per_match[0], 3)}
+    return run
+
+
+def bench_rule_relationships(data, hints, workdir, latency, resume_latency):
+    """`RelationshipRules` compiled and resolved over the writer's tables, built up front."""
+    tables, column_index = {}, {}
+    for table_row, column_rows in iter_tables(data):
+        index_table(table_row, column_rows, tables, column_index)
+    return lambda: list(RelationshipRules(SURROGATE_KEY_RULES).iter_relationships(tables))
+
+
+def bench_main(data, hints, workdir, latency, resume_latency, query_mode='join'):
+    """End-to-end `main` over a fake connection with per-query latency, writing to a file."""
+    hints_path = os.path.join(workdir, 'hints.json')
+    write_hints(hints_path, hints)
+    argv = ['snowflake-dbml', '--user', 'bench', '--password', 'bench', '--account', 'bench', '--database', 'BENCH',
+            '--role', 'BENCH_ROLE', '--config-file', hints_path, '--output', os.path.join(workdir, 'bench.dbml')]
+    # SHOW commands need no warehouse, so the show path never waits for one to resume
+    argv += ['--query-mode', 'show'] if query_mode == 'show' else ['--warehouse', 'BENCH_WH', '--query-mode', query_mode]
+
+    def run():
+        with fake_snowflake(data, latency, resume_latency):
+            saved_argv, sys.argv = sys.argv, argv
+            try:
+                generator.main()
+            finally:
+                sys.argv = saved_argv
+    return run
+
+
+def bench_main_show(data, hints, workdir, latency, resume_latency):
+    """End-to-end `main` with `--query-mode show`, to compare with `main`."""
+    return bench_main(data, hints, workdir, latency, resume_latency, query_mode='show')
+
+
+def bench_service(data, hints, workdir, latency, resume_latency):
+    """A service refresh over a fake connection, then concurrent HTTP requests for each schema and the whole database."""
+    schemas = sorted({row['TABLE_SCHEMA'] for row in data['tables']})[:SERVICE_REQUESTS - 1]
+    paths = ['/dbml'] + [f'/dbml?schemas={schema}' for schema in schemas]
+
+    def run():
+        with fake_snowflake(data, latency, resume_latency):
+            service = CatalogService(dict(CONNECTION_PARAMS), primary_key_hints=hints, visualization_params={}, refresh_interval=0)
+            server = make_server(service, port=0)
+            thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+            thread.start()
+            try:
+                service.refresh()
+                url = f"http://127.0.0.1:{server.server_address[1]}"
+                with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+                    for response in executor.map(lambda path: urllib.request.urlopen(url + path).read(), paths):
+                        assert response
+            finally:
+                server.shutdown()
+                server.server_close()
+                service.close()
+    return run
+
+
+BENCHMARKS = {
+    'fetch_data': bench_fetch_data,
+    'fetch_data_stream': bench_fetch_data_stream,
+    'fetch_data_show': bench_fetch_data_show,
+    'generate_dbml': bench_generate_dbml,
+    'generate_dbml_scaling': bench_generate_dbml_scaling,
+    'write_dbml': bench_write_dbml,
+    'write_dbml_changes': bench_write_dbml_changes,
+    'write_shards': bench_write_shards,
+    'infer_relationships': bench_infer_relationships,
+    'rule_relationships': bench_rule_relationships,
+    'main': bench_main,
+    'main_show': bench_main_show,
+    'service': bench_service,
+}
+
+
+def measure(run, repeat):
+    """
+    Returns the best wall time over `repeat` runs and the peak traced memory of one more run, along with the
+    lowest value over the runs of any metric `run` returns as a dict.
+    """
+    times = []
+    reported = {}
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        values = run()
+        times.append(time.perf_counter() - start)
+        for metric, value in (values.items() if isinstance(values, dict) else ()):
+            reported[metric] = min(value, reported.get(metric, value))
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return dict(reported, wall_seconds=round(min(times), 6), peak_bytes=peak)
+
+
+def compare(result, baseline, tolerance):
+    """Returns a list of regression messages for `result` against `baseline`."""
+    regressions = []
+    for metric, unit in GROWTH_METRICS.items():
+        growth = result.get(metric)
+        if growth is not None and growth > MAX_GROWTH:
+            regressions.append(f"time {unit} grew {growth}x from {SCALING_COLUMNS[0]} to {SCALING_COLUMNS[-1]} columns, "
+                               f"over {MAX_GROWTH}x")
+    if not baseline:
+        return regressions
+    for metric, min_delta in (('wall_seconds', MIN_WALL_DELTA), ('peak_bytes', MIN_MEMORY_DELTA)):
+        value, expected = result[metric], baseline.get(metric)
+        if expected is None:
+            continue
+        if value > expected * (1 + tolerance) and value - expected > min_delta:
+            regressions.append(f"{metric} {value} vs baseline {expected} (+{(value / expected - 1) * 100 if expected else float('inf'):.0f}%)")
+    return regressions
+
+
+def load_baselines(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark snowflake-dbml against synthetic catalogs.")
+    parser.add_argument('--preset', nargs='+', choices=sorted(PRESETS), default=list(DEFAULT_PRESETS), help='Catalog presets to run')
+    parser.add_argument('--benchmark', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS), help='Benchmarks to run')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Timed runs per benchmark; the best is kept')
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY, help='Seconds per query in the end-to-end benchmarks')
+    parser.add_argument('--resume-latency', type=float, default=DEFAULT_RESUME_LATENCY,
+                        help='Seconds the warehouse takes to resume in the end-to-end benchmarks')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Allowed relative regression')
+    parser.add_argument('--baselines', default=BASELINES_PATH, help='Baselines JSON file')
+    parser.add_argument('--update-baselines', action='store_true', help='Store the results as the new baselines')
+    parser.add_argument('--results', help='Also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    baselines = load_baselines(args.baselines)
+    results = {}
+    regressions = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        # `main` logs to ./snowflake-dbml.log, so run everything from the scratch directory
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for preset_name in args.preset:
+                data, hints = preset(preset_name)
+                table_count = len({(row['TABLE_SCHEMA'], row['TABLE_NAME']) for row in data['tables']})
+                print(f"{preset_name}: {table_count} tables, "
+                      f"{len(data['tables'])} columns, {len(data['foreign_keys'])} foreign keys, {len(hints)} hints")
+                for benchmark_name in args.benchmark:
+                    run = BENCHMARKS[benchmark_name](data, hints, workdir, args.latency, args.resume_latency)
+                    if run is None:
+                        print(f"  {benchmark_name:<22} skipped")
+                        continue
+                    key = f"{preset_name}/{benchmark_name}"
+                    results[key] = measure(run, args.repeat)
+                    problems = compare(results[key], baselines.get(key), args.tolerance)
+                    if problems:
+                        regressions[key] = problems
+                    status = 'REGRESSION ' + '; '.join(problems) if problems else ('ok' if key in baselines else 'no baseline')
+                    for metric, unit in GROWTH_METRICS.items():
+                        if metric in results[key]:
+                            status = f"{results[key][metric]:.2f}x {unit}  {status}"
+                    print(f"  {benchmark_name:<22} {results[key]['wall_seconds']:>10.4f}s {results[key]['peak_bytes'] / 2 ** 20:>9.1f} MiB  {status}")
+        finally:
+            os.chdir(cwd)
+
+    if args.results:
+        with open(args.results, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.update_baselines:
+        baselines.update(results)
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Updated {len(results)} baselines in {args.baselines}")
+        return 0
+    if regressions:
+        print(f"{len(regressions)} benchmarks regressed beyond {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+# benchmarks/synthetic.py
+"""Synthetic Snowflake catalogs shaped like `fetch_data` output, with key rows and primary key hints."""
+import datetime
+import json
+import random
+
+TIMESTAMP = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+DATA_TYPES = ('NUMBER', 'TEXT', 'TIMESTAMP_NTZ', 'DATE', 'BOOLEAN', 'FLOAT', 'VARIANT')
+
+# TPC-H tables: (name, column count, referenced tables)
+TPCH_TABLES = (
+    ('REGION', 3, ()),
+    ('NATION', 4, ('REGION',)),
+    ('SUPPLIER', 7, ('NATION',)),
+    ('CUSTOMER', 8, ('NATION',)),
+    ('PART', 9, ()),
+    ('PARTSUPP', 5, ('PART', 'SUPPLIER')),
+    ('ORDERS', 9, ('CUSTOMER',)),
+    ('LINEITEM', 16, ('ORDERS', 'PART', 'SUPPLIER')),
+)
+
+# TPC-DS tables: (name, column count, referenced tables)
+TPCDS_TABLES = (
+    ('DATE_DIM', 28, ()),
+    ('TIME_DIM', 10, ()),
+    ('INCOME_BAND', 3, ()),
+    ('REASON', 3, ()),
+    ('SHIP_MODE', 6, ()),
+    ('CUSTOMER_ADDRESS', 13, ()),
+    ('CUSTOMER_DEMOGRAPHICS', 9, ()),
+    ('HOUSEHOLD_DEMOGRAPHICS', 5, ('INCOME_BAND',)),
+    ('ITEM', 22, ()),
+    ('PROMOTION', 19, ('DATE_DIM', 'ITEM')),
+    ('WAREHOUSE', 14, ()),
+    ('STORE', 29, ('DATE_DIM',)),
+    ('CALL_CENTER', 31, ('DATE_DIM',)),
+    ('CATALOG_PAGE', 9, ('DATE_DIM',)),
+    ('WEB_PAGE', 14, ('DATE_DIM', 'CUSTOMER')),
+    ('WEB_SITE', 26, ('DATE_DIM',)),
+    ('CUSTOMER', 18, ('CUSTOMER_ADDRESS', 'CUSTOMER_DEMOGRAPHICS', 'HOUSEHOLD_DEMOGRAPHICS', 'DATE_DIM')),
+    ('INVENTORY', 4, ('DATE_DIM', 'ITEM', 'WAREHOUSE')),
+    ('STORE_SALES', 23, ('DATE_DIM', 'TIME_DIM', 'ITEM', 'CUSTOMER', 'CUSTOMER_DEMOGRAPHICS', 'HOUSEHOLD_DEMOGRAPHICS',
+                         'CUSTOMER_ADDRESS', 'STORE', 'PROMOTION')),
+    ('STORE_RETURNS', 20, ('DATE_DIM', 'TIME_DIM', 'ITEM', 'CUSTOMER', 'STORE', 'REASON')),
+    ('CATALOG_SALES', 34, ('DATE_DIM', 'TIME_DIM', 'ITEM', 'CUSTOMER', 'CALL_CENTER', 'CATALOG_PAGE', 'SHIP_MODE',
+                           'WAREHOUSE', 'PROMOTION')),
+    ('CATALOG_RETURNS', 27, ('DATE_DIM', 'TIME_DIM', 'ITEM', 'CUSTOMER', 'CALL_CENTER', 'CATALOG_PAGE', 'SHIP_MODE',
+                             'WAREHOUSE', 'REASON')),
+    ('WEB_SALES', 34, ('DATE_DIM', 'TIME_DIM', 'ITEM', 'CUSTOMER', 'WEB_PAGE', 'WEB_SITE', 'SHIP_MODE', 'WAREHOUSE',
+                       'PROMOTION')),
+    ('WEB_RETURNS', 24, ('DATE_DIM', 'TIME_DIM', 'ITEM', 'CUSTOMER', 'WEB_PAGE', 'REASON')),
+)
+
+
+def key_column(table_name):
+    """Returns the surrogate key column of a synthetic table, which referencing tables reuse as their FK column."""
+    return f"{table_name}_SK"
+
+
+def build_catalog(table_specs, seed=0):
+    """
+    Builds a `fetch_data`-shaped dict from (schema, table, column_count, referenced_tables) specs.
+
+    Every table starts with its surrogate key (a primary key), followed by one column per referenced
+    table in the same schema (each with a foreign key row) and filler columns up to `column_count`.
+    Views, dynamic tables, comments and clustering keys are sprinkled in deterministically from `seed`.
+    """
+    rng = random.Random(seed)
+    rows, primary_keys, foreign_keys = [], [], []
+    for position, (schema, table_name, column_count, referenced_tables) in enumerate(table_specs):
+        table_type = 'VIEW' if rng.random() < 0.1 else 'BASE TABLE'
+        is_view = table_type == 'VIEW'
+        table_fields = {
+            'TABLE_SCHEMA': schema, 'TABLE_NAME': table_name, 'TABLE_TYPE': table_type,
+            'IS_DYNAMIC': 'YES' if not is_view and rng.random() < 0.05 else 'NO',
+            'AUTO_CLUSTERING_ON': 'NO',
+            'TABLE_COMMENT': f"Synthetic table {table_name}" if rng.random() < 0.3 else None,
+            'ROW_COUNT': None if is_view else rng.randrange(10 ** 9),
+            'BYTES': None if is_view else rng.randrange(10 ** 12),
+            'CREATED': TIMESTAMP, 'LAST_DDL': TIMESTAMP, 'LAST_ALTERED': TIMESTAMP,
+            'TABLE_OWNER': 'SYSADMIN', 'LAST_DDL_BY': 'LOADER',
+            'CLUSTERING_KEY': f"LINEAR({key_column(table_name)})" if rng.random() < 0.05 else None,
+        }
+
+        columns = [key_column(table_name)] + [key_column(referenced) for referenced in referenced_tables]
+        columns += [f"{table_name}_COL_{index}" for index in range(len(columns), column_count)]
+        for index, column_name in enumerate(columns):
+            data_type = 'NUMBER' if column_name.endswith('_SK') else DATA_TYPES[(position + index) % len(DATA_TYPES)]
+            comment = f"Column {index} of {table_name}, it's synthetic" if rng.random() < 0.2 else None
+            rows.append(dict(table_fields, COLUMN_NAME=column_name, DATA_TYPE=data_type, COMMENT=comment))
+
+        primary_keys.append({'database_name': 'BENCH', 'schema_name': schema, 'table_name': table_name,
+                             'column_name': key_column(table_name), 'key_sequence': 1, 'constraint_name': f"PK_{table_name}",
+                             'created_on': TIMESTAMP})
+        for referenced in referenced_tables:
+            foreign_keys.append({'fk_database_name': 'BENCH', 'fk_schema_name': schema, 'fk_table_name': table_name,
+                                 'fk_column_name': key_column(referenced), 'fk_name': f"FK_{table_name}_{referenced}",
+                                 'pk_database_name': 'BENCH', 'pk_schema_name': schema, 'pk_table_name': referenced,
+                                 'pk_column_name': key_column(referenced), 'key_sequence': 1, 'created_on': TIMESTAMP})
+    return {'tables': rows, 'primary_keys': primary_keys, 'foreign_keys': foreign_keys}
+
+
+def build_hints(table_specs):
+    """Returns primary key hints (the `table-primary-keys` config section) for every referenced table."""
+    hints = {}
+    for schema, _, _, referenced_tables in table_specs:
+        for referenced in referenced_tables:
+            hints[f"{schema.lower()}.{referenced.lower()}"] = {
+                'primary_key': {'column': key_column(referenced), 'reference_as': [key_column(referenced)]},
+            }
+    return hints
+
+
+def replicate(data, copies):
+    """
+    Returns a catalog built by `build_catalog` with `copies` copies of every schema, along with their key rows:
+    the first keeps its name, the others are suffixed `_COPY_1`, `_COPY_2`, ...
+    Primary key hints match referencing columns in any schema, so the hints of `data` apply to every copy as they are.
+    """
+    def schema_name(schema, copy):
+        return f"{schema}_COPY_{copy}" if copy else schema
+
+    result = {'tables': [], 'primary_keys': [], 'foreign_keys': []}
+    for copy in range(copies):
+        result['tables'] += [dict(row, TABLE_SCHEMA=schema_name(row['TABLE_SCHEMA'], copy)) for row in data['tables']]
+        result['primary_keys'] += [dict(row, schema_name=schema_name(row['schema_name'], copy)) for row in data['primary_keys']]
+        result['foreign_keys'] += [dict(row, fk_schema_name=schema_name(row['fk_schema_name'], copy),
+                                        pk_schema_name=schema_name(row['pk_schema_name'], copy)) for row in data['foreign_keys']]
+    return result
+
+
+def distinct_copies(data, hints, copies):
+    """
+    Returns (data, hints) with `copies` copies of every table of a catalog built by `build_catalog`, each copy's
+    tables and surrogate key columns suffixed `_C<n>`, along with their key rows and hints. Unlike `replicate`, the
+    hints of a copy only match that copy, so the hinted tables and the relationships they infer both grow linearly.
+    """
+    def rename(name, copy):
+        # Surrogate keys are named after their table (see `key_column`), so they follow the table's new name
+        return key_column(f"{name[:-len('_SK')]}_C{copy}") if name.endswith('_SK') else f"{name}_C{copy}"
+
+    result = {'tables': [], 'primary_keys': [], 'foreign_keys': []}
+    copied_hints = {}
+    for copy in range(copies):
+        result['tables'] += [dict(row, TABLE_NAME=rename(row['TABLE_NAME'], copy),
+                                  COLUMN_NAME=rename(row['COLUMN_NAME'], copy) if row['COLUMN_NAME'].endswith('_SK') else row['COLUMN_NAME'])
+                             for row in data['tables']]
+        result['primary_keys'] += [dict(row, table_name=rename(row['table_name'], copy), column_name=rename(row['column_name'], copy))
+                                   for row in data['primary_keys']]
+        result['foreign_keys'] += [dict(row, fk_table_name=rename(row['fk_table_name'], copy), fk_column_name=rename(row['fk_column_name'], copy),
+                                        pk_table_name=rename(row['pk_table_name'], copy), pk_column_name=rename(row['pk_column_name'], copy))
+                                   for row in data['foreign_keys']]
+        for name, hint in hints.items():
+            key = hint['primary_key']
+            copied_hints[rename(name, copy).lower()] = {
+                'primary_key': {'column': rename(key['column'], copy), 'reference_as': [rename(column, copy) for column in key['reference_as']]},
+            }
+    return result, copied_hints
+
+
+# Relationship rules (the `relationship-rules` config section) inferring what `build_hints` does, as one convention
+SURROGATE_KEY_RULES = [{'name': 'surrogate keys', 'column': '*_SK', 'references': {'table': '{1}', 'column': '{0}'}}]
+
+
+def tpch_specs(schemas=1):
+    return [(f"TPCH_{index}", name, columns, refs) for index in range(schemas) for name, columns, refs in TPCH_TABLES]
+
+
+def tpcds_specs(schemas=1):
+    return [(f"TPCDS_{index}", name, columns, refs) for index in range(schemas) for name, columns, refs in TPCDS_TABLES]
+
+
+def wide_specs(tables=10000, columns=100, schemas=10, dimensions=200, references=3, seed=0):
+    """`tables` tables of `columns` columns over `schemas` schemas; each fact table references `references` dimensions."""
+    rng = random.Random(seed)
+    specs = []
+    per_schema = tables // schemas
+    for schema_index in range(schemas):
+        schema = f"WIDE_{schema_index}"
+        for index in range(per_schema):
+            if index < dimensions:
+                specs.append((schema, f"DIM_{index}", columns, ()))
+            else:
+                refs = tuple(f"DIM_{dim}" for dim in sorted(rng.sample(range(dimensions), references)))
+                specs.append((schema, f"FACT_{index}", columns, refs))
+    return specs
+
+
+def wide_500k_specs():
+    """Half of `wide`: 5,000 tables x 100 columns, a 500k-column result set for peak memory."""
+    return wide_specs(tables=5000)
+
+
+PRESETS = {
+    'tpch': tpch_specs,
+    'tpcds': tpcds_specs,
+    'wide': wide_specs,
+    'wide_500k': wide_500k_specs,
+}
+
+
+def preset(name):
+    """Returns (data, hints) for a named preset."""
+    specs = PRESETS[name]()
+    return build_catalog(specs), build_hints(specs)
+
+
+def write_hints(path, hints):
+    """Writes hints as a config JSON file readable by `load_primary_key_hints`."""
+    with open(path, 'w') as f:
+        json.dump({'table-primary-keys': hints}, f, indent=2)
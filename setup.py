@@ -5,7 +5,7 @@ from snowflake_dbml.version import __version__
 setup(
     name='snowflake-dbml-generator',
     version=__version__,
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     entry_points={
         'console_scripts': [
             'snowflake-dbml=snowflake_dbml.generator:main',
@@ -22,6 +22,9 @@ setup(
         'python-dotenv>=1.0.1',               # For loading environment variables from .env files
         'pydbml>=0.1.11'                       # Generate DBML files
     ],
+    extras_require={
+        'arrow': ['pyarrow>=14.0'],           # Read Parquet (and faster CSV) metadata exports
+    },
     classifiers=[
         # Classifiers can help people find your project
         'Programming Language :: Python :: 3',
@@ -0,0 +1,226 @@
+# snowflake_dbml/cache.py
+import datetime
+import decimal
+import gzip
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+
+from snowflake_dbml import metrics
+from snowflake_dbml.catalog import Catalog, ColumnRecord, TableRecord, TABLE_FIELDS
+from snowflake_dbml.config import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = '.jsonl.gz'
+DEFAULT_TTL = 7 * 24 * 3600  # seconds a snapshot is kept before eviction
+DEFAULT_MAX_BYTES = 1024 ** 3  # total size of the cache directory before the oldest snapshots are evicted
+
+
+def encode_value(value):
+    """JSON encoder hook for the non-JSON types returned by the connector."""
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'$date': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'$decimal': str(value)}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def decode_value(obj):
+    """JSON object hook reversing `encode_value`."""
+    if len(obj) == 1:
+        if '$datetime' in obj:
+            return datetime.datetime.fromisoformat(obj['$datetime'])
+        if '$date' in obj:
+            return datetime.date.fromisoformat(obj['$date'])
+        if '$decimal' in obj:
+            return decimal.Decimal(obj['$decimal'])
+    return obj
+
+
+def snapshot_key(connection_params, included_schemas=None, excluded_schemas=None, per_database=False):
+    """Returns the cache key for a fetch: account, database(s), role and schema filters, plus the result layout."""
+    key_fields = {
+        'account': connection_params.get('account'),
+        'database': connection_params.get('database'),
+        'role': connection_params.get('role'),
+        'included_schemas': included_schemas or None,
+        'excluded_schemas': excluded_schemas or None,
+        'per_database': bool(per_database),
+    }
+    return hashlib.sha256(json.dumps(key_fields, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def iter_table_records(rows):
+    """Groups joined table/column rows into one record per table, with its columns as [name, type, comment] lists."""
+    record, current_key = None, None
+    for row in rows:
+        key = (row['TABLE_SCHEMA'], row['TABLE_NAME'])
+        if key != current_key:
+            if record is not None:
+                yield record
+            current_key = key
+            record = {'table': {field: row[field] for field in TABLE_FIELDS}, 'columns': []}
+        if row['COLUMN_NAME'] is not None:
+            record['columns'].append([row['COLUMN_NAME'], row['DATA_TYPE'], row['COMMENT']])
+    if record is not None:
+        yield record
+
+
+def iter_records(data, database=None):
+    """Yields the JSON-able snapshot records of a `fetch_data` result: one per table, then one per key row."""
+    if isinstance(data, Catalog):
+        table_records = (
+            {'table': {field: getattr(table, field) for field in TABLE_FIELDS},
+             'columns': [[column.COLUMN_NAME, column.DATA_TYPE, column.COMMENT] for column in table.columns]}
+            for table in data.tables.values()
+        )
+        primary_keys, foreign_keys = data.primary_keys, data.foreign_keys
+    else:
+        table_records = iter_table_records(data['tables'])
+        primary_keys, foreign_keys = data['primary_keys'], data['foreign_keys']
+    records = itertools.chain(
+        table_records,
+        ({'primary_key': row} for row in primary_keys),
+        ({'foreign_key': row} for row in foreign_keys),
+    )
+    for record in records:
+        if database:
+            record['db'] = database
+        yield record
+
+
+def new_result(stream):
+    return Catalog() if stream else {'tables': [], 'primary_keys': [], 'foreign_keys': []}
+
+
+def add_record(result, record):
+    """Adds one snapshot record back into a `fetch_data` result."""
+    if 'primary_key' in record:
+        (result.primary_keys if isinstance(result, Catalog) else result['primary_keys']).append(record['primary_key'])
+    elif 'foreign_key' in record:
+        (result.foreign_keys if isinstance(result, Catalog) else result['foreign_keys']).append(record['foreign_key'])
+    elif isinstance(result, Catalog):
+        table = TableRecord(**record['table'])
+        table.columns = [ColumnRecord(*column) for column in record['columns']]
+        result.tables[(table.TABLE_SCHEMA, table.TABLE_NAME)] = table
+    else:
+        table_fields = record['table']
+        rows = result['tables']
+        if not record['columns']:
+            rows.append(dict(table_fields, COLUMN_NAME=None, DATA_TYPE=None, COMMENT=None))
+        for name, data_type, comment in record['columns']:
+            rows.append(dict(table_fields, COLUMN_NAME=name, DATA_TYPE=data_type, COMMENT=comment))
+
+
+class SnapshotCache:
+    """
+    Local on-disk cache of `fetch_data` results, stored as gzip-compressed JSON lines, one file per key.
+    Snapshots older than `ttl` seconds are evicted, as are the least recently written ones once the
+    directory exceeds `max_bytes`.
+    """
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + SNAPSHOT_SUFFIX)
+
+    def age(self, key):
+        """Returns the age of the snapshot for `key` in seconds, or None if there is none."""
+        try:
+            return time.time() - os.path.getmtime(self.path(key))
+        except OSError:
+            return None
+
+    def save(self, key, data, per_database=False):
+        """Writes a `fetch_data` result (or a {database: result} mapping with `per_database`) to the snapshot for `key`."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        start = time.perf_counter()
+        with metrics.stage('snapshot.save') as stage:
+            with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=1) as f:
+                f.write(json.dumps({'version': SNAPSHOT_VERSION, 'created': time.time(), 'per_database': per_database}) + '\n')
+                results = data.items() if per_database else ((None, data),)
+                for database, result in results:
+                    for record in iter_records(result, database):
+                        f.write(json.dumps(record, default=encode_value) + '\n')
+            # Replace atomically so concurrent readers never see a partial snapshot
+            os.replace(temp_path, path)
+            stage.bytes = os.path.getsize(path)
+        logger.info(f"Saved metadata snapshot {path} ({os.path.getsize(path)} bytes) in {time.perf_counter() - start:.2f}s")
+        self.evict()
+
+    def load(self, key, max_age=None, stream=False):
+        """
+        Returns the cached result for `key`, in the same layout it was saved with, or None if there is no
+        snapshot or it is older than `max_age` seconds. `stream` loads results into `Catalog`s.
+        """
+        path = self.path(key)
+        age = self.age(key)
+        if age is None:
+            return None
+        if max_age is not None and age > max_age:
+            logger.info(f"Metadata snapshot {path} is {age:.0f}s old, older than the {max_age}s allowed.")
+            return None
+
+        start = time.perf_counter()
+        with metrics.stage('snapshot.load') as stage, gzip.open(path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != SNAPSHOT_VERSION:
+                logger.warning(f"Ignoring metadata snapshot {path} with unsupported version {header.get('version')}")
+                return None
+            per_database = header.get('per_database')
+            results = {}
+            stage.rows = 0
+            for line in f:
+                record = json.loads(line, object_hook=decode_value)
+                database = record.get('db')
+                if database not in results:
+                    results[database] = new_result(stream)
+                add_record(results[database], record)
+                stage.rows += 1
+            stage.bytes = os.path.getsize(path)
+
+        logger.info(f"Loaded metadata snapshot {path} ({age:.0f}s old) in {time.perf_counter() - start:.2f}s")
+        if per_database:
+            return results
+        return results.get(None) or new_result(stream)
+
+    def evict(self):
+        """Removes expired snapshots, then the oldest ones while the cache is larger than `max_bytes`."""
+        try:
+            names = [name for name in os.listdir(self.cache_dir) if name.endswith(SNAPSHOT_SUFFIX)]
+        except FileNotFoundError:
+            return
+        now = time.time()
+        snapshots = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if self.ttl is not None and now - stat.st_mtime > self.ttl:
+                logger.info(f"Evicting expired metadata snapshot {path}")
+                os.remove(path)
+                continue
+            snapshots.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in snapshots)
+        for _, size, path in sorted(snapshots):
+            if self.max_bytes is None or total <= self.max_bytes:
+                break
+            logger.info(f"Evicting metadata snapshot {path} to keep the cache under {self.max_bytes} bytes")
+            os.remove(path)
+            total -= size
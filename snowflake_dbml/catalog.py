@@ -0,0 +1,158 @@
+# snowflake_dbml/catalog.py
+import sys
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Table-level fields of a table/column row, in the order selected by `fetch_data`
+TABLE_FIELDS = (
+    'TABLE_SCHEMA', 'TABLE_NAME', 'TABLE_TYPE', 'IS_DYNAMIC', 'AUTO_CLUSTERING_ON', 'TABLE_COMMENT',
+    'ROW_COUNT', 'BYTES', 'CREATED', 'LAST_DDL', 'LAST_ALTERED',
+    'TABLE_OWNER', 'LAST_DDL_BY', 'CLUSTERING_KEY',
+)
+# Column-level fields of a table/column row
+COLUMN_FIELDS = ('COLUMN_NAME', 'DATA_TYPE', 'COMMENT')
+
+# Low-cardinality string fields worth interning
+INTERNED_TABLE_FIELDS = ('TABLE_SCHEMA', 'TABLE_NAME', 'TABLE_TYPE', 'IS_DYNAMIC', 'AUTO_CLUSTERING_ON', 'TABLE_OWNER', 'LAST_DDL_BY')
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def intern_value(value):
+    """Interns strings so repeated schema, table and type names share one object."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Record:
+    """
+    Base class for slotted catalog records.
+    Fields are named after the INFORMATION_SCHEMA row keys and can be read like a row dict,
+    so a record can be passed anywhere a `fetch_data` row is expected.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+
+class ColumnRecord(Record):
+    """A single column of a table."""
+    __slots__ = COLUMN_FIELDS
+
+    def __init__(self, name, data_type, comment=None):
+        self.COLUMN_NAME = name
+        self.DATA_TYPE = intern_value(data_type)
+        self.COMMENT = comment
+
+
+class TableRecord(Record):
+    """Table-level metadata for one table, stored once, with its columns in ordinal order."""
+    __slots__ = TABLE_FIELDS + ('columns',)
+
+    def __init__(self, **fields):
+        for field in TABLE_FIELDS:
+            value = fields.get(field)
+            setattr(self, field, intern_value(value) if field in INTERNED_TABLE_FIELDS else value)
+        self.columns = []
+
+
+class Catalog:
+    """
+    Compact in-memory catalog of tables, columns and keys.
+    `tables` maps (schema, table) to a TableRecord, in the order tables were first seen.
+    `primary_keys` and `foreign_keys` hold the filtered `SHOW PRIMARY KEYS` / `SHOW IMPORTED KEYS` rows.
+    """
+    __slots__ = ('tables', 'primary_keys', 'foreign_keys')
+
+    def __init__(self):
+        self.tables = {}
+        self.primary_keys = []
+        self.foreign_keys = []
+
+    def add_row(self, row):
+        """Folds one joined table/column row (a mapping keyed like `fetch_data` rows) into the catalog."""
+        key = (row['TABLE_SCHEMA'], row['TABLE_NAME'])
+        table = self.tables.get(key)
+        if table is None:
+            table = TableRecord(**{field: row.get(field) for field in TABLE_FIELDS})
+            self.tables[(table.TABLE_SCHEMA, table.TABLE_NAME)] = table
+        # Tables without visible columns come back from the LEFT JOIN with an empty column
+        if row.get('COLUMN_NAME') is not None:
+            table.columns.append(ColumnRecord(row['COLUMN_NAME'], row['DATA_TYPE'], row.get('COMMENT')))
+        return table
+
+    def load(self, cursor, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Streams an executed tuple cursor into the catalog in batches of `batch_size` rows.
+        The cursor selects TABLE_SCHEMA and TABLE_NAME plus the remaining TABLE_FIELDS, the COLUMN_FIELDS, or both,
+        ordered by schema and table. Column-only results are attached to tables already in the catalog.
+        Returns the number of rows read.
+        """
+        positions = {description[0]: index for index, description in enumerate(cursor.description)}
+        schema_pos, name_pos = positions['TABLE_SCHEMA'], positions['TABLE_NAME']
+        has_table_fields = all(field in positions for field in TABLE_FIELDS)
+        table_positions = [(field, positions[field]) for field in TABLE_FIELDS] if has_table_fields else []
+        has_column_fields = all(field in positions for field in COLUMN_FIELDS)
+        if has_column_fields:
+            column_name_pos, type_pos, comment_pos = (positions[field] for field in COLUMN_FIELDS)
+
+        row_count = 0
+        current_key, current_table = None, None
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            row_count += len(batch)
+            for row in batch:
+                key = (row[schema_pos], row[name_pos])
+                if key != current_key:
+                    current_key = key
+                    current_table = self.tables.get(key)
+                    if current_table is None and has_table_fields:
+                        current_table = TableRecord(**{field: row[pos] for field, pos in table_positions})
+                        self.tables[(current_table.TABLE_SCHEMA, current_table.TABLE_NAME)] = current_table
+                if has_column_fields and current_table is not None and row[column_name_pos] is not None:
+                    current_table.columns.append(ColumnRecord(row[column_name_pos], row[type_pos], row[comment_pos]))
+        return row_count
+
+    def rows(self):
+        """
+        Yields joined table/column row dicts in the shape returned by `fetch_data`.
+        Tables without columns yield one row with empty column fields, as the LEFT JOIN does.
+        """
+        for table in self.tables.values():
+            table_fields = {field: getattr(table, field) for field in TABLE_FIELDS}
+            if not table.columns:
+                yield dict(table_fields, COLUMN_NAME=None, DATA_TYPE=None, COMMENT=None)
+            for column in table.columns:
+                yield dict(table_fields, COLUMN_NAME=column.COLUMN_NAME, DATA_TYPE=column.DATA_TYPE, COMMENT=column.COMMENT)
+
+    def column_count(self):
+        return sum(len(table.columns) for table in self.tables.values())
+
+    def summary(self):
+        """Returns object counts for logging."""
+        return {
+            'tables': len(self.tables),
+            'columns': self.column_count(),
+            'primary_keys': len(self.primary_keys),
+            'foreign_keys': len(self.foreign_keys),
+        }
+
+
+def peak_rss_bytes():
+    """Returns the peak resident set size of this process in bytes, or None if it can't be determined."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
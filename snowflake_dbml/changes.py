@@ -0,0 +1,104 @@
+# snowflake_dbml/changes.py
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from snowflake_dbml import metrics
+from snowflake_dbml.catalog import TABLE_FIELDS
+from snowflake_dbml.config import DEFAULT_CACHE_DIR
+from snowflake_dbml.model import table_header
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Bump when the rendered table format changes, so every table is reported as changed once
+MANIFEST_VERSION = 1
+MANIFEST_FILE = 'table-manifests.json.gz'
+DEFAULT_MAX_MANIFESTS = 32  # documents whose table fingerprints are remembered for `--changed-only`
+
+
+def table_fingerprint(table_row, column_rows, primary_key_index, visualization_params):
+    """
+    Returns a stable hash of everything a table's rendered DBML depends on: its table-level fields, its
+    columns' names, types, comments and primary key flags, and its header color and note emoji.
+    """
+    schema = table_row['TABLE_SCHEMA'].lower()
+    table_name = table_row['TABLE_NAME'].lower()
+    columns = [(row['COLUMN_NAME'], row['DATA_TYPE'], row.get('COMMENT'), (schema, table_name, row['COLUMN_NAME']) in primary_key_index)
+               for row in column_rows if row['COLUMN_NAME'] is not None]
+    payload = (MANIFEST_VERSION, [table_row.get(field) for field in TABLE_FIELDS], columns,
+               table_header(table_row, visualization_params))
+    return hashlib.blake2b(json.dumps(payload, default=str).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class TableManifest:
+    """
+    The `table_fingerprint` of every table written by the last run for a document `key`, kept in `cache_dir`,
+    so a run can tell which tables were added, changed or removed since (see `write_dbml`'s `changes`).
+    Manifests of the `DEFAULT_MAX_MANIFESTS` most recently written documents are kept.
+    """
+
+    def __init__(self, cache_dir=None, key=None):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.path = os.path.join(self.cache_dir, MANIFEST_FILE)
+        self.key = key
+        self.manifests = OrderedDict()
+        self.manifest = {}
+        self.load()
+        self.previous = self.manifests.get(key, {})
+
+    def load(self):
+        """Reads the manifest file, if there is one, keeping its least-recently-written order."""
+        try:
+            f = gzip.open(self.path, 'rt', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with metrics.stage('changes.load') as stage, f:
+            try:
+                contents = json.load(f)
+                if contents.get('version') != MANIFEST_VERSION:
+                    logger.info(f"Ignoring table manifests {self.path} with version {contents.get('version')}")
+                    return
+                self.manifests.update(contents['manifests'])
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable table manifests {self.path}: {e}")
+                self.manifests.clear()
+                return
+            stage.objects = len(self.manifests)
+            stage.bytes = os.path.getsize(self.path)
+
+    def table_status(self, name, table_row, column_rows, primary_key_index, visualization_params):
+        """
+        Records the fingerprint of a table written as `name` and returns 'added', 'changed' or 'unchanged'
+        relative to the last run for `key`.
+        """
+        fingerprint = table_fingerprint(table_row, column_rows, primary_key_index, visualization_params)
+        self.manifest[name] = fingerprint
+        previous = self.previous.get(name)
+        return 'added' if previous is None else 'unchanged' if previous == fingerprint else 'changed'
+
+    def removed_tables(self):
+        """Returns the names of tables written by the last run for `key` but not by this one."""
+        return [name for name in self.previous if name not in self.manifest]
+
+    def save(self):
+        """Writes this run's manifest for `key` back to the manifest file, replacing it atomically."""
+        self.manifests[self.key] = self.manifest
+        self.manifests.move_to_end(self.key)
+        while len(self.manifests) > DEFAULT_MAX_MANIFESTS:
+            self.manifests.popitem(last=False)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        start = time.perf_counter()
+        with metrics.stage('changes.save') as stage:
+            with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=1) as f:
+                json.dump({'version': MANIFEST_VERSION, 'created': time.time(), 'manifests': self.manifests}, f)
+            os.replace(temp_path, self.path)
+            stage.objects = len(self.manifest)
+            stage.bytes = os.path.getsize(self.path)
+        logger.info(f"Saved the fingerprints of {len(self.manifest)} tables to {self.path} in {time.perf_counter() - start:.2f}s")
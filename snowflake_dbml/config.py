@@ -1,18 +1,28 @@
 # snowflake_dbml/config.py
 import os
 import json
-from dotenv import load_dotenv
 
 # defaults
 default_table_color = '#3498db'  # Default blue
 default_view_color = '#9b59b6'  # Default purple
 default_dynamic_table_color = '#9b59b6'  # Default orange
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'snowflake-dbml')
 
-# Load environment variables from a .env file if present
-load_dotenv(override=True) # if .env file is present, override existing environment variables
+_env_loaded = False
+
+def load_env():
+    """
+    Load environment variables from a .env file if present, overriding existing ones. Called once by the
+    command line's `main`; the loaders below only read the environment, so library calls never modify it.
+    """
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv(override=True) # if .env file is present, override existing environment variables
+        _env_loaded = True
 
 def load_config():
-    """Return configuration loaded from environment variables or .env file, including schema filters."""
+    """Return configuration loaded from environment variables, including schema filters."""
     return {
         'user': os.getenv('SNOWFLAKE_USER'),
         'password': os.getenv('SNOWFLAKE_PASSWORD'),
@@ -25,26 +35,42 @@ def load_config():
 
         'included_schemas': os.getenv('INCLUDED_SCHEMAS'),  # Schemas to include
         'excluded_schemas': os.getenv('EXCLUDED_SCHEMAS'),  # Schemas to exclude
+
+        'cache_dir': os.getenv('SNAPSHOT_CACHE_DIR'),  # Directory for local metadata snapshots
         
         'table_color': os.getenv('TABLE_COLOR', default_table_color),
         'view_color': os.getenv('VIEW_COLOR', default_view_color), 
         'dynamic_table_color': os.getenv('DYNAMIC_TABLE_COLOR', default_dynamic_table_color) 
     }
 
-def load_primary_key_hints(path=None):
-    """Load primary key hints from a JSON file."""
+def load_hints_file(path=None):
+    """Load the primary key hints and the `relationship-rules` section from the JSON hints file, parsing it once."""
     if not path:
         path = os.getenv('PRIMARY_KEY_HINTS_PATH', '')  # Default or .env specified path
     if not path:
-        return {}  # Return empty hints if no path is provided
+        return {}, []  # Return empty hints and rules if no path is provided
     try:
         with open(path, 'r') as file:
-            return json.load(file)['table-primary-keys']
+            contents = json.load(file)
+        # A file holding only relationship rules has no hints
+        if 'table-primary-keys' not in contents and 'relationship-rules' in contents:
+            hints = {}
+        else:
+            hints = contents['table-primary-keys']
+        return hints, contents.get('relationship-rules', [])
     except (FileNotFoundError, KeyError):
         raise FileNotFoundError(f"Primary key hints file {path} not found or is invalid.")
     except json.JSONDecodeError:
         raise ValueError(f"Error parsing the JSON hints file {path}.")
 
+def load_primary_key_hints(path=None):
+    """Load primary key hints from a JSON file."""
+    return load_hints_file(path)[0]
+
+def load_relationship_rules(path=None):
+    """Load the `relationship-rules` section from the JSON hints file, or an empty list if it has none."""
+    return load_hints_file(path)[1]
+
 def load_visualization_params():
     """Return visualization parameters from environment variables with defaults."""
     return {
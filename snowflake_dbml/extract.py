@@ -0,0 +1,851 @@
+# snowflake_dbml/extract.py
+"""
+Extraction of table, column and key metadata from Snowflake: INFORMATION_SCHEMA and SHOW queries, partitioning
+across databases and schemas, and the `fetch_data` entry point.
+"""
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+# snowflake.connector is slow to import, so it is imported in the functions that use it
+from snowflake_dbml import metrics
+from snowflake_dbml.catalog import Catalog, ColumnRecord, TableRecord, DEFAULT_BATCH_SIZE, TABLE_FIELDS, COLUMN_FIELDS, peak_rss_bytes
+from snowflake_dbml.config import load_config
+from snowflake_dbml.model import iter_tables, key_rows
+from snowflake_dbml.pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+QUERY_MODES = ('join', 'split', 'show')
+DEFAULT_KEY_WORKERS = 8
+DEFAULT_POLL_INTERVAL = 0.1  # seconds between status checks of async queries
+DEFAULT_CHANGED_TABLES_PER_QUERY = 500  # tables named in each column query of an incremental refresh
+# Joins database and schema names in merged results; unlike '_', it can't appear in an unquoted identifier
+SCHEMA_QUALIFIER = '-'
+SHOW_ROW_LIMIT = 10000  # rows returned by a SHOW command at most; results this large are re-read in narrower scopes
+# `type` values of SHOW COLUMNS' data_type JSON that INFORMATION_SCHEMA.COLUMNS names differently
+SHOW_DATA_TYPES = {'FIXED': 'NUMBER', 'REAL': 'FLOAT'}
+
+def quote_identifier(name):
+    """Quotes a Snowflake identifier, escaping embedded double quotes."""
+    return '"' + name.replace('"', '""') + '"'
+
+def quote_literal(value):
+    """Quotes a SQL string literal, escaping embedded single quotes."""
+    return "'" + value.replace("'", "''") + "'"
+
+def split_schemas(schemas):
+    """Splits a comma-separated schema list into stripped schema names."""
+    return [schema.strip() for schema in schemas.split(',') if schema.strip()] if schemas else []
+
+def split_databases(databases):
+    """Returns database names from a list or a comma-separated string."""
+    if isinstance(databases, str):
+        return split_schemas(databases)
+    return [database.strip() for database in databases or [] if database.strip()]
+
+def build_schema_filter(included_schemas=None, excluded_schemas=None, column='t.TABLE_SCHEMA'):
+    """Builds the SQL predicate restricting `column` to the included schemas and away from the excluded ones."""
+    schema_filter = ""
+    if included_schemas:
+        included_list = ','.join(f"'{schema.strip()}'" for schema in included_schemas.split(','))
+        schema_filter += f" AND {column} IN ({included_list})"
+    if excluded_schemas:
+        excluded_list = ','.join(f"'{schema.strip()}'" for schema in excluded_schemas.split(','))
+        schema_filter += f" AND {column} NOT IN ({excluded_list})"
+    return schema_filter
+
+def build_table_query(database, schema_filter):
+    """Query returning one row per column, with the table-level fields repeated on every row."""
+    return f"""
+    SELECT t.TABLE_SCHEMA, t.TABLE_NAME, t.TABLE_TYPE, t.IS_DYNAMIC, t.AUTO_CLUSTERING_ON, t.COMMENT AS TABLE_COMMENT,
+           t.ROW_COUNT, t.BYTES, t.CREATED, t.LAST_DDL, t.LAST_ALTERED,
+           t.TABLE_OWNER, t.LAST_DDL_BY, t.CLUSTERING_KEY,
+           c.COLUMN_NAME, c.DATA_TYPE, c.COMMENT
+    FROM {quote_identifier(database)}.INFORMATION_SCHEMA.TABLES t
+    LEFT JOIN {quote_identifier(database)}.INFORMATION_SCHEMA.COLUMNS c ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+    WHERE t.TABLE_CATALOG = {quote_literal(database)} {schema_filter}
+    ORDER BY t.TABLE_SCHEMA, t.TABLE_NAME, c.ORDINAL_POSITION;
+    """
+
+def build_split_queries(database, included_schemas=None, excluded_schemas=None):
+    """
+    Returns a table-level query (one row per table) and a narrow column-level query (one row per column).
+    Stitched together with `join_tables_and_columns`, they yield the same rows as `build_table_query`.
+    """
+    tables_query = f"""
+    SELECT t.TABLE_SCHEMA, t.TABLE_NAME, t.TABLE_TYPE, t.IS_DYNAMIC, t.AUTO_CLUSTERING_ON, t.COMMENT AS TABLE_COMMENT,
+           t.ROW_COUNT, t.BYTES, t.CREATED, t.LAST_DDL, t.LAST_ALTERED,
+           t.TABLE_OWNER, t.LAST_DDL_BY, t.CLUSTERING_KEY
+    FROM {quote_identifier(database)}.INFORMATION_SCHEMA.TABLES t
+    WHERE t.TABLE_CATALOG = {quote_literal(database)} {build_schema_filter(included_schemas, excluded_schemas, 't.TABLE_SCHEMA')}
+    ORDER BY t.TABLE_SCHEMA, t.TABLE_NAME;
+    """
+    columns_query = f"""
+    SELECT c.TABLE_SCHEMA, c.TABLE_NAME, c.ORDINAL_POSITION, c.COLUMN_NAME, c.DATA_TYPE, c.COMMENT
+    FROM {quote_identifier(database)}.INFORMATION_SCHEMA.COLUMNS c
+    WHERE c.TABLE_CATALOG = {quote_literal(database)} {build_schema_filter(included_schemas, excluded_schemas, 'c.TABLE_SCHEMA')}
+    ORDER BY c.TABLE_SCHEMA, c.TABLE_NAME, c.ORDINAL_POSITION;
+    """
+    return tables_query, columns_query
+
+def join_tables_and_columns(table_rows, column_rows):
+    """
+    Joins table-level rows with column-level rows client-side, like the LEFT JOIN in `build_table_query`.
+    Tables without columns yield a single row with empty column fields.
+    """
+    columns_by_table = defaultdict(list)
+    for column in column_rows:
+        columns_by_table[(column['TABLE_SCHEMA'], column['TABLE_NAME'])].append(column)
+
+    rows = []
+    for table in table_rows:
+        columns = columns_by_table.get((table['TABLE_SCHEMA'], table['TABLE_NAME']))
+        if not columns:
+            rows.append(dict(table, COLUMN_NAME=None, DATA_TYPE=None, COMMENT=None))
+            continue
+        columns.sort(key=lambda column: column['ORDINAL_POSITION'])
+        for column in columns:
+            rows.append(dict(table, COLUMN_NAME=column['COLUMN_NAME'], DATA_TYPE=column['DATA_TYPE'], COMMENT=column['COMMENT']))
+    return rows
+
+def estimate_transfer(data):
+    """
+    Estimates rows and bytes transferred by the joined and the split table/column queries for the same metadata.
+    Bytes are approximated by the length of each value's string form. Returns {'join': (rows, bytes), 'split': (rows, bytes)}.
+    """
+    joined_rows = joined_bytes = split_rows = split_bytes = 0
+    for table_row, column_rows in iter_tables(data):
+        table_bytes = sum(len(str(table_row[field])) for field in TABLE_FIELDS if table_row[field] is not None)
+        column_count = 0
+        for position, column in enumerate(column_rows, start=1):
+            if column['COLUMN_NAME'] is None:
+                continue
+            column_count += 1
+            column_bytes = sum(len(str(column[field])) for field in COLUMN_FIELDS if column[field] is not None)
+            joined_bytes += column_bytes
+            split_bytes += column_bytes + len(table_row['TABLE_SCHEMA']) + len(table_row['TABLE_NAME']) + len(str(position))
+        joined_rows += max(column_count, 1)
+        joined_bytes += max(column_count, 1) * table_bytes
+        split_rows += 1 + column_count
+        split_bytes += table_bytes
+    return {'join': (joined_rows, joined_bytes), 'split': (split_rows, split_bytes)}
+
+def build_tables_queries(database, included_schemas=None, excluded_schemas=None, query_mode='join'):
+    """Returns the table/column queries for `query_mode`: the joined query, or the table-level and column-level pair."""
+    if query_mode == 'split':
+        return build_split_queries(database, included_schemas, excluded_schemas)
+    return (build_table_query(database, build_schema_filter(included_schemas, excluded_schemas)),)
+
+def read_tables(cursors, query_mode='join', stream=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Reads executed table/column query cursors, in the order of `build_tables_queries`.
+    Returns the joined row dicts (dict cursors), or a `Catalog` when `stream` is set (tuple cursors).
+    """
+    with metrics.stage('fetch.tables') as stage:
+        if stream:
+            catalog = Catalog()
+            row_count = 0
+            for cursor in cursors:
+                row_count += catalog.load(cursor, batch_size)
+            logger.info(f"Streamed {row_count} table/column rows into {len(catalog.tables)} tables. Peak RSS: {peak_rss_bytes()} bytes")
+            tables = catalog
+        else:
+            results = [cursor.fetchall() for cursor in cursors]
+            row_count = sum(len(result) for result in results)
+            if metrics.active():
+                stage.bytes = sum(metrics.estimate_bytes(result) for result in results)
+            tables = join_tables_and_columns(*results) if query_mode == 'split' else results[0]
+        stage.rows = row_count
+
+    # The estimate walks every value again just for this log line, so it only runs when profiling or debugging
+    if query_mode == 'split' and (metrics.active() or logger.isEnabledFor(logging.DEBUG)):
+        transfer = estimate_transfer(tables if stream else {'tables': tables})
+        logger.info(f"Split query transferred {transfer['split'][0]} rows (~{transfer['split'][1]} bytes); "
+                    f"the joined query would have transferred {transfer['join'][0]} rows (~{transfer['join'][1]} bytes).")
+    return tables
+
+def fetch_tables(conn, database, included_schemas=None, excluded_schemas=None, query_mode='join', stream=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Fetches table and column metadata over an open connection.
+    Returns the joined row dicts, or a `Catalog` when `stream` is set.
+    """
+    cursors = []
+    queries = build_tables_queries(database, included_schemas, excluded_schemas, query_mode)
+    stage_names = ('query.tables', 'query.columns') if len(queries) > 1 else ('query.tables_columns',)
+    for stage_name, query in zip(stage_names, queries):
+        # Streaming reads plain tuples; everything else reads dicts
+        cursor = conn.cursor() if stream else dict_cursor(conn)
+        with metrics.stage(stage_name, database=database):
+            cursor.execute(query)
+        cursors.append(cursor)
+    return read_tables(cursors, query_mode=query_mode, stream=stream, batch_size=batch_size)
+
+def run_show(conn, command, database, schemas=None, stage_name='query'):
+    """
+    Runs `SHOW <command>` in each of `schemas`, or database-wide, and returns all rows.
+    SHOW commands return at most `SHOW_ROW_LIMIT` rows, so a database-wide result that reaches it is re-read per
+    schema, and a per-schema result that does is re-read with `show_schema_narrowed`.
+    """
+    if not schemas:
+        rows = run_query(conn, f"SHOW {command} {database_scope(database)};", stage_name)
+        if len(rows) < SHOW_ROW_LIMIT:
+            return rows
+        logger.info(f"SHOW {command} in {database} returned {len(rows)} rows, the SHOW limit; re-reading it per schema.")
+        schemas = [row['name'] for row in show_pages(conn, 'SCHEMAS', database_scope(database))]
+
+    rows = []
+    for schema in schemas:
+        schema_rows = run_query(conn, f"SHOW {command} {schema_scope(database, schema)};", stage_name)
+        if len(schema_rows) >= SHOW_ROW_LIMIT:
+            logger.info(f"SHOW {command} in {database}.{schema} returned {len(schema_rows)} rows, the SHOW limit; re-reading it in narrower scopes.")
+            schema_rows = show_schema_narrowed(conn, command, database, schema, stage_name)
+        rows.extend(schema_rows)
+    return rows
+
+def show_pages(conn, command, scope, stage_name='query'):
+    """
+    Runs `SHOW <command> <scope>` one page of `SHOW_ROW_LIMIT` rows at a time, each page starting after the last
+    name of the previous one with `LIMIT ... FROM`, and returns all rows. Only commands listing named objects
+    in name order (TABLES, VIEWS, SCHEMAS, OBJECTS) support this.
+    """
+    rows = run_query(conn, f"SHOW {command} {scope} LIMIT {SHOW_ROW_LIMIT};", stage_name)
+    page = rows
+    while len(page) >= SHOW_ROW_LIMIT:
+        last = page[-1]['name']
+        page = run_query(conn, f"SHOW {command} {scope} LIMIT {SHOW_ROW_LIMIT} FROM {quote_literal(last)};", stage_name)
+        rows.extend(row for row in page if row['name'] != last)
+    return rows
+
+def show_schema_narrowed(conn, command, database, schema, stage_name='query', workers=DEFAULT_KEY_WORKERS):
+    """
+    Re-reads a per-schema `SHOW <command>` result that reached `SHOW_ROW_LIMIT`. `SHOW COLUMNS` has no
+    pagination, so it runs concurrently per table and view of the schema; other commands are paginated
+    with `show_pages`.
+    """
+    scope = schema_scope(database, schema)
+    if command != 'COLUMNS':
+        return show_pages(conn, command, scope, stage_name)
+
+    # SHOW OBJECTS lists the tables and views of the schema; its `kind` tells materialized views from tables
+    objects = show_pages(conn, 'TERSE OBJECTS', scope)
+    scopes = [f"IN {'VIEW' if 'VIEW' in str(row.get('kind')) else 'TABLE'} {quote_identifier(database)}.{quote_identifier(schema)}.{quote_identifier(row['name'])}"
+              for row in objects]
+    rows = []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(scopes)))) as executor:
+        for row, table_rows in zip(objects, executor.map(lambda scope: run_query(conn, f"SHOW COLUMNS {scope};", stage_name), scopes)):
+            if len(table_rows) >= SHOW_ROW_LIMIT:
+                logger.warning(f"SHOW COLUMNS in {database}.{schema}.{row['name']} returned {len(table_rows)} rows, the SHOW limit; "
+                               f"its columns may be truncated.")
+            rows.extend(table_rows)
+    return rows
+
+def show_text(value):
+    """SHOW commands return empty strings for missing values; normalizes them to None."""
+    return value if value not in ('', None) else None
+
+def normalize_show_table(row):
+    """Maps a `SHOW TABLES` row to the table-level fields of the INFORMATION_SCHEMA queries."""
+    if row.get('is_external') == 'Y':
+        table_type = 'EXTERNAL TABLE'
+    elif row.get('is_event') == 'Y':
+        table_type = 'EVENT TABLE'
+    elif row.get('kind') == 'TEMPORARY':
+        table_type = 'TEMPORARY TABLE'
+    else:
+        table_type = 'BASE TABLE'
+    return {
+        'TABLE_SCHEMA': row['schema_name'], 'TABLE_NAME': row['name'], 'TABLE_TYPE': table_type,
+        'IS_DYNAMIC': 'YES' if row.get('is_dynamic') == 'Y' else 'NO',
+        'AUTO_CLUSTERING_ON': 'YES' if row.get('automatic_clustering') == 'ON' else 'NO',
+        'TABLE_COMMENT': show_text(row.get('comment')),
+        'ROW_COUNT': row.get('rows'), 'BYTES': row.get('bytes'),
+        # SHOW TABLES doesn't report DDL or alteration times
+        'CREATED': row.get('created_on'), 'LAST_DDL': None, 'LAST_ALTERED': None,
+        'TABLE_OWNER': show_text(row.get('owner')), 'LAST_DDL_BY': None,
+        'CLUSTERING_KEY': show_text(row.get('cluster_by')),
+    }
+
+def normalize_show_view(row):
+    """Maps a `SHOW VIEWS` row to the table-level fields of the INFORMATION_SCHEMA queries."""
+    return {
+        'TABLE_SCHEMA': row['schema_name'], 'TABLE_NAME': row['name'],
+        'TABLE_TYPE': 'MATERIALIZED VIEW' if str(row.get('is_materialized')).lower() == 'true' else 'VIEW',
+        'IS_DYNAMIC': 'NO', 'AUTO_CLUSTERING_ON': 'NO', 'TABLE_COMMENT': show_text(row.get('comment')),
+        'ROW_COUNT': None, 'BYTES': None, 'CREATED': row.get('created_on'), 'LAST_DDL': None, 'LAST_ALTERED': None,
+        'TABLE_OWNER': show_text(row.get('owner')), 'LAST_DDL_BY': None, 'CLUSTERING_KEY': None,
+    }
+
+def show_data_type(data_type):
+    """Returns the INFORMATION_SCHEMA data type name for the JSON `data_type` of a `SHOW COLUMNS` row."""
+    try:
+        type_name = json.loads(data_type)['type']
+    except (TypeError, ValueError, KeyError):
+        return data_type
+    return SHOW_DATA_TYPES.get(type_name, type_name)
+
+def fetch_tables_show(conn, database, included_schemas=None, excluded_schemas=None, stream=False):
+    """
+    Fetches table and column metadata with `SHOW TABLES`, `SHOW VIEWS` and `SHOW COLUMNS`, which run in
+    cloud services without a warehouse. The three commands run concurrently; rows are normalized to the shape
+    of the INFORMATION_SCHEMA queries, except that LAST_DDL, LAST_ALTERED and LAST_DDL_BY are not available.
+    Returns the joined row dicts, or a `Catalog` when `stream` is set.
+    """
+    schemas = split_schemas(included_schemas)
+    commands = (('TABLES', 'query.show_tables'), ('VIEWS', 'query.show_views'), ('COLUMNS', 'query.show_columns'))
+    with ThreadPoolExecutor(max_workers=len(commands)) as executor:
+        futures = [executor.submit(run_show, conn, command, database, schemas, stage_name) for command, stage_name in commands]
+        show_tables, show_views, show_columns = (future.result() for future in futures)
+
+    excluded = set(split_schemas(excluded_schemas))
+    table_rows = [normalize_show_table(row) for row in show_tables if row['schema_name'] not in excluded]
+    table_rows += [normalize_show_view(row) for row in show_views if row['schema_name'] not in excluded]
+    table_rows.sort(key=lambda row: (row['TABLE_SCHEMA'], row['TABLE_NAME']))
+
+    # SHOW COLUMNS lists columns in ordinal order, and repeats a small set of data_type JSON strings
+    columns_by_table = defaultdict(list)
+    for row in show_columns:
+        columns_by_table[(row['schema_name'], row['table_name'])].append(row)
+    data_types = {}
+
+    # Tables are joined with their columns as the LEFT JOIN of `build_table_query` does
+    catalog = Catalog() if stream else None
+    rows = []
+    column_count = 0
+    for table_row in table_rows:
+        key = (table_row['TABLE_SCHEMA'], table_row['TABLE_NAME'])
+        table = None
+        if stream:
+            table = catalog.tables[key] = TableRecord(**table_row)
+        columns = columns_by_table.get(key, ())
+        if not columns and not stream:
+            rows.append(dict(table_row, COLUMN_NAME=None, DATA_TYPE=None, COMMENT=None))
+        for column in columns:
+            data_type = data_types.get(column['data_type'])
+            if data_type is None:
+                data_type = data_types[column['data_type']] = show_data_type(column['data_type'])
+            if stream:
+                table.columns.append(ColumnRecord(column['column_name'], data_type, show_text(column.get('comment'))))
+            else:
+                rows.append(dict(table_row, COLUMN_NAME=column['column_name'], DATA_TYPE=data_type, COMMENT=show_text(column.get('comment'))))
+        column_count += len(columns)
+    logger.info(f"SHOW commands returned {len(table_rows)} tables and views and {column_count} columns in {database}.")
+    return catalog if stream else rows
+
+def run_queries_async(conn, queries, poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+    Submits every query at once with `execute_async` and polls until all have finished.
+    `queries` maps a name to (sql, cursor_class), where a cursor_class of None means a plain tuple cursor.
+    Each result is attached to its cursor with `get_results_from_sfqid` as soon as that query completes,
+    so wall time follows the slowest query rather than the sum. Returns {name: cursor}.
+    """
+    start = time.perf_counter()
+    pending = {}
+    for name, (sql, cursor_class) in queries.items():
+        cursor = conn.cursor(cursor_class) if cursor_class else conn.cursor()
+        cursor.execute_async(sql)
+        pending[name] = cursor
+
+    cursors = {}
+    while pending:
+        for name, cursor in list(pending.items()):
+            status = conn.get_query_status_throw_if_error(cursor.sfqid)
+            if conn.is_still_running(status):
+                continue
+            cursor.get_results_from_sfqid(cursor.sfqid)
+            cursors[name] = pending.pop(name)
+            logger.debug(f"Async query {name} ({cursor.sfqid}) completed after {time.perf_counter() - start:.2f}s")
+        if pending:
+            time.sleep(poll_interval)
+
+    logger.info(f"Ran {len(queries)} queries asynchronously in {time.perf_counter() - start:.2f}s")
+    return cursors
+
+def dict_cursor(conn):
+    """Opens a cursor returning rows as dicts."""
+    from snowflake.connector import DictCursor
+    return conn.cursor(DictCursor)
+
+def run_query(conn, query, stage_name='query'):
+    """Runs a query on a new dict cursor and returns all rows, timed as metrics stage `stage_name`."""
+    with metrics.stage(stage_name) as stage:
+        cursor = dict_cursor(conn)
+        cursor.execute(query)
+        rows = cursor.fetchall()
+        stage.rows = len(rows)
+        if metrics.active():
+            stage.bytes = metrics.estimate_bytes(rows)
+    return rows
+
+def fetch_keys_per_schema(conn, database, schemas, workers=DEFAULT_KEY_WORKERS):
+    """Runs `SHOW PRIMARY KEYS` / `SHOW IMPORTED KEYS` scoped to each schema concurrently, one cursor per command."""
+    scopes = [schema_scope(database, schema) for schema in schemas]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, 2 * len(scopes)))) as executor:
+        pk_futures = [executor.submit(run_query, conn, f"SHOW PRIMARY KEYS {scope};", 'query.primary_keys') for scope in scopes]
+        fk_futures = [executor.submit(run_query, conn, f"SHOW IMPORTED KEYS {scope};", 'query.imported_keys') for scope in scopes]
+        primary_keys = [pk for future in pk_futures for pk in future.result()]
+        foreign_keys = [fk for future in fk_futures for fk in future.result()]
+    return primary_keys, foreign_keys
+
+def schema_scope(database, schema):
+    """Returns the `IN SCHEMA` clause for SHOW commands on one schema."""
+    return f"IN SCHEMA {quote_identifier(database)}.{quote_identifier(schema)}"
+
+def database_scope(database=None):
+    """Returns the `IN DATABASE` clause for SHOW commands, naming the database when given."""
+    return f"IN DATABASE {quote_identifier(database)}" if database else "IN DATABASE"
+
+def fetch_keys_excluding(conn, excluded_schemas, database=None):
+    """Runs the database-wide `SHOW ... KEYS` commands and filters out excluded schemas server-side with RESULT_SCAN."""
+    excluded_list = ','.join(quote_literal(schema) for schema in split_schemas(excluded_schemas))
+    scope = database_scope(database)
+    results = []
+    commands = ((f"SHOW PRIMARY KEYS {scope};", 'schema_name', 'query.primary_keys'),
+                (f"SHOW IMPORTED KEYS {scope};", 'fk_schema_name', 'query.imported_keys'))
+    for command, schema_column, stage_name in commands:
+        with metrics.stage(stage_name) as stage:
+            cursor = dict_cursor(conn)
+            cursor.execute(command)
+            cursor.execute(f'SELECT * FROM TABLE(RESULT_SCAN(LAST_QUERY_ID())) WHERE "{schema_column}" NOT IN ({excluded_list});')
+            results.append(cursor.fetchall())
+            stage.rows = len(results[-1])
+    return tuple(results)
+
+def fetch_keys(conn, table_set, database=None, included_schemas=None, excluded_schemas=None, scoped=True, workers=DEFAULT_KEY_WORKERS):
+    """
+    Fetches primary and foreign keys, keeping only those on tables in `table_set` ((schema, table) pairs).
+
+    With `scoped` and schema filters present, extraction is narrowed at the source: included schemas are
+    read with concurrent per-schema `SHOW ... IN SCHEMA` commands, and excluded-only filters are applied
+    with RESULT_SCAN. Otherwise, or if a scoped command fails, the database-wide commands are used.
+    The Python-side filter on `table_set` is always applied.
+    """
+    from snowflake.connector.errors import ProgrammingError
+
+    start = time.perf_counter()
+    primary_keys = foreign_keys = None
+    if scoped and included_schemas and database:
+        strategy = 'per-schema SHOW commands'
+        try:
+            primary_keys, foreign_keys = fetch_keys_per_schema(conn, database, split_schemas(included_schemas), workers)
+        except ProgrammingError as e:
+            logger.warning(f"Scoped key extraction failed, falling back to database-wide SHOW commands: {e}")
+    elif scoped and excluded_schemas:
+        strategy = 'RESULT_SCAN filtering'
+        try:
+            primary_keys, foreign_keys = fetch_keys_excluding(conn, excluded_schemas, database)
+        except ProgrammingError as e:
+            logger.warning(f"Scoped key extraction failed, falling back to database-wide SHOW commands: {e}")
+
+    if primary_keys is None:
+        strategy = 'database-wide SHOW commands'
+
+        # Fetching primary key details
+        pk_query = f"SHOW PRIMARY KEYS {database_scope(database)};"
+        primary_keys = run_query(conn, pk_query, 'query.primary_keys')
+
+        # Fetching foreign key details
+        fk_query = f"SHOW IMPORTED KEYS {database_scope(database)};"
+        foreign_keys = run_query(conn, fk_query, 'query.imported_keys')
+
+    logger.info(f"Fetched {len(primary_keys)} primary key and {len(foreign_keys)} imported key rows "
+                f"using {strategy} in {time.perf_counter() - start:.2f}s")
+
+    return filter_keys(primary_keys, foreign_keys, table_set)
+
+def filter_keys(primary_keys, foreign_keys, table_set):
+    """Keeps only the keys on tables in `table_set` ((schema, table) pairs)."""
+    filtered_pks = [pk for pk in primary_keys if (pk['schema_name'], pk['table_name']) in table_set]
+    filtered_fks = [fk for fk in foreign_keys if (fk['fk_schema_name'], fk['fk_table_name']) in table_set]
+    return filtered_pks, filtered_fks
+
+def assemble_data(tables, primary_keys, foreign_keys):
+    """Combines fetched tables (row dicts or a `Catalog`) and filtered keys into the structure `generate_dbml` consumes."""
+    if isinstance(tables, Catalog):
+        tables.primary_keys = primary_keys
+        tables.foreign_keys = foreign_keys
+        return tables
+
+    # Organize the results into structured data
+    data = {
+        'tables': tables,
+        'primary_keys': primary_keys,
+        'foreign_keys': foreign_keys
+    }
+
+    return data
+
+def merge_data(parts):
+    """Merges fetched results for disjoint partitions, in order, into one result of the same kind."""
+    if parts and isinstance(parts[0], Catalog):
+        merged = Catalog()
+        for part in parts:
+            merged.tables.update(part.tables)
+            merged.primary_keys.extend(part.primary_keys)
+            merged.foreign_keys.extend(part.foreign_keys)
+        return merged
+
+    merged = {'tables': [], 'primary_keys': [], 'foreign_keys': []}
+    for part in parts:
+        for key in merged:
+            merged[key].extend(part[key])
+    return merged
+
+def qualify_schema(database, schema):
+    """Prefixes a schema name with its database so schemas from several databases can share one diagram."""
+    return f"{database}{SCHEMA_QUALIFIER}{schema}"
+
+def qualify_hints(primary_key_hints, databases):
+    """
+    Returns `primary_key_hints` keyed by the table names of a result merging `databases`: a "schema.table" key
+    applies to that table in each database, and a "database.schema.table" key to that database's table only,
+    taking precedence.
+    """
+    qualified, explicit = {}, {}
+    extracted = {database.lower() for database in databases}
+    for name, hints in primary_key_hints.items():
+        parts = name.split('.')
+        if len(parts) == 3:
+            database, schema, table = parts
+            if database.lower() not in extracted:
+                logger.warning(f"Primary key hint {name} matches no table: {database} is not among {', '.join(databases)}.")
+            explicit[f"{qualify_schema(database.lower(), schema)}.{table}"] = hints
+        elif len(parts) == 2:
+            schema, table = parts
+            qualified.update((f"{qualify_schema(database.lower(), schema)}.{table}", hints) for database in databases)
+        else:
+            qualified[name] = hints
+    qualified.update(explicit)
+    return qualified
+
+def qualify_schemas(data, database):
+    """Returns fetched results with schema names rewritten by `qualify_schema`, including the referenced side of foreign keys."""
+    primary_keys, foreign_keys = key_rows(data)
+    primary_keys = [dict(pk, schema_name=qualify_schema(database, pk['schema_name'])) for pk in primary_keys]
+    foreign_keys = [dict(fk, fk_schema_name=qualify_schema(database, fk['fk_schema_name']),
+                         pk_schema_name=qualify_schema(fk.get('pk_database_name') or database, fk['pk_schema_name']))
+                    for fk in foreign_keys]
+
+    if isinstance(data, Catalog):
+        # Catalog records belong to this result only, so they are updated in place
+        tables = list(data.tables.values())
+        data.tables.clear()
+        for table in tables:
+            table.TABLE_SCHEMA = qualify_schema(database, table.TABLE_SCHEMA)
+            data.tables[(table.TABLE_SCHEMA, table.TABLE_NAME)] = table
+        return assemble_data(data, primary_keys, foreign_keys)
+
+    tables = [dict(row, TABLE_SCHEMA=qualify_schema(database, row['TABLE_SCHEMA'])) for row in data['tables']]
+    return assemble_data(tables, primary_keys, foreign_keys)
+
+def build_partitions(pool, databases, included_schemas=None, excluded_schemas=None, partition_by_schema=False):
+    """
+    Splits extraction into (database, included_schemas) partitions.
+    Without `partition_by_schema` there is one partition per database. With it, there is one per included
+    schema, or one per schema listed by `SHOW SCHEMAS` (minus excluded ones) when no schemas are included.
+    """
+    if not partition_by_schema:
+        return [(database, included_schemas) for database in databases]
+
+    partitions = []
+    excluded = set(split_schemas(excluded_schemas))
+    for database in databases:
+        if included_schemas:
+            schemas = split_schemas(included_schemas)
+        else:
+            with pool.connection() as conn:
+                schemas = [row['name'] for row in run_query(conn, f"SHOW SCHEMAS {database_scope(database)};")]
+        partitions.extend((database, schema) for schema in sorted(schemas) if schema not in excluded)
+    return partitions
+
+def table_keys(tables):
+    """Returns the (schema, table) pairs of fetched tables (row dicts or a `Catalog`)."""
+    if isinstance(tables, Catalog):
+        return set(tables.tables)
+    return {(row['TABLE_SCHEMA'], row['TABLE_NAME']) for row in tables}
+
+def fetch_tables_and_keys_async(conn, database, included_schemas=None, excluded_schemas=None, query_mode='join', stream=False,
+                                batch_size=DEFAULT_BATCH_SIZE, scoped_keys=True, poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+    Submits the table/column queries and the key SHOW commands together with `run_queries_async`.
+    Keys are scoped with per-schema commands when schemas are included. RESULT_SCAN filtering depends on the
+    previous query, so excluded-only filters use the database-wide commands here.
+    Returns (tables, primary_keys, foreign_keys), with keys filtered to the fetched tables.
+    """
+    from snowflake.connector import DictCursor
+
+    table_queries = build_tables_queries(database, included_schemas, excluded_schemas, query_mode)
+    if scoped_keys and included_schemas:
+        scopes = [schema_scope(database, schema) for schema in split_schemas(included_schemas)]
+    else:
+        scopes = [database_scope(database)]
+
+    queries = {f"tables_{index}": (query, None if stream else DictCursor) for index, query in enumerate(table_queries)}
+    for index, scope in enumerate(scopes):
+        queries[f"primary_keys_{index}"] = (f"SHOW PRIMARY KEYS {scope};", DictCursor)
+        queries[f"foreign_keys_{index}"] = (f"SHOW IMPORTED KEYS {scope};", DictCursor)
+    with metrics.stage('query.async', database=database):
+        cursors = run_queries_async(conn, queries, poll_interval)
+
+    tables = read_tables([cursors[f"tables_{index}"] for index in range(len(table_queries))],
+                         query_mode=query_mode, stream=stream, batch_size=batch_size)
+    primary_keys = [pk for index in range(len(scopes)) for pk in cursors[f"primary_keys_{index}"].fetchall()]
+    foreign_keys = [fk for index in range(len(scopes)) for fk in cursors[f"foreign_keys_{index}"].fetchall()]
+    return (tables, *filter_keys(primary_keys, foreign_keys, table_keys(tables)))
+
+def index_tables(data):
+    """
+    Indexes the tables of a `Catalog` or a `fetch_data` dict as {(schema, table): (LAST_DDL, columns)},
+    with columns as (name, data_type, comment) tuples in ordinal order.
+    """
+    if isinstance(data, Catalog):
+        return {key: (table.LAST_DDL, [(column.COLUMN_NAME, column.DATA_TYPE, column.COMMENT) for column in table.columns])
+                for key, table in data.tables.items()}
+
+    index = {}
+    for row in data['tables']:
+        key = (row['TABLE_SCHEMA'], row['TABLE_NAME'])
+        if key not in index:
+            index[key] = (row['LAST_DDL'], [])
+        if row['COLUMN_NAME'] is not None:
+            index[key][1].append((row['COLUMN_NAME'], row['DATA_TYPE'], row['COMMENT']))
+    return index
+
+def index_previous(previous, databases, per_database=False):
+    """
+    Splits an earlier `fetch_data` result into {database: index_tables(...)}, undoing the schema
+    qualification applied when several databases were merged into one result.
+    """
+    if per_database:
+        return {database: index_tables(previous[database]) for database in databases if database in previous}
+    index = index_tables(previous)
+    if len(databases) == 1:
+        return {databases[0]: index}
+
+    by_database = {database: {} for database in databases}
+    # Longest names first, so a quoted database name holding the separator doesn't claim another's schemas
+    prefixes = sorted(((qualify_schema(database, ''), database) for database in databases), key=lambda item: -len(item[0]))
+    for (schema, table), value in index.items():
+        for prefix, database in prefixes:
+            if schema.startswith(prefix):
+                by_database[database][(schema[len(prefix):], table)] = value
+                break
+    return by_database
+
+def build_changed_columns_queries(database, table_keys, chunk_size=DEFAULT_CHANGED_TABLES_PER_QUERY):
+    """Returns column-level queries for just the given (schema, table) pairs, `chunk_size` tables per query."""
+    queries = []
+    for start in range(0, len(table_keys), chunk_size):
+        predicates = ' OR '.join(f"(c.TABLE_SCHEMA = {quote_literal(schema)} AND c.TABLE_NAME = {quote_literal(table)})"
+                                 for schema, table in table_keys[start:start + chunk_size])
+        queries.append(f"""
+    SELECT c.TABLE_SCHEMA, c.TABLE_NAME, c.ORDINAL_POSITION, c.COLUMN_NAME, c.DATA_TYPE, c.COMMENT
+    FROM {quote_identifier(database)}.INFORMATION_SCHEMA.COLUMNS c
+    WHERE c.TABLE_CATALOG = {quote_literal(database)} AND ({predicates})
+    ORDER BY c.TABLE_SCHEMA, c.TABLE_NAME, c.ORDINAL_POSITION;
+    """)
+    return queries
+
+def refresh_tables(conn, database, previous, included_schemas=None, excluded_schemas=None, stream=False):
+    """
+    Refreshes table and column metadata against `previous` (see `index_tables`).
+    The table-level query runs in full, as it returns one row per table; columns are only queried for
+    tables that are new or whose LAST_DDL changed. Tables no longer returned are dropped.
+    Returns the joined row dicts, or a `Catalog` when `stream` is set.
+    """
+    tables_query, _ = build_split_queries(database, included_schemas, excluded_schemas)
+    table_rows = run_query(conn, tables_query, 'query.tables')
+
+    changed = [(row['TABLE_SCHEMA'], row['TABLE_NAME']) for row in table_rows
+               if (row['TABLE_SCHEMA'], row['TABLE_NAME']) not in previous
+               or row['LAST_DDL'] is None or previous[(row['TABLE_SCHEMA'], row['TABLE_NAME'])][0] != row['LAST_DDL']]
+    changed_set = set(changed)
+    if len(changed) > len(table_rows) // 2:
+        # Mostly new or changed: one schema-filtered column query is cheaper than naming every table
+        _, columns_query = build_split_queries(database, included_schemas, excluded_schemas)
+        column_rows = [column for column in run_query(conn, columns_query, 'query.columns') if (column['TABLE_SCHEMA'], column['TABLE_NAME']) in changed_set]
+    else:
+        column_rows = [column for query in build_changed_columns_queries(database, changed) for column in run_query(conn, query, 'query.columns')]
+    fetched_columns = len(column_rows)
+
+    for row in table_rows:
+        key = (row['TABLE_SCHEMA'], row['TABLE_NAME'])
+        if key in changed_set:
+            continue
+        for position, (name, data_type, comment) in enumerate(previous[key][1], start=1):
+            column_rows.append({'TABLE_SCHEMA': key[0], 'TABLE_NAME': key[1], 'ORDINAL_POSITION': position,
+                                'COLUMN_NAME': name, 'DATA_TYPE': data_type, 'COMMENT': comment})
+
+    dropped = len(set(previous) - table_keys(table_rows))
+    logger.info(f"Incremental refresh of {database}: {len(table_rows)} tables, {len(changed)} new or changed, {dropped} dropped; "
+                f"fetched {fetched_columns} column rows instead of {len(column_rows)}.")
+
+    rows = join_tables_and_columns(table_rows, column_rows)
+    if not stream:
+        return rows
+    catalog = Catalog()
+    for row in rows:
+        catalog.add_row(row)
+    return catalog
+
+def fetch_partition(pool, database, included_schemas=None, excluded_schemas=None, stream=False, batch_size=DEFAULT_BATCH_SIZE,
+                    query_mode='join', scoped_keys=True, async_queries=False, previous=None):
+    """
+    Fetches tables and keys for one partition over a pooled connection.
+    With `previous` (see `index_tables`), tables and columns are refreshed incrementally with `refresh_tables`.
+    The 'show' query mode reads everything with SHOW commands (see `fetch_tables_show`).
+    """
+    from snowflake.connector.errors import ProgrammingError
+
+    start = time.perf_counter()
+    with pool.connection() as conn:
+        if query_mode == 'show':
+            tables = fetch_tables_show(conn, database, included_schemas, excluded_schemas, stream=stream)
+            # RESULT_SCAN filtering needs a warehouse, so keys of excluded schemas are dropped locally instead
+            primary_keys, foreign_keys = fetch_keys(conn, table_keys(tables), database, included_schemas, scoped=scoped_keys)
+        elif previous is not None:
+            tables = refresh_tables(conn, database, previous, included_schemas, excluded_schemas, stream=stream)
+            primary_keys, foreign_keys = fetch_keys(conn, table_keys(tables), database, included_schemas, excluded_schemas, scoped=scoped_keys)
+        elif async_queries:
+            options = dict(query_mode=query_mode, stream=stream, batch_size=batch_size)
+            try:
+                tables, primary_keys, foreign_keys = fetch_tables_and_keys_async(
+                    conn, database, included_schemas, excluded_schemas, scoped_keys=scoped_keys, **options)
+            except ProgrammingError as e:
+                if not (scoped_keys and included_schemas):
+                    raise
+                logger.warning(f"Scoped key extraction failed, falling back to database-wide SHOW commands: {e}")
+                tables, primary_keys, foreign_keys = fetch_tables_and_keys_async(
+                    conn, database, included_schemas, excluded_schemas, scoped_keys=False, **options)
+        else:
+            tables = fetch_tables(conn, database, included_schemas, excluded_schemas,
+                                  query_mode=query_mode, stream=stream, batch_size=batch_size)
+            primary_keys, foreign_keys = fetch_keys(conn, table_keys(tables), database, included_schemas, excluded_schemas, scoped=scoped_keys)
+
+    logger.info(f"Fetched partition {database}{'.' + included_schemas if included_schemas else ''}: "
+                f"{len(table_keys(tables))} tables in {time.perf_counter() - start:.2f}s")
+    return assemble_data(tables, primary_keys, foreign_keys)
+
+def check_connection_params(connection_params, query_mode='join'):
+    """
+    Raises ValueError for an unknown query mode or missing connection parameters, and returns the parameters to
+    connect with: SHOW commands run without a warehouse, so an empty one is dropped in 'show' mode.
+    """
+    if query_mode not in QUERY_MODES:
+        raise ValueError(f"Unknown query mode {query_mode}. Expected one of: {', '.join(QUERY_MODES)}")
+
+    # Validate required connection parameters; SHOW commands run without a warehouse
+    required_params = ['user', 'password', 'account', 'warehouse', 'database', 'role']
+    if query_mode == 'show':
+        required_params.remove('warehouse')
+        if not connection_params.get('warehouse'):
+            connection_params = {key: value for key, value in connection_params.items() if key != 'warehouse'}
+    missing_params = [param for param in required_params if not connection_params.get(param)]
+    if missing_params:
+        raise ValueError(f"Missing required connection parameters: {', '.join(missing_params)}")
+    return connection_params
+
+def fetch_data(connection_params, included_schemas=None, excluded_schemas=None, stream=False, batch_size=DEFAULT_BATCH_SIZE, query_mode='join',
+               scoped_keys=True, workers=1, partition_by_schema=False, per_database=False, async_queries=False, previous=None, pool=None):
+    """
+    Fetch table metadata along with primary and foreign key information.
+
+    By default the result is a dict of row dicts. With `stream`, table and column rows are pulled in
+    batches of `batch_size` and folded into a compact `Catalog`, which `generate_dbml` accepts as well.
+    `query_mode` is 'join' (one TABLES x COLUMNS query), 'split' (a table-level and a narrow column-level
+    query joined client-side, which avoids sending table-level fields once per column) or 'show' (SHOW commands
+    only, which need no warehouse, so `connection_params['warehouse']` is optional). In 'show' mode,
+    `async_queries` and `previous` don't apply: the SHOW commands run concurrently and are always read in full.
+    With `scoped_keys`, key extraction is narrowed to the schema filters server-side (see `fetch_keys`).
+
+    `connection_params['database']` may name several databases, as a list or a comma-separated string.
+    Extraction is split into partitions (one per database, or one per schema with `partition_by_schema`)
+    that run on `workers` threads sharing a pool of at most `workers` connections. Results for several
+    databases are merged with database-qualified schema names, or returned as {database: data} with `per_database`.
+    With `async_queries`, each partition submits all of its metadata queries at once (see `run_queries_async`).
+    `previous` is an earlier result for the same parameters (same layout as returned). When given, tables are
+    refreshed incrementally: only new tables and tables whose LAST_DDL changed have their columns re-queried,
+    and dropped tables are removed. Keys are always re-read.
+    `pool` is an open `ConnectionPool` to borrow connections from instead of logging in (and out) for this call,
+    which keeps sessions warm across calls; it is left open.
+    """
+
+    # If connection_params not passed, then load connection params from envvars
+    if not connection_params:
+        connection_params = load_config()
+
+    # If included_schemas or excluded_schemas not passed, then load from connection_params
+    if not included_schemas:
+        included_schemas = connection_params.get('included_schemas')
+    if not excluded_schemas:
+        excluded_schemas = connection_params.get('excluded_schemas')
+
+    connection_params = check_connection_params(connection_params, query_mode)
+    databases = split_databases(connection_params['database'])
+    options = dict(stream=stream, batch_size=batch_size, query_mode=query_mode, scoped_keys=scoped_keys, async_queries=async_queries)
+    previous_by_database = index_previous(previous, databases, per_database) if previous is not None else {}
+
+    start = time.perf_counter()
+    with metrics.stage('fetch', databases=len(databases)):
+        with nullcontext(pool) if pool is not None else ConnectionPool(dict(connection_params, database=databases[0]), size=max(1, workers)) as pool:
+            partitions = build_partitions(pool, databases, included_schemas, excluded_schemas, partition_by_schema)
+            logger.info(f"Fetching {len(partitions)} partitions from {len(databases)} databases with {workers} workers.")
+            if workers > 1 and len(partitions) > 1:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(fetch_partition, pool, database, schemas, excluded_schemas,
+                                               previous=previous_by_database.get(database), **options)
+                               for database, schemas in partitions]
+                    results = [future.result() for future in futures]
+            else:
+                results = [fetch_partition(pool, database, schemas, excluded_schemas, previous=previous_by_database.get(database), **options)
+                           for database, schemas in partitions]
+    logger.info(f"Fetched {len(partitions)} partitions in {time.perf_counter() - start:.2f}s")
+
+    # Merge partitions per database, keeping database order
+    by_database = {}
+    for (database, _), result in zip(partitions, results):
+        by_database.setdefault(database, []).append(result)
+    by_database = {database: merge_data(parts) for database, parts in by_database.items()}
+
+    if per_database:
+        return by_database
+    if len(databases) == 1:
+        return by_database[databases[0]]
+    return merge_data([qualify_schemas(data, database) for database, data in by_database.items()])
+
+def iter_partitions(connection_params, included_schemas=None, excluded_schemas=None, stream=False, batch_size=DEFAULT_BATCH_SIZE,
+                    query_mode='join', scoped_keys=True, workers=1, async_queries=False):
+    """
+    Yields the result of each schema partition (see `build_partitions`) in turn, in the layout `fetch_data`
+    returns, so a caller rendering one schema at a time holds a single schema's metadata rather than the
+    whole catalog. At most `workers` partitions are fetched ahead on a pool of `workers` connections.
+    Schemas of several databases are qualified, as `fetch_data` does when it merges them. The options are
+    those of `fetch_data`; the connection is closed once the last partition has been yielded.
+    """
+    connection_params = connection_params or load_config()
+    included_schemas = included_schemas or connection_params.get('included_schemas')
+    excluded_schemas = excluded_schemas or connection_params.get('excluded_schemas')
+    connection_params = check_connection_params(connection_params, query_mode)
+    databases = split_databases(connection_params['database'])
+    options = dict(stream=stream, batch_size=batch_size, query_mode=query_mode, scoped_keys=scoped_keys, async_queries=async_queries)
+    workers = max(1, workers)
+
+    def fetch(database, schema):
+        data = fetch_partition(pool, database, schema, excluded_schemas, **options)
+        return qualify_schemas(data, database) if len(databases) > 1 else data
+
+    with ConnectionPool(dict(connection_params, database=databases[0]), size=workers) as pool, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        partitions = build_partitions(pool, databases, included_schemas, excluded_schemas, partition_by_schema=True)
+        logger.info(f"Fetching {len(partitions)} partitions from {len(databases)} databases in turn, up to {workers} ahead.")
+        pending = deque()
+        for database, schema in partitions:
+            pending.append(executor.submit(fetch, database, schema))
+            if len(pending) >= workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -2,17 +2,28 @@
 import argparse
 import getpass
 import os
-from datetime import datetime
-from collections import defaultdict
-import snowflake.connector
-from pydbml import PyDBML, Database
-from pydbml.classes import Project, Table, Column, Reference, Note, TableGroup
-from snowflake.connector import DictCursor
-from snowflake_dbml.config import load_config, load_primary_key_hints, load_visualization_params
+import sys
+import time
+# snowflake.connector and pydbml are slow to import, so they are imported in the functions that use them:
+# --help, --version, library imports and rendering with the writer don't load them. The modules behind
+# --serve (http.server), snapshots, exports, validation and the writer are likewise imported by the
+# run_generator branches that use them.
+from snowflake_dbml.catalog import DEFAULT_BATCH_SIZE
+from snowflake_dbml import metrics
+from snowflake_dbml.config import (
+    DEFAULT_CACHE_DIR, load_config, load_env, load_hints_file, load_primary_key_hints, load_visualization_params,
+)
+from snowflake_dbml.extract import QUERY_MODES, fetch_data, qualify_hints, split_databases
+from snowflake_dbml.model import (
+    add_reference, add_table, build_key_index, collect_references, generate_table_notes, infer_relationships, iter_tables,
+    key_rows, project_note_text, resolve_visualization_params, summarize_data, table_header,
+)
 from snowflake_dbml.version import __version__
 
 import logging
 
+__all__ = ['fetch_data', 'generate_dbml', 'infer_relationships', 'main', 'run_generator']
+
 # Configure the logger for the module
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)  # Set the default logging level
@@ -20,86 +31,20 @@ logger.setLevel(logging.DEBUG)  # Set the default logging level
 # Handler setup is minimal; assume the caller will configure it.
 logger.addHandler(logging.NullHandler())
 
-def fetch_data(connection_params, included_schemas=None, excluded_schemas=None):
-    """Fetch table metadata along with primary and foreign key information."""
-
-    # If connection_params not passed, then load connection params from envvars
-    if not connection_params:
-        connection_params = load_config()
-
-    # If included_schemas or excluded_schemas not passed, then load from connection_params
-    if not included_schemas:
-        included_schemas = connection_params.get('included_schemas')
-    if not excluded_schemas:
-        excluded_schemas = connection_params.get('excluded_schemas')
-
-    # Validate required connection parameters
-    required_params = ['user', 'password', 'account', 'warehouse', 'database', 'role']
-    missing_params = [param for param in required_params if not connection_params.get(param)]
-    if missing_params:
-        raise ValueError(f"Missing required connection parameters: {', '.join(missing_params)}")    
-
-    conn = snowflake.connector.connect(**connection_params)
-    cursor = conn.cursor(DictCursor)
-
-    # Construct schema filter for querying tables and columns
-    schema_filter = ""
-    if included_schemas:
-        included_list = ','.join(f"'{schema.strip()}'" for schema in included_schemas.split(','))
-        schema_filter += f" AND t.TABLE_SCHEMA IN ({included_list})"
-    if excluded_schemas:
-        excluded_list = ','.join(f"'{schema.strip()}'" for schema in excluded_schemas.split(','))
-        schema_filter += f" AND t.TABLE_SCHEMA NOT IN ({excluded_list})"
-
-    # Fetching table and column details
-    table_query = f"""
-    SELECT t.TABLE_SCHEMA, t.TABLE_NAME, t.TABLE_TYPE, t.IS_DYNAMIC, t.AUTO_CLUSTERING_ON, t.COMMENT AS TABLE_COMMENT,
-           t.ROW_COUNT, t.BYTES, t.CREATED, t.LAST_DDL, t.LAST_ALTERED,
-           t.TABLE_OWNER, t.LAST_DDL_BY, t.CLUSTERING_KEY,
-           c.COLUMN_NAME, c.DATA_TYPE, c.COMMENT
-    FROM INFORMATION_SCHEMA.TABLES t
-    LEFT JOIN INFORMATION_SCHEMA.COLUMNS c ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
-    WHERE t.TABLE_CATALOG = '{connection_params['database']}' {schema_filter}
-    ORDER BY t.TABLE_SCHEMA, t.TABLE_NAME, c.ORDINAL_POSITION;
-    """
-    cursor.execute(table_query)
-    tables_and_columns = cursor.fetchall()
-
-    # Fetching primary key details
-    pk_query = "SHOW PRIMARY KEYS IN DATABASE;"
-    cursor.execute(pk_query)
-    primary_keys = cursor.fetchall()
-
-    # Fetching foreign key details
-    fk_query = "SHOW IMPORTED KEYS IN DATABASE;"
-    cursor.execute(fk_query)
-    foreign_keys = cursor.fetchall()
-
-    conn.close()
-
-    # Filter keys to include only those related to fetched tables
-    table_set = {(row['TABLE_SCHEMA'], row['TABLE_NAME']) for row in tables_and_columns}
-    filtered_pks = [pk for pk in primary_keys if (pk['schema_name'], pk['table_name']) in table_set]
-    filtered_fks = [fk for fk in foreign_keys if (fk['fk_schema_name'], fk['fk_table_name']) in table_set]
-
-    # Organize the results into structured data
-    data = {
-        'tables': tables_and_columns,
-        'primary_keys': filtered_pks,
-        'foreign_keys': filtered_fks
-    }
-
-    return data
 
-def generate_dbml(data, connection_params=None, primary_key_hints=None, visualization_params=None):
+def generate_dbml(data, connection_params=None, primary_key_hints=None, visualization_params=None, validator=None,
+                  relationship_rules=None):
     """
     Generates a DBML representation of a Snowflake database based on the provided data.
 
     Args:
-        data (dict): The data containing information about the tables, columns, primary keys, and foreign keys.
+        data (dict or Catalog): The data containing information about the tables, columns, primary keys, and foreign keys,
+            either as returned by `fetch_data` or as a streamed `Catalog`.
         connection_params (dict, optional): The connection parameters for the Snowflake database. Defaults to None.
         primary_key_hints (dict, optional): The primary key hints for inferring relationships. Defaults to None.
         visualization_params (dict, optional): The visualization parameters for customizing the DBML output. Defaults to None.
+        validator (RelationshipValidator, optional): Checks inferred relationships against the data. Defaults to None.
+        relationship_rules (RelationshipRules, optional): Pattern rules inferring further relationships. Defaults to None.
 
     Returns:
         str: The DBML representation of the Snowflake database.
@@ -108,229 +53,90 @@ def generate_dbml(data, connection_params=None, primary_key_hints=None, visualiz
         None
 
     """
+    from pydbml import Database
+    from pydbml.classes import Project, Table, Column, Reference, Note, TableGroup
+    from snowflake_dbml.writer import table_group_name
+
+    start = time.perf_counter()
     db = Database()
 
     # Load visualization params, primary key hints, and connection params
-    vis_params_default = load_visualization_params()
-    if visualization_params:
-        for key in vis_params_default:
-            if key in visualization_params and visualization_params[key]:
-                vis_params_default[key] = visualization_params[key]
-    visualization_params = vis_params_default
-
+    visualization_params = resolve_visualization_params(visualization_params)
     primary_key_hints = primary_key_hints or load_primary_key_hints()
     connection_params = connection_params or load_config()
 
     # Create the project and add metadata note
     project = Project(name=connection_params['database'])
-    note_text = f"Generated using snowflake-dbml on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n" \
-                f"Database: {connection_params['database']}\n" \
-                f"Database User: {connection_params['user']}\n" \
-                f"Included Schemas: {connection_params.get('included_schemas', 'All')}\n" \
-                f"Excluded Schemas: {connection_params.get('excluded_schemas', 'None')}"
-    project.note = Note(text=note_text)
+    project.note = Note(text=project_note_text(connection_params))
     db.add_project(project)
 
     # Initialize table group mapping
     table_groups = {}
     tables = {}
 
+    primary_keys, foreign_key_rows = key_rows(data)
+
+    # Index primary keys and columns up front so tagging and FK resolution are constant-time lookups
+    primary_key_index = build_key_index(primary_keys)
+    column_index = {}
+
     # 
     # Create tables, columns, and handle primary keys
     # 
-    for row in data['tables']:
-        schema = row['TABLE_SCHEMA'].lower()
-        table_name = row['TABLE_NAME'].lower()
-        full_table_name = f"{schema}.{table_name}"
+    with metrics.stage('render.tables') as stage:
+        for table_row, column_rows in iter_tables(data):
+            schema = table_row['TABLE_SCHEMA'].lower()
+            table_name = table_row['TABLE_NAME'].lower()
+            full_table_name = f"{schema}.{table_name}"
 
-        if full_table_name not in tables:
             # Determine the header color and type for the table
-            is_dynamic = row['IS_DYNAMIC'] == 'YES'
-            table_color = visualization_params['view_color'] if row['TABLE_TYPE'] == 'VIEW' else visualization_params['dynamic_table_color'] if is_dynamic else visualization_params['table_color']
-            emoji = "🚀 " if is_dynamic else ""
-            table = Table(schema=schema, name=table_name, header_color=table_color, note=generate_table_notes(row, row['TABLE_TYPE'], emoji=emoji))
+            table_color, emoji = table_header(table_row, visualization_params)
+            table = Table(schema=schema, name=table_name, header_color=table_color, note=generate_table_notes(table_row, table_row['TABLE_TYPE'], emoji=emoji))
 
             # Group tables by schema
             if schema not in table_groups:
-                table_groups[schema] = TableGroup(name=schema, items=[table])
-            elif table not in table_groups[schema].items:
+                table_groups[schema] = TableGroup(name=table_group_name(schema), items=[table])
+            else:
                 table_groups[schema].items.append(table)
 
-            db.add_table(table)
+            add_table(db, table)
             tables[full_table_name] = table
-        else:
-            table = tables[full_table_name]
-
-        # Add column and tag primary keys where applicable
-        column = Column(name=row['COLUMN_NAME'], type=row['DATA_TYPE'])
-        if row.get('COMMENT'):
-            column.note = Note(text=row['COMMENT'])
-        # Check if column is a primary key
-        for pk in data['primary_keys']:
-            if pk['column_name'] == row['COLUMN_NAME'] and pk['table_name'].lower() == table_name:
-                column.pk = True
-        table.add_column(column)
 
-    # 
-    # Handle foreign keys returned from snowflake
-    # 
-    
-    # Initialize storage for foreign key columns to handle composite keys
-    foreign_keys = defaultdict(lambda: {'from_cols': [], 'to_cols': [], 'from_table': None, 'to_table': None})
-
-    # Collect foreign key columns grouped by foreign key name
-    for fk in data['foreign_keys']:
-        key_name = fk['fk_name']
-        schema_fk = fk['fk_schema_name'].lower()
-        table_fk = fk['fk_table_name'].lower()
-        schema_pk = fk['pk_schema_name'].lower()
-        table_pk = fk['pk_table_name'].lower()
-        
-        # Ensure the tables are loaded in the DBML database object
-        if f"{schema_fk}.{table_fk}" in db.table_dict and f"{schema_pk}.{table_pk}" in db.table_dict:
-            from_table = db[f"{schema_fk}.{table_fk}"]
-            to_table = db[f"{schema_pk}.{table_pk}"]
-            from_column = from_table[fk['fk_column_name']]
-            to_column = to_table[fk['pk_column_name']]
-            
-            # Append to the list maintaining the order as per 'key_sequence'
-            foreign_keys[key_name]['from_cols'].append((fk['key_sequence'], from_column))
-            foreign_keys[key_name]['to_cols'].append((fk['key_sequence'], to_column))
-            foreign_keys[key_name]['from_table'] = from_table
-            foreign_keys[key_name]['to_table'] = to_table
-
-    # Create foreign key references for each group
-    for key, cols in foreign_keys.items():
-        # Sort columns by key sequence to maintain the correct order
-        cols['from_cols'].sort()
-        cols['to_cols'].sort()
-        
-        # Extract columns from sorted tuples
-        from_columns = [col for _, col in cols['from_cols']]
-        to_columns = [col for _, col in cols['to_cols']]
-
-        # Create a Reference object with composite keys if needed
-        reference = Reference(type='>', col1=from_columns, col2=to_columns, comment=f"Foreign key relationship {key}.")
-        db.add_reference(reference)
+            for row in column_rows:
+                # Add column and tag primary keys where applicable
+                column = Column(name=row['COLUMN_NAME'], type=row['DATA_TYPE'])
+                if row.get('COMMENT'):
+                    column.note = Note(text=row['COMMENT'])
+                column_key = (schema, table_name, row['COLUMN_NAME'])
+                if column_key in primary_key_index:
+                    column.pk = True
+                table.add_column(column)
+                column_index.setdefault(column_key, column)
+        stage.objects = len(tables) + len(column_index)
 
     # 
-    # infer foreign keys using primary key hints
+    # Handle foreign keys returned from snowflake, then infer foreign keys using primary key hints
     # 
-    relationships = infer_relationships(tables, primary_key_hints)
-    for rel in relationships:
-        db.add_reference(rel)
+    
+    # Duplicates across declared and inferred relationships are merged, so each column pair gets one reference
+    with metrics.stage('render.references') as stage:
+        references = collect_references(foreign_key_rows, column_index, tables, primary_key_hints, validator=validator,
+                                        relationship_rules=relationship_rules)
+        for from_columns, to_columns, comment in references:
+            add_reference(db, Reference(type='>', col1=from_columns, col2=to_columns, comment=comment))
+        stage.objects = len(references)
 
     # Add table groups to the database
     for group in table_groups.values():
         db.add_table_group(group)
 
     # Generate and return DBML representation
-    return db.dbml
-
-def infer_relationships(tables, primary_key_hints):
-    """
-    Infers and creates DBML Reference objects based on primary and natural key relationships.
-    `tables` is a dictionary with table names as keys and pydbml Table objects as values.
-    """
-    references = []
-
-    # Infer relationships based on natural keys and primary keys
-    for table_name, table in tables.items():
-        if table_name not in primary_key_hints:
-            continue
-
-        hints = primary_key_hints[table_name]
-        natural_keys = hints.get('natural_key', [])
-        primary_key = hints.get('primary_key', {})
-        
-        # Check all tables for matching natural keys
-        for other_table_name, other_table in tables.items():
-            if other_table_name != table_name:
-                other_table_column_names = {col.name for col in other_table.columns}
-                table_column_names = {col.name for col in table.columns}
-
-                # Natural key relationships
-                if len(natural_keys) > 0:
-                    if set(natural_keys).issubset(other_table_column_names) and set(natural_keys).issubset(table_column_names):
-                        from_columns = [col for col in other_table.columns if col.name in natural_keys]
-                        to_columns = [col for col in table.columns if col.name in natural_keys]
-                        if from_columns and to_columns:
-                            ref = Reference(type='>', 
-                                        col1=from_columns, 
-                                        col2=to_columns,
-                                        comment=f"Natural key relationship inferred from primary key hints for {table_name}.")
-                            references.append(ref)
-
-                # Primary key relationships
-                if primary_key:
-                    pk_column_name = primary_key['column']
-                    for ref_as in primary_key['reference_as']:
-                        # Find the matching column object in other_table
-                        from_column = next((column for column in other_table.columns if column.name == ref_as), None)
-
-                        # Find the matching column object in table
-                        to_column = next((column for column in table.columns if column.name == pk_column_name), None)
-
-                        if from_column and to_column:
-                            ref = Reference(
-                                type='>',
-                                col1=[from_column],  # Use the actual Column object
-                                col2=[to_column],    # Use the actual Column object
-                                comment=f"Primary key relationship inferred from primary key hints for {table_name}."
-                            )
-                            references.append(ref)
-
-
-    return references
-
-
-def escape_dbml_string(text):
-    """Escapes single quotes in DBML strings by adding a backslash."""
-    return text.replace("'", "\\'").strip()
-
-def generate_table_notes(row, table_type, emoji):
-    is_dynamic = row['IS_DYNAMIC'] == 'YES'
-    note_content = f"{emoji}{'DYNAMIC TABLE' if is_dynamic else table_type}\n"
-    if row['TABLE_COMMENT']:
-        note_content += f"Comment: {escape_dbml_string(row['TABLE_COMMENT'])}\n"
-    if row['TABLE_TYPE'] != 'VIEW':
-        note_content += f"\nMetrics:\n- Rows: {format_number(row['ROW_COUNT'])}\n- Size: {human_readable_size(row['BYTES'])}\n"
-        note_content += f"\nTimestamps:\n- Created: {row['CREATED']}\n- Last DDL: {row['LAST_DDL']}\n- Last Altered: {row['LAST_ALTERED']}\n"
-        note_content += f"\nOwnership:\n- Owner: {row['TABLE_OWNER']}\n- Last DDL By: {row['LAST_DDL_BY']}\n"
-        clustering_value = row['CLUSTERING_KEY'] if row['CLUSTERING_KEY'] else '<none>'
-        note_content += f"\nClustering:\n- Clustering Key: {clustering_value}\n-Auto Clustering: {row['AUTO_CLUSTERING_ON']}\n"
-    return note_content
-
-def format_column_name(name):
-    """Encloses column names with spaces in double quotes."""
-    return f'"{name}"' if ' ' in name else name
-
-def format_number(value):
-    """Formats numbers with commas."""
-    return f"{value:,}" if value is not None else "Unknown"
-
-def human_readable_size(size, precision=2):
-    if size is None:
-        return "Unknown size"
-    suffixes = ['B', 'KB', 'MB', 'GB', 'TB']
-    suffix_index = 0
-    while size >= 1024 and suffix_index < 4:
-        suffix_index += 1
-        size /= 1024.0
-    return f"{size:.{precision}f} {suffixes[suffix_index]}"
-
-def format_multiline_note(note_content, indent_level=2):
-    """
-    Formats a multiline note with proper indentation.
-    :param note_content: The content of the note.
-    :param indent_level: Number of indentations (each indentation is 2 spaces by default in DBML).
-    :return: Formatted multiline note.
-    """
-    indentation = '  ' * indent_level
-    last_indentation = '  ' * max((indent_level - 1),0)
-    note_lines = note_content.strip().split('\n')
-    formatted_lines = [indentation + line.strip() for line in note_lines]
-    return "'''\n" + '\n'.join(formatted_lines) + "\n" + last_indentation + "'''\n"
+    with metrics.stage('render.dbml') as stage:
+        dbml = db.dbml
+        stage.bytes = len(dbml)
+    logger.info(f"Rendered DBML with {len(references)} references ({references.candidates} relationships before merging duplicates) "
+                f"in {time.perf_counter() - start:.2f}s")
+    return dbml
 
 def prompt_for_config(existing_config):
     print("Entering interactive mode to gather necessary configuration parameters.")
@@ -388,8 +194,8 @@ def main():
     parser.add_argument('--user', type=str, help='Snowflake user name')
     parser.add_argument('--password', type=str, help='Snowflake password')
     parser.add_argument('--account', type=str, help='Snowflake account identifier')
-    parser.add_argument('--warehouse', type=str, help='Snowflake warehouse')
-    parser.add_argument('--database', type=str, help='Snowflake database name')
+    parser.add_argument('--warehouse', type=str, help='Snowflake warehouse (optional with --query-mode show)')
+    parser.add_argument('--database', type=str, help='Snowflake database name, or a comma-separated list of databases')
     parser.add_argument('--role', type=str, help='Snowflake role')
     parser.add_argument('--config-file', type=str, help='Path to the config JSON file (contains primary/foreign key hints)')
     parser.add_argument('--included-schemas', type=str, help='Comma-separated list of schemas to include')
@@ -398,8 +204,35 @@ def main():
     parser.add_argument('--view-color', type=str, help='Color for view headers in DBML.')
     parser.add_argument('--dynamic-table-color', type=str, help='Color for dynamic table headers in DBML.')
     parser.add_argument('--interactive', action='store_true', help='Enter interactive mode to configure parameters interactively')
+    parser.add_argument('--stream', action='store_true', help='Stream table metadata in batches into a compact catalog to reduce peak memory')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows fetched per batch when streaming')
+    parser.add_argument('--unscoped-keys', action='store_true', help='Always read primary and foreign keys for the whole database and filter them locally')
+    parser.add_argument('--query-mode', choices=QUERY_MODES, default='join', help='Fetch tables and columns in one joined query, in separate table and column queries joined client-side, or with SHOW commands that need no warehouse')
+    parser.add_argument('--async-queries', action='store_true', help='Submit all metadata queries at once and collect results as they complete')
+    parser.add_argument('--workers', type=int, default=1, help='Number of partitions extracted concurrently, each on a pooled connection')
+    parser.add_argument('--partition-by-schema', action='store_true', help='Extract each schema as a separate partition instead of each database')
+    parser.add_argument('--output-dir', type=str, help='Write one <database>.dbml file per database to this directory instead of printing a merged diagram')
+    parser.add_argument('--output', type=str, help='Write the DBML to this file table by table instead of building the whole document in memory and printing it')
+    parser.add_argument('--shard-dir', type=str, help='Write one DBML file per schema, plus index.dbml for cross-schema references, to this directory')
+    parser.add_argument('--cache-dir', type=str, help=f'Save fetched metadata as local snapshots in this directory (default {DEFAULT_CACHE_DIR} when --max-age or --offline is used)')
+    parser.add_argument('--max-age', type=int, help='Reuse a local metadata snapshot younger than this many seconds instead of querying Snowflake')
+    parser.add_argument('--offline', action='store_true', help='Render from the local metadata snapshot only, without connecting to Snowflake')
+    parser.add_argument('--incremental', action='store_true', help='Refresh the local metadata snapshot, re-querying columns only for new tables and tables whose LAST_DDL changed')
+    parser.add_argument('--changed-only', action='store_true', help='Write only the tables added or changed since the last run with --changed-only, and list removed tables')
+    parser.add_argument('--source', type=str, help='Read metadata from INFORMATION_SCHEMA and SHOW KEYS exports (Parquet, CSV or JSON) in this directory instead of connecting to Snowflake')
+    parser.add_argument('--validate-relationships', nargs='?', const='drop', choices=('drop', 'annotate'), help='Check inferred relationships against the data in batched queries, and drop (default) or annotate those that fail')
+    parser.add_argument('--validation-method', choices=('containment', 'approximate'), default='containment', help='Check sampled values exactly, or compare approximate distinct counts without joining')
+    parser.add_argument('--validation-budget', type=int, help='Seconds of warehouse time validation may use; unchecked relationships are kept and annotated')
+    parser.add_argument('--validation-batch-size', type=int, default=50, help='Inferred relationships checked per validation query')
+    parser.add_argument('--validation-workers', type=int, default=4, help='Validation queries run concurrently')
+    parser.add_argument('--serve', nargs='?', const='', metavar='[HOST:]PORT', help='Keep a connection and the extracted catalog in memory and serve DBML over HTTP (default 127.0.0.1:8765)')
+    parser.add_argument('--refresh-interval', type=int, help='Seconds between catalog refreshes when serving (default 3600; 0 refreshes on request only)')
+    parser.add_argument('--profile', action='store_true', help='Print wall time, rows, bytes, objects and peak RSS per stage to stderr when done')
+    parser.add_argument('--metrics-file', type=str, help='Write per-stage metrics to this file: Prometheus text format if it ends in .prom, JSON otherwise')
     
     args = parser.parse_args()
+    # After parsing, so --help and --version don't read .env
+    load_env()
 
     if args.interactive:
         config = prompt_for_config({})
@@ -418,7 +251,11 @@ def main():
             'role': args.role or config['role'],
         }
 
-        primary_key_hints = load_primary_key_hints(args.config_file or config.get('config_file'))
+        primary_key_hints, rules = load_hints_file(args.config_file or config.get('config_file'))
+        relationship_rules = None
+        if rules:
+            from snowflake_dbml.rules import RelationshipRules
+            relationship_rules = RelationshipRules(rules)
 
         if args.included_schemas:
             config['included_schemas'] = args.included_schemas
@@ -438,18 +275,181 @@ def main():
     masked_params = mask_sensitive_info(connection_params)
     logger.debug(f"Connection Params: {masked_params}")
     logger.debug(f"Primary Key Hints: {primary_key_hints}")
+    logger.debug(f"Relationship Rules: {len(relationship_rules) if relationship_rules else 0}")
     logger.debug(f"Visualization Params: {visualization_params}")
 
-    logger.info(f"Fetching data from Snowflake starting.")
-    data = fetch_data(connection_params, config['included_schemas'], config['excluded_schemas'])
-    logger.info(f"Fetching data from Snowflake complete.")
+    report = metrics.add_listener(metrics.MetricsReport()) if args.profile or args.metrics_file else None
+    try:
+        run_generator(args, config, connection_params, primary_key_hints, visualization_params, relationship_rules)
+    finally:
+        if report is not None:
+            metrics.remove_listener(report)
+            if args.metrics_file:
+                report.write(args.metrics_file)
+                logger.info(f"Wrote stage metrics to {args.metrics_file}")
+            if args.profile:
+                for line in report.summary_lines():
+                    logger.info(f"Profile: {line}")
+                    print(line, file=sys.stderr)
+
+def relationship_validator(args, connection_params, data):
+    """Returns the `RelationshipValidator` selected by the parsed command-line `args` for one database's `data`, or None."""
+    if not args.validate_relationships:
+        return None
+    from snowflake_dbml.validation import RelationshipValidator
+    return RelationshipValidator(connection_params, data, method=args.validation_method, on_failure=args.validate_relationships,
+                                 batch_size=args.validation_batch_size, workers=args.validation_workers,
+                                 budget_seconds=args.validation_budget)
+
+def run_generator(args, config, connection_params, primary_key_hints, visualization_params, relationship_rules=None):
+    """Fetches (or loads) the metadata and writes the DBML as selected by the parsed command-line `args`."""
+    if args.serve is not None:
+        if args.source or args.offline:
+            raise ValueError("--serve extracts from Snowflake and can't be combined with --source or --offline.")
+        if args.validate_relationships:
+            raise ValueError("--validate-relationships applies to one-off runs, not to --serve.")
+        from snowflake_dbml.service import CatalogService, DEFAULT_REFRESH_INTERVAL, parse_address, serve
+        host, port = parse_address(args.serve)
+        service = CatalogService(connection_params, config['included_schemas'], config['excluded_schemas'], primary_key_hints=primary_key_hints,
+                                 visualization_params=visualization_params, relationship_rules=relationship_rules,
+                                 refresh_interval=DEFAULT_REFRESH_INTERVAL if args.refresh_interval is None else args.refresh_interval,
+                                 incremental=args.incremental, stream=args.stream, batch_size=args.batch_size, query_mode=args.query_mode,
+                                 scoped_keys=not args.unscoped_keys, workers=args.workers, partition_by_schema=args.partition_by_schema,
+                                 async_queries=args.async_queries)
+        serve(service, host, port)
+        return
+
+    # Checked before connecting rather than after a full extraction
+    if args.validate_relationships and not (args.source or args.output_dir) and len(split_databases(connection_params['database'])) > 1:
+        raise ValueError("--validate-relationships checks one database at a time: pass a single --database, or --output-dir to validate each database's diagram.")
+    if args.shard_dir and args.changed_only:
+        raise ValueError("--changed-only applies to --output or printed DBML, not to --shard-dir.")
+
+    per_database = bool(args.output_dir)
+    databases = split_databases(connection_params['database'])
+    if len(databases) > 1 and not (args.source or per_database):
+        # Several databases are merged into one diagram with database-qualified schema names
+        primary_key_hints = qualify_hints(primary_key_hints, databases)
+    cache_dir = args.cache_dir or config.get('cache_dir')
+    snapshot_cache, snapshot, previous = None, None, None
+    if args.source:
+        if args.database and len(split_databases(args.database)) > 1:
+            raise ValueError("--source reads one database's exports: pass a single --database to select it, or none.")
+        from snowflake_dbml.sources import FileSource
+        # Only a database asked for on the command line filters the exports, not one from .env
+        source = FileSource(args.source, database=args.database)
+    else:
+        from snowflake_dbml.sources import SnowflakeSource
+        if cache_dir or args.max_age is not None or args.offline or args.incremental:
+            from snowflake_dbml.cache import SnapshotCache, snapshot_key
+            snapshot_cache = SnapshotCache(cache_dir)
+            cache_key = snapshot_key(connection_params, config['included_schemas'], config['excluded_schemas'], per_database=per_database)
+            # A cache directory alone only records snapshots; they are reused with --max-age or --offline
+            if args.offline or args.max_age is not None:
+                snapshot = snapshot_cache.load(cache_key, max_age=None if args.offline else args.max_age, stream=args.stream)
+            if snapshot is None and args.offline:
+                raise FileNotFoundError(f"No metadata snapshot found in {snapshot_cache.cache_dir} for these connection parameters; run once without --offline to create it.")
+            if snapshot is None and args.incremental:
+                previous = snapshot_cache.load(cache_key, stream=args.stream)
+        source = SnowflakeSource(connection_params, batch_size=args.batch_size, query_mode=args.query_mode, scoped_keys=not args.unscoped_keys,
+                                 workers=args.workers, partition_by_schema=args.partition_by_schema, per_database=per_database,
+                                 async_queries=args.async_queries, previous=previous)
+
+    if args.shard_dir and not args.output_dir and not args.source and snapshot_cache is None:
+        # Without a snapshot to save, each schema is rendered as it is fetched and released before the next
+        from snowflake_dbml.writer import write_shards
+        validator = relationship_validator(args, connection_params, None)
+        logger.info("Fetching data from Snowflake one schema at a time.")
+        parts = source.partitions(config['included_schemas'], config['excluded_schemas'], stream=args.stream)
+        if validator is not None:
+            parts = map(validator.add_tables, parts)
+        write_shards(parts, args.shard_dir, connection_params=connection_params, primary_key_hints=primary_key_hints,
+                     visualization_params=visualization_params, validator=validator,
+                     relationship_rules=relationship_rules)
+        logger.info(f"Wrote DBML shards to {args.shard_dir}")
+        logger.info("Snowflake DBML generator complete.")
+        return
+
+    if snapshot is not None:
+        data = snapshot
+        logger.info(f"Using local metadata snapshot from {snapshot_cache.cache_dir}.")
+    elif args.source:
+        data = source.fetch(config['included_schemas'], config['excluded_schemas'], stream=args.stream)
+        connection_params['database'] = source.database or os.path.basename(os.path.normpath(args.source))
+        if per_database:
+            data = {connection_params['database']: data}
+        logger.info(f"Using metadata exports from {args.source}.")
+    else:
+        logger.info(f"Fetching data from Snowflake starting{' (incremental)' if previous is not None else ''}.")
+        data = source.fetch(config['included_schemas'], config['excluded_schemas'], stream=args.stream)
+        logger.info(f"Fetching data from Snowflake complete.")
+        if snapshot_cache is not None:
+            snapshot_cache.save(cache_key, data, per_database=per_database)
+
+    if args.output_dir:
+        if args.changed_only:
+            raise ValueError("--changed-only applies to --output or printed DBML, not to --output-dir.")
+        os.makedirs(args.output_dir, exist_ok=True)
+        for database, database_data in data.items():
+            for key, count in summarize_data(database_data).items():
+                logger.info(f"Number of results for {database} {key}: {count}")
+
+            database_params = dict(connection_params, database=database)
+            dbml_output = generate_dbml(database_data, connection_params=database_params, primary_key_hints=primary_key_hints,
+                                        visualization_params=visualization_params,
+                                        validator=relationship_validator(args, database_params, database_data),
+                                        relationship_rules=relationship_rules)
+            output_path = os.path.join(args.output_dir, f"{database}.dbml")
+            with open(output_path, 'w') as f:
+                f.write(dbml_output)
+            logger.info(f"Wrote DBML for {database} to {output_path}")
+        logger.info("Snowflake DBML generator complete.")
+        return
 
     # Logging the number of results for each key in the data dictionary
-    for key, value in data.items():
-        logger.info(f"Number of results for {key}: {len(value)}")
-
-
-    dbml_output = generate_dbml(data, connection_params=connection_params, primary_key_hints=primary_key_hints, visualization_params=visualization_params)
+    for key, count in summarize_data(data).items():
+        logger.info(f"Number of results for {key}: {count}")
+    validator = relationship_validator(args, connection_params, data)
+
+    if args.shard_dir:
+        from snowflake_dbml.writer import write_shards
+        write_shards(data, args.shard_dir, connection_params=connection_params, primary_key_hints=primary_key_hints,
+                     visualization_params=visualization_params, validator=validator,
+                     relationship_rules=relationship_rules)
+        logger.info(f"Wrote DBML shards to {args.shard_dir}")
+        logger.info("Snowflake DBML generator complete.")
+        return
+
+    from snowflake_dbml.writer import write_dbml
+    if args.changed_only:
+        from snowflake_dbml.cache import snapshot_key
+        from snowflake_dbml.changes import TableManifest
+        changes = TableManifest(cache_dir, key=snapshot_key(connection_params, config['included_schemas'], config['excluded_schemas']))
+        # Only the writer can leave out unchanged tables, so printed output goes through it too
+        if args.output:
+            with open(args.output, 'w') as f:
+                write_dbml(data, f, connection_params=connection_params, primary_key_hints=primary_key_hints,
+                           visualization_params=visualization_params, changes=changes, validator=validator,
+                           relationship_rules=relationship_rules)
+            logger.info(f"Wrote DBML to {args.output}")
+        else:
+            write_dbml(data, sys.stdout, connection_params=connection_params, primary_key_hints=primary_key_hints,
+                       visualization_params=visualization_params, changes=changes, validator=validator,
+                       relationship_rules=relationship_rules)
+        changes.save()
+        logger.info("Snowflake DBML generator complete.")
+        return
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            write_dbml(data, f, connection_params=connection_params, primary_key_hints=primary_key_hints, visualization_params=visualization_params,
+                       validator=validator, relationship_rules=relationship_rules)
+        logger.info(f"Wrote DBML to {args.output}")
+        logger.info("Snowflake DBML generator complete.")
+        return
+
+    dbml_output = generate_dbml(data, connection_params=connection_params, primary_key_hints=primary_key_hints, visualization_params=visualization_params,
+                                validator=validator, relationship_rules=relationship_rules)
     print(dbml_output)
     logger.info("Snowflake DBML generator complete.")
 
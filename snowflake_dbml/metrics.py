@@ -0,0 +1,184 @@
+# snowflake_dbml/metrics.py
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from snowflake_dbml.catalog import peak_rss_bytes
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+PROMETHEUS_PREFIX = 'snowflake_dbml'
+STAGE_COUNTERS = ('rows', 'bytes', 'objects')
+
+_listeners = []
+_listeners_lock = threading.Lock()
+
+
+class Stage:
+    """
+    One timed run of a named stage, passed to listeners when it starts and ends.
+    Instrumented code sets `rows`, `bytes` and `objects` on it; `wall_seconds` and `peak_rss_bytes`
+    are filled in when it ends.
+    """
+    __slots__ = ('name', 'labels', 'started', 'wall_seconds', 'rows', 'bytes', 'objects', 'peak_rss_bytes')
+
+    def __init__(self, name, labels=None):
+        self.name = name
+        self.labels = labels or {}
+        self.started = time.perf_counter()
+        self.wall_seconds = None
+        self.rows = None
+        self.bytes = None
+        self.objects = None
+        self.peak_rss_bytes = None
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__ if field != 'started'}
+
+
+def add_listener(listener):
+    """Subscribes `listener(event, stage)` to stage events; `event` is 'start' or 'end'."""
+    with _listeners_lock:
+        _listeners.append(listener)
+    return listener
+
+
+def remove_listener(listener):
+    with _listeners_lock:
+        _listeners.remove(listener)
+
+
+def active():
+    """Returns whether anything is listening, so costly measurements such as byte counts can be skipped otherwise."""
+    return bool(_listeners)
+
+
+def _emit(event, stage_record):
+    for listener in list(_listeners):
+        try:
+            listener(event, stage_record)
+        except Exception as e:
+            logger.warning(f"Metrics listener {listener!r} failed on {event} of {stage_record.name}: {e}")
+
+
+@contextmanager
+def stage(name, **labels):
+    """
+    Times the enclosed block as stage `name` and notifies listeners when it starts and ends.
+    Yields the `Stage`, on which the block can record rows, bytes and objects.
+    """
+    stage_record = Stage(name, labels)
+    if _listeners:
+        _emit('start', stage_record)
+    try:
+        yield stage_record
+    finally:
+        stage_record.wall_seconds = time.perf_counter() - stage_record.started
+        if _listeners:
+            stage_record.peak_rss_bytes = peak_rss_bytes()
+            _emit('end', stage_record)
+
+
+def estimate_bytes(rows):
+    """Approximates the bytes in fetched rows (dicts or tuples) by the length of each value's string form."""
+    total = 0
+    for row in rows:
+        for value in (row.values() if isinstance(row, dict) else row):
+            if value is not None:
+                total += len(str(value))
+    return total
+
+
+class MetricsReport:
+    """
+    Listener aggregating ended stages by name: run count, total wall time, rows, bytes, objects and peak RSS.
+    Use as a context manager to subscribe for the duration of a run.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, event, stage_record):
+        if event != 'end':
+            return
+        with self._lock:
+            totals = self.stages.setdefault(stage_record.name, {'runs': 0, 'wall_seconds': 0.0, 'rows': None, 'bytes': None,
+                                                                'objects': None, 'peak_rss_bytes': None})
+            totals['runs'] += 1
+            totals['wall_seconds'] += stage_record.wall_seconds
+            for counter in STAGE_COUNTERS:
+                value = getattr(stage_record, counter)
+                if value is not None:
+                    totals[counter] = (totals[counter] or 0) + value
+            if stage_record.peak_rss_bytes is not None:
+                totals['peak_rss_bytes'] = max(totals['peak_rss_bytes'] or 0, stage_record.peak_rss_bytes)
+
+    def __enter__(self):
+        add_listener(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        remove_listener(self)
+
+    def as_dict(self):
+        with self._lock:
+            stages = {name: dict(totals) for name, totals in self.stages.items()}
+        return {
+            'total_seconds': time.perf_counter() - self.started,
+            'peak_rss_bytes': peak_rss_bytes(),
+            'stages': stages,
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self):
+        """Renders the report in the Prometheus text exposition format, for the node_exporter textfile collector."""
+        report = self.as_dict()
+        metrics = [
+            ('stage_runs', 'Number of times the stage ran.', 'runs'),
+            ('stage_seconds', 'Wall time spent in the stage, summed over runs.', 'wall_seconds'),
+            ('stage_rows', 'Rows fetched in the stage.', 'rows'),
+            ('stage_bytes', 'Approximate bytes fetched or written in the stage.', 'bytes'),
+            ('stage_objects', 'Objects created in the stage.', 'objects'),
+            ('stage_peak_rss_bytes', 'Peak resident set size of the process when the stage ended.', 'peak_rss_bytes'),
+        ]
+        lines = []
+        for metric, help_text, field in metrics:
+            samples = [(name, totals[field]) for name, totals in report['stages'].items() if totals[field] is not None]
+            if not samples:
+                continue
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{metric} gauge")
+            lines.extend(f'{PROMETHEUS_PREFIX}_{metric}{{stage="{name}"}} {value}' for name, value in samples)
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_run_seconds Wall time of the whole run.")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_run_seconds gauge")
+        lines.append(f"{PROMETHEUS_PREFIX}_run_seconds {report['total_seconds']}")
+        if report['peak_rss_bytes'] is not None:
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_peak_rss_bytes Peak resident set size of the run.")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_peak_rss_bytes gauge")
+            lines.append(f"{PROMETHEUS_PREFIX}_peak_rss_bytes {report['peak_rss_bytes']}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Writes the report to `path`: Prometheus text for `.prom` files, JSON otherwise. Replaced atomically."""
+        content = self.to_prometheus() if path.endswith('.prom') else self.to_json() + '\n'
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+    def summary_lines(self):
+        """Returns one human-readable line per stage, slowest first."""
+        report = self.as_dict()
+        lines = [f"Total {report['total_seconds']:.2f}s, peak RSS {report['peak_rss_bytes']} bytes"]
+        for name, totals in sorted(report['stages'].items(), key=lambda item: -item[1]['wall_seconds']):
+            counters = ', '.join(f"{counter} {totals[counter]}" for counter in STAGE_COUNTERS if totals[counter] is not None)
+            lines.append(f"{name}: {totals['wall_seconds']:.3f}s over {totals['runs']} runs" + (f" ({counters})" if counters else ''))
+        return lines
@@ -0,0 +1,370 @@
+# snowflake_dbml/model.py
+"""
+Helpers shared by the renderers: walking fetched metadata, table headers and notes, and collecting the
+declared and inferred relationships between columns.
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from itertools import chain
+
+# pydbml is slow to import, so it is imported in the functions that use it
+from snowflake_dbml.catalog import Catalog
+from snowflake_dbml.config import load_visualization_params
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def resolve_visualization_params(visualization_params=None):
+    """Returns the default visualization params overridden by any non-empty values in `visualization_params`."""
+    resolved = load_visualization_params()
+    if visualization_params:
+        for key in resolved:
+            if key in visualization_params and visualization_params[key]:
+                resolved[key] = visualization_params[key]
+    return resolved
+
+def project_note_text(connection_params):
+    """Returns the text of the project note describing when and from where the diagram was generated."""
+    return f"Generated using snowflake-dbml on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n" \
+           f"Database: {connection_params['database']}\n" \
+           f"Database User: {connection_params['user']}\n" \
+           f"Included Schemas: {connection_params.get('included_schemas', 'All')}\n" \
+           f"Excluded Schemas: {connection_params.get('excluded_schemas', 'None')}"
+
+def table_header(table_row, visualization_params):
+    """Returns the (header color, note emoji) for a table row, by table type."""
+    is_dynamic = table_row['IS_DYNAMIC'] == 'YES'
+    table_color = visualization_params['view_color'] if table_row['TABLE_TYPE'] == 'VIEW' else visualization_params['dynamic_table_color'] if is_dynamic else visualization_params['table_color']
+    emoji = "🚀 " if is_dynamic else ""
+    return table_color, emoji
+
+def group_foreign_keys(foreign_key_rows, column_index):
+    """
+    Groups `SHOW IMPORTED KEYS` rows into one (fk_name, from_columns, to_columns) entry per foreign key.
+    `column_index` maps (schema, table, column) with lowercased schema and table names to column objects;
+    rows whose columns are not in it are skipped. Composite key columns are ordered by 'key_sequence'.
+    """
+    # Initialize storage for foreign key columns to handle composite keys
+    foreign_keys = defaultdict(lambda: {'name': None, 'from_cols': [], 'to_cols': []})
+
+    # Collect foreign key columns grouped by foreign key name; names are only unique within a table
+    for fk in foreign_key_rows:
+        key_name = (fk['fk_schema_name'], fk['fk_table_name'], fk['fk_name'])
+        from_column = column_index.get((fk['fk_schema_name'].lower(), fk['fk_table_name'].lower(), fk['fk_column_name']))
+        to_column = column_index.get((fk['pk_schema_name'].lower(), fk['pk_table_name'].lower(), fk['pk_column_name']))
+
+        # Ensure both columns are loaded
+        if from_column is not None and to_column is not None:
+            # Append to the list maintaining the order as per 'key_sequence'
+            foreign_keys[key_name]['name'] = fk['fk_name']
+            foreign_keys[key_name]['from_cols'].append((fk['key_sequence'], from_column))
+            foreign_keys[key_name]['to_cols'].append((fk['key_sequence'], to_column))
+
+    grouped = []
+    for cols in foreign_keys.values():
+        # Sort columns by key sequence to maintain the correct order
+        cols['from_cols'].sort(key=lambda item: item[0])
+        cols['to_cols'].sort(key=lambda item: item[0])
+        grouped.append((cols['name'], [col for _, col in cols['from_cols']], [col for _, col in cols['to_cols']]))
+    return grouped
+
+def iter_tables(data):
+    """
+    Yields a (table_row, column_rows) pair per table from a `Catalog` or a `fetch_data` dict.
+    Dict rows are grouped by lowercased schema and table name, keeping the order tables first appear in.
+    """
+    if isinstance(data, Catalog):
+        for table in data.tables.values():
+            yield table, table.columns
+        return
+
+    grouped = {}
+    for row in data['tables']:
+        grouped.setdefault((row['TABLE_SCHEMA'].lower(), row['TABLE_NAME'].lower()), []).append(row)
+    for rows in grouped.values():
+        yield rows[0], rows
+
+def key_rows(data):
+    """Returns the (primary_keys, foreign_keys) rows of a `Catalog` or a `fetch_data` dict."""
+    if isinstance(data, Catalog):
+        return data.primary_keys, data.foreign_keys
+    return data['primary_keys'], data['foreign_keys']
+
+def summarize_data(data):
+    """Returns result counts per kind of metadata for logging."""
+    if isinstance(data, Catalog):
+        return data.summary()
+    return {key: len(value) for key, value in data.items()}
+
+def build_key_index(primary_keys):
+    """
+    Builds a set of (schema, table, column) tuples from `SHOW PRIMARY KEYS` rows.
+    Schema and table names are lowercased to match the DBML table names; column names are kept as-is.
+    """
+    return {(pk['schema_name'].lower(), pk['table_name'].lower(), pk['column_name']) for pk in primary_keys}
+
+def add_table(db, table):
+    """
+    Adds a table to the pydbml Database without its linear duplicate scan.
+    `Database.add_table` compares the new table against every existing one, which is quadratic
+    across a whole database; callers guarantee unique names, so only the name index is maintained.
+    """
+    table.database = db
+    db.tables.append(table)
+    db.table_dict[table.full_name] = table
+    return table
+
+def add_reference(db, reference):
+    """
+    Adds a reference to the pydbml Database without its linear duplicate scan.
+    `Database.add_reference` compares the new reference against every existing one attribute by attribute;
+    callers deduplicate references with a `ReferenceIndex` first, so it is simply appended.
+    """
+    reference.database = db
+    db.refs.append(reference)
+    return reference
+
+def build_column_name_index(tables):
+    """
+    Builds an inverted index of column name -> [(table_name, Column)] over `tables`.
+    Postings follow the order of `tables`, and only the first column with a given name is indexed per table.
+    """
+    index = defaultdict(list)
+    for table_name, table in tables.items():
+        seen = set()
+        for column in table.columns:
+            if column.name not in seen:
+                seen.add(column.name)
+                index[column.name].append((table_name, column))
+    return index
+
+def column_location(column):
+    """Returns the lowercased (schema, table) of a pydbml `Column` or a writer column."""
+    if hasattr(column, 'table_name'):
+        return column.schema, column.table
+    return column.table.schema, column.table.name
+
+def infer_relationships(tables, primary_key_hints, validator=None, relationship_rules=None):
+    """
+    Infers and creates DBML Reference objects based on primary and natural key relationships.
+    `tables` is a dictionary with table names as keys and pydbml Table objects as values.
+    With `RelationshipRules`, the relationships they resolve follow the hinted ones.
+    With a `RelationshipValidator`, only the relationships it keeps are returned.
+    """
+    from pydbml.classes import Reference
+
+    relationships = iter_inferred_relationships(tables, primary_key_hints)
+    if relationship_rules is not None:
+        relationships = chain(relationships, relationship_rules.iter_relationships(tables))
+    if validator is not None:
+        relationships = validator.validate(relationships)
+    return [Reference(type='>', col1=from_columns, col2=to_columns, comment=comment)
+            for from_columns, to_columns, comment in relationships]
+
+def iter_inferred_relationships(tables, primary_key_hints):
+    """
+    Yields (from_columns, to_columns, comment) for each relationship inferred from the primary key hints.
+    `tables` maps table names to table objects whose `columns` have a `name`, such as pydbml Tables.
+
+    Candidate tables are looked up in a column name index built once per call, so each hint only
+    visits the tables that contain its columns. Relationships are yielded in the same order as a
+    pairwise scan of `tables`.
+    """
+    column_index = build_column_name_index(tables)
+    table_positions = {table_name: position for position, table_name in enumerate(tables)}
+
+    # Infer relationships based on natural keys and primary keys
+    for table_name, table in tables.items():
+        if table_name not in primary_key_hints:
+            continue
+
+        hints = primary_key_hints[table_name]
+        natural_keys = hints.get('natural_key', [])
+        primary_key = hints.get('primary_key', {})
+
+        table_columns = {}
+        for column in table.columns:
+            table_columns.setdefault(column.name, column)
+
+        # Natural key relationships: tables holding every natural key column
+        natural_key_set = set(natural_keys)
+        natural_key_tables = set()
+        to_columns = []
+        if natural_key_set and natural_key_set.issubset(table_columns):
+            postings = sorted((column_index[key] for key in natural_key_set), key=len)
+            natural_key_tables = {other_table_name for other_table_name, _ in postings[0]}
+            for posting in postings[1:]:
+                natural_key_tables.intersection_update(other_table_name for other_table_name, _ in posting)
+            to_columns = [col for col in table.columns if col.name in natural_key_set]
+
+        # Primary key relationships: tables holding any `reference_as` column
+        primary_key_columns = defaultdict(list)
+        if primary_key:
+            to_column = table_columns.get(primary_key['column'])
+            if to_column is not None:
+                for ref_as in primary_key['reference_as']:
+                    for other_table_name, from_column in column_index.get(ref_as, ()):
+                        primary_key_columns[other_table_name].append(from_column)
+
+        candidates = (natural_key_tables | primary_key_columns.keys()) - {table_name}
+        for other_table_name in sorted(candidates, key=table_positions.__getitem__):
+            if other_table_name in natural_key_tables:
+                from_columns = [col for col in tables[other_table_name].columns if col.name in natural_key_set]
+                yield from_columns, to_columns, f"Natural key relationship inferred from primary key hints for {table_name}."
+
+            for from_column in primary_key_columns.get(other_table_name, ()):
+                yield [from_column], [to_column], f"Primary key relationship inferred from primary key hints for {table_name}."
+
+
+class ReferenceIndex:
+    """
+    Relationships keyed on their normalized column pairs, so each is rendered once.
+
+    Relationships are added as (from_columns, to_columns, comment). One between the same column pairs as an
+    indexed relationship, in either direction and in any column order, is merged into it: the first
+    direction is kept and the comments of both are joined, so a declared foreign key also inferred from
+    hints says so. Iterating yields the merged relationships in the order they were first added.
+
+    Columns are compared by identity, as both renderers keep one column object per table column. Large
+    catalogs infer hundreds of thousands of relationships, so single-column ones are stored without their
+    column lists and repeated comments are stored once.
+    """
+    __slots__ = ('relationships', 'merged', 'comments', 'candidates')
+
+    def __init__(self):
+        self.relationships = {}  # {key: (from column(s), to column(s), comment)}
+        self.merged = {}  # {key: [comment]} for relationships with duplicates
+        self.comments = {}
+        self.candidates = 0  # relationships added, before merging
+
+    def __len__(self):
+        return len(self.relationships)
+
+    def __iter__(self):
+        for key, (from_columns, to_columns, comment) in self.relationships.items():
+            if key in self.merged:
+                comment = ' '.join(self.merged[key])
+            if isinstance(key, int):
+                yield [from_columns], [to_columns], comment
+            else:
+                yield from_columns, to_columns, comment
+
+    def locate(self, from_columns, to_columns):
+        """
+        Returns (key, indexed key): the relationship's key, the from and to column ids packed into one int or
+        sorted pairs of them for composite keys, and the key of the indexed relationship between the same column
+        pairs, or None.
+        """
+        if len(from_columns) == 1:
+            key = id(from_columns[0]) << 64 | id(to_columns[0])
+            reverse = id(to_columns[0]) << 64 | id(from_columns[0])
+        else:
+            key = tuple(sorted(zip(map(id, from_columns), map(id, to_columns))))
+            reverse = tuple(sorted((to_column, from_column) for from_column, to_column in key))
+        if key in self.relationships:
+            return key, key
+        return key, reverse if reverse in self.relationships else None
+
+    def merge(self, from_columns, to_columns, comment):
+        """Merges a relationship into the indexed one between the same column pairs, if any; returns whether it did."""
+        _, indexed = self.locate(from_columns, to_columns)
+        if indexed is None:
+            return False
+        self.candidates += 1
+        comments = self.merged.get(indexed)
+        if comments is None:
+            first = self.relationships[indexed][2]
+            comments = self.merged[indexed] = [first] if first else []
+        if comment and comment not in comments:
+            comments.append(comment)
+        return True
+
+    def add(self, from_columns, to_columns, comment):
+        """Indexes a relationship, or merges it into a duplicate; returns whether it was new."""
+        key, indexed = self.locate(from_columns, to_columns)
+        if indexed is not None:
+            return not self.merge(from_columns, to_columns, comment)
+        self.candidates += 1
+        comment = self.comments.setdefault(comment, comment)
+        if isinstance(key, int):
+            self.relationships[key] = (from_columns[0], to_columns[0], comment)
+        else:
+            self.relationships[key] = (from_columns, to_columns, comment)
+        return True
+
+
+def collect_references(foreign_key_rows, column_index, tables, primary_key_hints, validator=None, relationship_rules=None):
+    """
+    Returns a `ReferenceIndex` of the foreign keys, then the relationships inferred from the hints and from
+    `relationship_rules` (`RelationshipRules`), checked against the data by `validator` (a
+    `RelationshipValidator`) when given. Inferred relationships duplicating a foreign key are merged into it
+    without being validated. `column_index` and `tables` may hold pydbml or writer columns and tables.
+    """
+    start = time.perf_counter()
+    references = ReferenceIndex()
+    for fk_name, from_columns, to_columns in group_foreign_keys(foreign_key_rows, column_index):
+        references.add(from_columns, to_columns, f"Foreign key relationship {fk_name}.")
+    declared = references.candidates
+
+    inferred = iter_inferred_relationships(tables, primary_key_hints)
+    if relationship_rules is not None:
+        inferred = chain(inferred, relationship_rules.iter_relationships(tables))
+    if validator is not None:
+        inferred = validator.validate(relationship for relationship in inferred if not references.merge(*relationship))
+    for from_columns, to_columns, comment in inferred:
+        references.add(from_columns, to_columns, comment)
+    logger.info(f"Merged {references.candidates} relationships ({declared} declared, {references.candidates - declared} inferred) "
+                f"into {len(references)} references in {time.perf_counter() - start:.2f}s")
+    return references
+
+
+def escape_dbml_string(text):
+    """Escapes single quotes in DBML strings by adding a backslash."""
+    return text.replace("'", "\\'").strip()
+
+def generate_table_notes(row, table_type, emoji):
+    is_dynamic = row['IS_DYNAMIC'] == 'YES'
+    note_content = f"{emoji}{'DYNAMIC TABLE' if is_dynamic else table_type}\n"
+    if row['TABLE_COMMENT']:
+        note_content += f"Comment: {escape_dbml_string(row['TABLE_COMMENT'])}\n"
+    if row['TABLE_TYPE'] != 'VIEW':
+        note_content += f"\nMetrics:\n- Rows: {format_number(row['ROW_COUNT'])}\n- Size: {human_readable_size(row['BYTES'])}\n"
+        note_content += f"\nTimestamps:\n- Created: {row['CREATED']}\n- Last DDL: {row['LAST_DDL']}\n- Last Altered: {row['LAST_ALTERED']}\n"
+        note_content += f"\nOwnership:\n- Owner: {row['TABLE_OWNER']}\n- Last DDL By: {row['LAST_DDL_BY']}\n"
+        clustering_value = row['CLUSTERING_KEY'] if row['CLUSTERING_KEY'] else '<none>'
+        note_content += f"\nClustering:\n- Clustering Key: {clustering_value}\n-Auto Clustering: {row['AUTO_CLUSTERING_ON']}\n"
+    return note_content
+
+def format_column_name(name):
+    """Encloses column names with spaces in double quotes."""
+    return f'"{name}"' if ' ' in name else name
+
+def format_number(value):
+    """Formats numbers with commas."""
+    return f"{value:,}" if value is not None else "Unknown"
+
+def human_readable_size(size, precision=2):
+    if size is None:
+        return "Unknown size"
+    suffixes = ['B', 'KB', 'MB', 'GB', 'TB']
+    suffix_index = 0
+    while size >= 1024 and suffix_index < 4:
+        suffix_index += 1
+        size /= 1024.0
+    return f"{size:.{precision}f} {suffixes[suffix_index]}"
+
+def format_multiline_note(note_content, indent_level=2):
+    """
+    Formats a multiline note with proper indentation.
+    :param note_content: The content of the note.
+    :param indent_level: Number of indentations (each indentation is 2 spaces by default in DBML).
+    :return: Formatted multiline note.
+    """
+    indentation = '  ' * indent_level
+    last_indentation = '  ' * max((indent_level - 1),0)
+    note_lines = note_content.strip().split('\n')
+    formatted_lines = [indentation + line.strip() for line in note_lines]
+    return "'''\n" + '\n'.join(formatted_lines) + "\n" + last_indentation + "'''\n"
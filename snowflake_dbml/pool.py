@@ -0,0 +1,93 @@
+# snowflake_dbml/pool.py
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+from snowflake_dbml import metrics
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+DEFAULT_POOL_SIZE = 4
+
+
+class ConnectionPool:
+    """
+    Bounded pool of authenticated Snowflake connections.
+    Connections are opened lazily, up to `size`, and handed back out to later callers instead of
+    logging in again. Use `connection()` as a context manager to borrow one.
+    """
+
+    def __init__(self, connection_params, size=DEFAULT_POOL_SIZE):
+        if size < 1:
+            raise ValueError(f"Connection pool size must be at least 1, got {size}")
+        self.connection_params = connection_params
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self, timeout=None):
+        """Returns an idle connection, opening a new one if the pool is not full, or waits for one to be released."""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = len(self._connections) < self.size
+            if can_open:
+                # Reserve the slot before connecting so concurrent callers don't exceed the size
+                self._connections.append(None)
+        if can_open:
+            import snowflake.connector
+
+            try:
+                with metrics.stage('login'):
+                    conn = snowflake.connector.connect(**self.connection_params)
+            except Exception:
+                with self._lock:
+                    self._connections.remove(None)
+                raise
+            with self._lock:
+                self._connections[self._connections.index(None)] = conn
+            logger.debug(f"Opened pooled connection {len(self._connections)} of {self.size}")
+            return conn
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No pooled connection became available within {timeout}s")
+
+    def release(self, conn):
+        """Returns a borrowed connection to the pool."""
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Closes every connection opened by the pool."""
+        self._closed = True
+        with self._lock:
+            connections, self._connections = [conn for conn in self._connections if conn is not None], []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.warning(f"Failed to close pooled connection: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,199 @@
+# snowflake_dbml/rules.py
+import logging
+import re
+import string
+import time
+
+from snowflake_dbml.model import column_location
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+REGEX_PREFIX = 're:'  # patterns starting with this are regular expressions rather than globs
+PATTERN_FIELDS = ('schema', 'table', 'column')
+TEMPLATE_FIELDS = ('schema', 'table', 'column')  # always available in `references` templates
+
+
+def translate_pattern(pattern):
+    """
+    Returns the regular expression for a rule pattern: 're:<regex>' as given, otherwise a glob whose `*` and `?`
+    wildcards become numbered groups, so `*_ID` captures the entity in `{1}`.
+    """
+    if pattern.startswith(REGEX_PREFIX):
+        return pattern[len(REGEX_PREFIX):]
+    return ''.join('(.*)' if char == '*' else '(.)' if char == '?' else re.escape(char) for char in pattern)
+
+
+def is_literal(pattern):
+    """Returns whether a rule pattern matches exactly one name, compared case-insensitively."""
+    return not pattern.startswith(REGEX_PREFIX) and '*' not in pattern and '?' not in pattern
+
+
+def literal_affixes(pattern):
+    """Returns the uppercased literal (prefix, suffix) around a glob's wildcards; ('', '') for regular expressions."""
+    if pattern.startswith(REGEX_PREFIX):
+        return '', ''
+    wildcards = [position for position, char in enumerate(pattern) if char in '*?']
+    return pattern[:wildcards[0]].upper(), pattern[wildcards[-1] + 1:].upper()
+
+
+class RelationshipRule:
+    """
+    One compiled entry of the `relationship-rules` config section:
+
+        {"name": "entity ids", "schema": "sales", "table": "fact_*", "column": "*_ID",
+         "references": {"schema": "{schema}", "table": "dim_{1}", "column": "ID"}, "comment": "..."}
+
+    `schema` and `table` are optional patterns (any by default), `column` is required. Patterns are globs or,
+    prefixed with 're:', regular expressions, matched case-insensitively against whole names. The `references`
+    templates name the referenced column: `{0}` is the matched column name, `{1}`, `{2}`, ... the column
+    pattern's wildcards or groups, named groups of any pattern are available by name, and `{schema}`,
+    `{table}` and `{column}` are the referencing column's. The referenced schema defaults to `{schema}`.
+    """
+    __slots__ = ('name', 'patterns', 'literal_column', 'references', 'comment')
+
+    def __init__(self, rule, index):
+        self.name = rule.get('name') or f"#{index + 1}"
+        if not isinstance(rule.get('column'), str):
+            raise ValueError(f"Relationship rule {self.name} needs a 'column' pattern.")
+        references = rule.get('references') or {}
+        if not isinstance(references.get('table'), str) or not isinstance(references.get('column'), str):
+            raise ValueError(f"Relationship rule {self.name} needs 'references' with a 'table' and a 'column'.")
+
+        self.patterns = {}
+        for field in PATTERN_FIELDS:
+            if rule.get(field) is not None:
+                try:
+                    self.patterns[field] = re.compile(translate_pattern(rule[field]), re.IGNORECASE)
+                except re.error as e:
+                    raise ValueError(f"Invalid {field} pattern {rule[field]!r} in relationship rule {self.name}: {e}")
+        self.literal_column = rule['column'].upper() if is_literal(rule['column']) else None
+        self.references = (references.get('schema', '{schema}'), references['table'], references['column'])
+        self.comment = rule.get('comment') or f"Relationship inferred from relationship rule {self.name}."
+
+        # Check template fields now rather than failing halfway through a catalog
+        groups = self.patterns['column'].groups
+        named = {name for pattern in self.patterns.values() for name in pattern.groupindex}
+        for template in self.references:
+            for _, field, _, _ in string.Formatter().parse(template):
+                if field is None or field in TEMPLATE_FIELDS or field in named or (field.isdigit() and int(field) <= groups):
+                    continue
+                raise ValueError(f"Unknown field {{{field}}} in relationship rule {self.name} references {template!r}.")
+
+    def matches_table(self, schema, table):
+        return all(self.patterns[field].fullmatch(value) for field, value in (('schema', schema), ('table', table))
+                   if field in self.patterns)
+
+    def target(self, schema, table, match):
+        """Returns the (DBML table name, column name) referenced by a column the rule matched, as `match`."""
+        named = {}
+        for field, value in (('schema', schema), ('table', table)):
+            if field in self.patterns:
+                named.update(self.patterns[field].fullmatch(value).groupdict(default=''))
+        named.update(match.groupdict(default=''))
+        named.update(schema=schema, table=table, column=match.group(0))
+        positional = (match.group(0),) + match.groups(default='')
+        schema_template, table_template, column_template = self.references
+        target_schema = schema_template.format(*positional, **named)
+        target_table = table_template.format(*positional, **named)
+        return f"{target_schema}.{target_table}".lower(), column_template.format(*positional, **named)
+
+
+class RelationshipRules:
+    """
+    Relationship rules compiled once into an indexed matcher, so resolving them takes one pass over the columns.
+
+    Column patterns are indexed by their literal text: literal names by name, and globs by the literal prefix
+    or suffix around their wildcards (`*_ID` under the suffix '_ID'), so each column name only tries the rules
+    whose literal part it carries, in a few dictionary lookups. Only regular expressions and globs without
+    literal text are tried one by one. Matches are memoized per distinct column name, and each referenced
+    column is found by a dictionary lookup, so the cost grows with the number of columns rather than
+    rules x tables x columns.
+    """
+
+    def __init__(self, rules):
+        if not isinstance(rules, list):
+            raise ValueError("The relationship-rules config section must be a list of rules.")
+        self.rules = [RelationshipRule(rule, index) for index, rule in enumerate(rules)]
+        self.literal_rules = {}
+        self.prefix_rules = {}  # {length: {PREFIX: [rule]}}
+        self.suffix_rules = {}  # {length: {SUFFIX: [rule]}}
+        self.unindexed_rules = []
+        for index, rule in enumerate(rules):
+            compiled = self.rules[index]
+            if compiled.literal_column is not None:
+                self.literal_rules.setdefault(compiled.literal_column, []).append(compiled)
+                continue
+            prefix, suffix = literal_affixes(rule['column'])
+            if not prefix and not suffix:
+                self.unindexed_rules.append(compiled)
+            elif len(suffix) >= len(prefix):
+                self.suffix_rules.setdefault(len(suffix), {}).setdefault(suffix, []).append(compiled)
+            else:
+                self.prefix_rules.setdefault(len(prefix), {}).setdefault(prefix, []).append(compiled)
+        self._order = {id(rule): position for position, rule in enumerate(self.rules)}
+        self._column_matches = {}
+
+    def __len__(self):
+        return len(self.rules)
+
+    def candidate_rules(self, name):
+        """Returns the rules whose column pattern may match `name`, from the literal, prefix and suffix indexes."""
+        key = name.upper()
+        candidates = list(self.literal_rules.get(key, ()))
+        for length, index in self.suffix_rules.items():
+            candidates.extend(index.get(key[-length:], ()))
+        for length, index in self.prefix_rules.items():
+            candidates.extend(index.get(key[:length], ()))
+        candidates.extend(self.unindexed_rules)
+        return candidates
+
+    def match_column(self, name):
+        """Returns [(rule, match)] for the rules whose column pattern matches `name`, in rule order."""
+        matches = self._column_matches.get(name)
+        if matches is None:
+            matches = [(rule, match) for rule in self.candidate_rules(name)
+                       for match in (rule.patterns['column'].fullmatch(name),) if match]
+            if len(matches) > 1:
+                matches.sort(key=lambda item: self._order[id(item[0])])
+            self._column_matches[name] = matches
+        return matches
+
+    def iter_relationships(self, tables):
+        """
+        Yields (from_columns, to_columns, comment) for each column of `tables` a rule matches whose referenced
+        column exists. `tables` maps DBML table names ("schema.table") to table objects whose `columns` have a
+        `name`, as for `iter_inferred_relationships`. A column referencing itself is skipped, and when several
+        rules produce the same relationship, the first one wins.
+        """
+        start = time.perf_counter()
+        target_columns = {}
+        table_matches = {}
+        seen = set()
+        count = 0
+        for table in tables.values():
+            if not table.columns:
+                continue
+            schema, table_name = column_location(table.columns[0])
+            for column in table.columns:
+                for rule, match in self.match_column(column.name):
+                    key = (id(rule), schema, table_name)
+                    if key not in table_matches:
+                        table_matches[key] = rule.matches_table(schema, table_name)
+                    if not table_matches[key]:
+                        continue
+
+                    target_table, target_column = rule.target(schema, table_name, match)
+                    columns = target_columns.get(target_table)
+                    if columns is None:
+                        target = tables.get(target_table)
+                        columns = target_columns[target_table] = {} if target is None else \
+                            {other.name.upper(): other for other in reversed(target.columns)}
+                    to_column = columns.get(target_column.upper())
+                    if to_column is None or to_column is column or (id(column), id(to_column)) in seen:
+                        continue
+                    seen.add((id(column), id(to_column)))
+                    count += 1
+                    yield [column], [to_column], rule.comment
+        logger.info(f"Resolved {len(self.rules)} relationship rules over {len(tables)} tables into {count} relationships "
+                    f"in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,293 @@
+# snowflake_dbml/service.py
+import io
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from snowflake_dbml import metrics
+from snowflake_dbml.catalog import Catalog
+from snowflake_dbml.extract import fetch_data, filter_keys, split_databases, split_schemas
+from snowflake_dbml.model import key_rows, summarize_data
+from snowflake_dbml.pool import ConnectionPool
+from snowflake_dbml.writer import write_dbml
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_REFRESH_INTERVAL = 3600  # seconds between scheduled refreshes
+DEFAULT_RENDERED_DOCUMENTS = 64  # rendered documents kept per catalog generation
+
+
+class CatalogSnapshot:
+    """One extraction held by the service: {database: data} as returned by `fetch_data` with `per_database`."""
+    __slots__ = ('data', 'generation', 'fetched_at', 'fetch_seconds')
+
+    def __init__(self, data, generation, fetched_at, fetch_seconds):
+        self.data = data
+        self.generation = generation
+        self.fetched_at = fetched_at
+        self.fetch_seconds = fetch_seconds
+
+
+def select_schemas(data, schemas):
+    """Returns the part of a `fetch_data` result (dict or `Catalog`) in `schemas`, compared case-insensitively."""
+    wanted = {schema.upper() for schema in schemas}
+    primary_keys, foreign_keys = key_rows(data)
+    if isinstance(data, Catalog):
+        subset = Catalog()
+        subset.tables = {key: table for key, table in data.tables.items() if key[0].upper() in wanted}
+        table_set = set(subset.tables)
+        subset.primary_keys, subset.foreign_keys = filter_keys(primary_keys, foreign_keys, table_set)
+        return subset
+    tables = [row for row in data['tables'] if row['TABLE_SCHEMA'].upper() in wanted]
+    table_set = {(row['TABLE_SCHEMA'], row['TABLE_NAME']) for row in tables}
+    primary_keys, foreign_keys = filter_keys(primary_keys, foreign_keys, table_set)
+    return {'tables': tables, 'primary_keys': primary_keys, 'foreign_keys': foreign_keys}
+
+
+class CatalogService:
+    """
+    Keeps authenticated connections and the latest extracted catalog in memory and renders DBML from it.
+
+    `refresh()` extracts into a new `CatalogSnapshot` on the service's own connection pool and swaps it in
+    with one assignment, so requests rendering from the previous snapshot never wait for an extraction.
+    Refreshes run one at a time; with `incremental`, they reuse the previous snapshot (see `fetch_data`'s
+    `previous`). `fetch_options` are passed through to `fetch_data`.
+    """
+
+    def __init__(self, connection_params, included_schemas=None, excluded_schemas=None, primary_key_hints=None,
+                 visualization_params=None, relationship_rules=None, refresh_interval=DEFAULT_REFRESH_INTERVAL, incremental=False,
+                 **fetch_options):
+        self.connection_params = connection_params
+        self.databases = split_databases(connection_params['database'])
+        self.included_schemas = included_schemas
+        self.excluded_schemas = excluded_schemas
+        self.primary_key_hints = primary_key_hints
+        self.visualization_params = visualization_params
+        self.relationship_rules = relationship_rules
+        self.refresh_interval = refresh_interval
+        self.incremental = incremental
+        self.fetch_options = fetch_options
+        self.snapshot = None
+        self.last_error = None
+        self.pool = self.open_pool()
+        self._refresh_lock = threading.Lock()
+        self._rendered = OrderedDict()
+        self._rendered_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._scheduler = None
+
+    def open_pool(self):
+        # Keep idle sessions from expiring between scheduled refreshes
+        connection_params = dict(self.connection_params, database=self.databases[0], client_session_keep_alive=True)
+        if self.fetch_options.get('query_mode') == 'show' and not connection_params.get('warehouse'):
+            connection_params.pop('warehouse', None)
+        return ConnectionPool(connection_params, size=max(1, self.fetch_options.get('workers', 1)))
+
+    def refresh(self):
+        """
+        Extracts the catalog and swaps it in, returning the new snapshot. If a refresh is already running,
+        waits for it and returns its snapshot instead of extracting again. On failure, the previous snapshot
+        is kept, the error is recorded in `last_error` and the pool is reopened so the next refresh logs in afresh.
+        """
+        started_generation = self.snapshot.generation if self.snapshot else 0
+        with self._refresh_lock:
+            current = self.snapshot
+            if current is not None and current.generation > started_generation:
+                return current
+            start = time.perf_counter()
+            previous = current.data if self.incremental and current is not None else None
+            try:
+                with metrics.stage('service.refresh'):
+                    data = fetch_data(self.connection_params, self.included_schemas, self.excluded_schemas, per_database=True,
+                                      previous=previous, pool=self.pool, **self.fetch_options)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.error(f"Catalog refresh failed, keeping the previous catalog: {self.last_error}")
+                self.pool.close()
+                self.pool = self.open_pool()
+                raise
+            self.snapshot = CatalogSnapshot(data, (current.generation if current else 0) + 1, time.time(), time.perf_counter() - start)
+            self.last_error = None
+            with self._rendered_lock:
+                self._rendered.clear()
+        logger.info(f"Refreshed catalog generation {self.snapshot.generation} in {self.snapshot.fetch_seconds:.2f}s")
+        return self.snapshot
+
+    def refresh_in_background(self):
+        """Starts a refresh on a separate thread unless one is running; returns whether one was started."""
+        if self._refresh_lock.locked():
+            return False
+        threading.Thread(target=self.refresh_quietly, name='snowflake-dbml-refresh', daemon=True).start()
+        return True
+
+    def refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            # Already logged and recorded by `refresh`
+            pass
+
+    def start(self):
+        """Runs the first refresh, then refreshes every `refresh_interval` seconds on a background thread."""
+        self.refresh()
+
+        def run():
+            while not self._stop.wait(self.refresh_interval):
+                self.refresh_quietly()
+
+        if self.refresh_interval:
+            self._scheduler = threading.Thread(target=run, name='snowflake-dbml-scheduler', daemon=True)
+            self._scheduler.start()
+
+    def close(self):
+        self._stop.set()
+        self.pool.close()
+
+    def render(self, database=None, schemas=None):
+        """
+        Returns the DBML for `database` (the first configured database by default), restricted to `schemas`
+        (a list or comma-separated string) when given. Rendered documents are reused until the next refresh.
+        Raises LookupError if no catalog has been extracted yet or the database isn't served.
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise LookupError("No catalog has been extracted yet.")
+        database = database or self.databases[0]
+        data = next((result for name, result in snapshot.data.items() if name.upper() == database.upper()), None)
+        if data is None:
+            raise LookupError(f"Database {database} is not served. Served databases: {', '.join(snapshot.data)}")
+        schemas = sorted(split_schemas(schemas) if isinstance(schemas, str) else schemas or [])
+
+        cache_key = (snapshot.generation, database.upper(), tuple(schema.upper() for schema in schemas))
+        with self._rendered_lock:
+            document = self._rendered.get(cache_key)
+            if document is not None:
+                self._rendered.move_to_end(cache_key)
+                return document
+
+        connection_params = dict(self.connection_params, database=database)
+        if schemas:
+            data = select_schemas(data, schemas)
+            connection_params['included_schemas'] = ','.join(schemas)
+        output = io.StringIO()
+        with metrics.stage('service.render'):
+            write_dbml(data, output, connection_params=connection_params, primary_key_hints=self.primary_key_hints,
+                       visualization_params=self.visualization_params, relationship_rules=self.relationship_rules)
+        document = output.getvalue()
+        with self._rendered_lock:
+            if snapshot is self.snapshot:
+                self._rendered[cache_key] = document
+                while len(self._rendered) > DEFAULT_RENDERED_DOCUMENTS:
+                    self._rendered.popitem(last=False)
+        return document
+
+    def status(self):
+        """Returns a JSON-able summary of the served catalog and the last refresh."""
+        snapshot = self.snapshot
+        status = {'refreshing': self._refresh_lock.locked(), 'last_error': self.last_error, 'generation': None}
+        if snapshot is not None:
+            status.update({
+                'generation': snapshot.generation,
+                'fetched_at': snapshot.fetched_at,
+                'age_seconds': round(time.time() - snapshot.fetched_at, 3),
+                'fetch_seconds': round(snapshot.fetch_seconds, 3),
+                'databases': {database: summarize_data(data) for database, data in snapshot.data.items()},
+            })
+        return status
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP interface of a `CatalogService` (set as `server.service`):
+
+        GET  /dbml?database=<database>&schemas=<schema,...>   DBML as text
+        GET  /status                                          catalog generation, age and counts as JSON
+        POST /refresh[?wait=1]                                start a refresh, or run it and wait
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        service = self.server.service
+        if url.path == '/dbml':
+            try:
+                document = service.render(params.get('database'), params.get('schemas'))
+            except LookupError as e:
+                self.send_text(503 if service.snapshot is None else 404, str(e))
+                return
+            self.send_text(200, document)
+        elif url.path == '/status':
+            self.send_json(200, service.status())
+        else:
+            self.send_text(404, f"Unknown path {url.path}. Use /dbml, /status or POST /refresh.")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        service = self.server.service
+        if url.path != '/refresh':
+            self.send_text(404, f"Unknown path {url.path}. Use POST /refresh.")
+            return
+        if params.get('wait') in ('1', 'true', 'yes'):
+            try:
+                service.refresh()
+            except Exception:
+                self.send_json(500, service.status())
+                return
+            self.send_json(200, service.status())
+        else:
+            started = service.refresh_in_background()
+            self.send_json(202, dict(service.status(), started=started))
+
+    def send_text(self, code, text, content_type='text/plain; charset=utf-8'):
+        body = text.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, code, payload):
+        self.send_text(code, json.dumps(payload, indent=2) + '\n', content_type='application/json')
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+
+def parse_address(address):
+    """Parses '[host:]port' (either part may be empty) into (host, port), defaulting to `DEFAULT_HOST` and `DEFAULT_PORT`."""
+    host, _, port = (address or '').rpartition(':')
+    try:
+        return host or DEFAULT_HOST, int(port) if port else DEFAULT_PORT
+    except ValueError:
+        raise ValueError(f"Invalid address {address}. Expected [host:]port, e.g. 127.0.0.1:{DEFAULT_PORT}")
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Returns a `ThreadingHTTPServer` serving `service`, one thread per request."""
+    server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Extracts the catalog, then serves it over HTTP until interrupted."""
+    service.start()
+    server = make_server(service, host, port)
+    logger.info(f"Serving DBML on http://{server.server_address[0]}:{server.server_address[1]}")
+    print(f"Serving DBML on http://{server.server_address[0]}:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
@@ -0,0 +1,285 @@
+# snowflake_dbml/sources.py
+"""
+Metadata sources: objects with a `fetch(included_schemas=None, excluded_schemas=None, stream=False)` method returning
+the structure `generate_dbml` consumes (a `fetch_data` dict, or a `Catalog` with `stream`).
+"""
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import time
+from operator import itemgetter
+
+from snowflake_dbml import metrics
+from snowflake_dbml.catalog import Catalog, ColumnRecord, TableRecord, TABLE_FIELDS
+from snowflake_dbml.extract import fetch_data, filter_keys, iter_partitions, join_tables_and_columns, split_schemas
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Export file names (without extension) in a `FileSource` directory, with accepted alternatives
+EXPORT_NAMES = {
+    'tables': ('tables',),
+    'columns': ('columns',),
+    'primary_keys': ('primary_keys',),
+    'foreign_keys': ('foreign_keys', 'imported_keys'),
+}
+EXPORT_EXTENSIONS = ('.parquet', '.csv', '.csv.gz', '.jsonl', '.jsonl.gz', '.ndjson', '.json', '.json.gz')
+COLUMN_EXPORT_FIELDS = ('TABLE_SCHEMA', 'TABLE_NAME', 'ORDINAL_POSITION', 'COLUMN_NAME', 'DATA_TYPE', 'COMMENT')
+# Exported INFORMATION_SCHEMA.TABLES names the table comment COMMENT
+TABLE_EXPORT_ALIASES = {'TABLE_COMMENT': 'COMMENT'}
+# `SHOW PRIMARY KEYS` / `SHOW IMPORTED KEYS` columns read from key exports
+PRIMARY_KEY_FIELDS = ('created_on', 'database_name', 'schema_name', 'table_name', 'column_name', 'key_sequence', 'constraint_name',
+                      'rely', 'comment')
+FOREIGN_KEY_FIELDS = ('created_on', 'pk_database_name', 'pk_schema_name', 'pk_table_name', 'pk_column_name',
+                      'fk_database_name', 'fk_schema_name', 'fk_table_name', 'fk_column_name', 'key_sequence',
+                      'update_rule', 'delete_rule', 'fk_name', 'pk_name', 'deferrability', 'rely', 'comment')
+INTEGER_FIELDS = frozenset(('ROW_COUNT', 'BYTES', 'ORDINAL_POSITION', 'key_sequence'))
+# `SnowflakeSource` options that also apply to fetching one schema partition at a time
+PARTITION_OPTIONS = ('batch_size', 'query_mode', 'scoped_keys', 'workers', 'async_queries')
+
+
+def export_format(path):
+    """Returns 'parquet', 'csv' or 'json' for an export file name."""
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    extension = os.path.splitext(name)[1]
+    if extension == '.parquet':
+        return 'parquet'
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.json', '.jsonl', '.ndjson'):
+        return 'json'
+    raise ValueError(f"Unsupported export file {path}. Expected one of: {', '.join(EXPORT_EXTENSIONS)}")
+
+
+def open_text(path):
+    return gzip.open(path, 'rt', encoding='utf-8', newline='') if path.endswith('.gz') else open(path, encoding='utf-8', newline='')
+
+
+def import_pyarrow(required_for=None):
+    """Returns the pyarrow module, or None if it isn't installed (raising instead when `required_for` names a feature)."""
+    try:
+        import pyarrow
+    except ImportError:
+        if required_for:
+            raise ImportError(f"{required_for} requires pyarrow: pip install 'snowflake-dbml-generator[arrow]'")
+        return None
+    return pyarrow
+
+
+def match_fields(names, fields):
+    """Maps each of `fields` to the matching name in `names`, compared case-insensitively, or None."""
+    by_key = {name.upper(): name for name in names}
+    return {field: by_key.get(field.upper()) for field in fields}
+
+
+def read_parquet(path, fields):
+    """Reads `fields` of a Parquet file column by column with pyarrow, reading no other columns."""
+    import_pyarrow('Reading Parquet exports')
+    import pyarrow.parquet as pq
+
+    matched = match_fields(pq.read_schema(path).names, fields)
+    table = pq.read_table(path, columns=sorted({name for name in matched.values() if name}))
+    return {field: table.column(name).to_pylist() if name else [None] * table.num_rows for field, name in matched.items()}
+
+
+def read_csv(path, fields):
+    """
+    Reads `fields` of a CSV file with a header row. Uses pyarrow's multithreaded reader when it is installed.
+    Values are read as strings (integers for `INTEGER_FIELDS`), with empty values as None.
+    """
+    with open_text(path) as f:
+        names = next(csv.reader(f), [])
+    matched = match_fields(names, fields)
+    present = {field: name for field, name in matched.items() if name}
+
+    pyarrow = import_pyarrow()
+    if pyarrow is not None:
+        import pyarrow.csv as pa_csv
+
+        column_types = {name: pyarrow.int64() if field in INTEGER_FIELDS else pyarrow.string() for field, name in present.items()}
+        table = pa_csv.read_csv(path, convert_options=pa_csv.ConvertOptions(
+            include_columns=list(present.values()), column_types=column_types, strings_can_be_null=True))
+        return {field: table.column(name).to_pylist() if name else [None] * table.num_rows for field, name in matched.items()}
+
+    with open_text(path) as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        rows = list(reader)
+    columns = {}
+    for field, name in matched.items():
+        if not name:
+            columns[field] = [None] * len(rows)
+            continue
+        values = map(itemgetter(names.index(name)), rows)
+        columns[field] = [int(value) if value else None for value in values] if field in INTEGER_FIELDS else [value or None for value in values]
+    return columns
+
+
+def read_json(path, fields):
+    """Reads `fields` of a JSON file holding an array of objects, or of a JSON Lines file with one object per line."""
+    with open_text(path) as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith('['):
+        rows = json.loads(text)
+    else:
+        rows = [json.loads(line) for line in io.StringIO(text) if line.strip()]
+    matched = match_fields(rows[0].keys() if rows else (), fields)
+    columns = {}
+    for field, name in matched.items():
+        values = [row.get(name) for row in rows] if name else [None] * len(rows)
+        if field in INTEGER_FIELDS:
+            values = [int(value) if isinstance(value, str) and value else value if value != '' else None for value in values]
+        columns[field] = values
+    return columns
+
+
+READERS = {'parquet': read_parquet, 'csv': read_csv, 'json': read_json}
+
+
+def read_export(path, fields):
+    """Reads an export file into {field: list of values} for `fields`, which are matched to its columns case-insensitively."""
+    start = time.perf_counter()
+    with metrics.stage('read.export', file=os.path.basename(path)) as read_stage:
+        columns = READERS[export_format(path)](path, fields)
+        read_stage.rows = len(next(iter(columns.values()), []))
+        read_stage.bytes = os.path.getsize(path)
+    logger.info(f"Read {read_stage.rows} rows from {path} in {time.perf_counter() - start:.2f}s")
+    return columns
+
+
+def export_rows(columns):
+    """Turns {field: values} into row dicts."""
+    fields = list(columns)
+    return [dict(zip(fields, values)) for values in zip(*columns.values())]
+
+
+class FileSource:
+    """
+    Metadata exported from Snowflake, read from local files instead of a live session.
+
+    `path` is a directory holding `tables` and `columns` exports of INFORMATION_SCHEMA.TABLES / COLUMNS and,
+    optionally, `primary_keys` and `foreign_keys` (or `imported_keys`) exports of `SHOW PRIMARY KEYS` /
+    `SHOW IMPORTED KEYS`, each as Parquet, CSV (with a header row) or JSON / JSON Lines, optionally gzipped.
+    Column names are matched case-insensitively. With `database`, rows of other databases (by TABLE_CATALOG or
+    database_name, where exported) are skipped, and exports holding none of its tables are rejected; otherwise
+    `database` is taken from the export when it holds one.
+    """
+
+    def __init__(self, path, database=None):
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"Metadata export directory {path} not found.")
+        self.path = path
+        self.database = database
+
+    def find_export(self, kind):
+        """Returns the path of the `kind` export (see `EXPORT_NAMES`), or None if there is none."""
+        for name in EXPORT_NAMES[kind]:
+            for extension in EXPORT_EXTENSIONS:
+                path = os.path.join(self.path, name + extension)
+                if os.path.exists(path):
+                    return path
+        return None
+
+    def fetch(self, included_schemas=None, excluded_schemas=None, stream=False):
+        """Reads the exports into a `fetch_data` dict, or a `Catalog` with `stream`, applying the schema filters."""
+        with metrics.stage('fetch', source='files'):
+            return self.read_exports(included_schemas, excluded_schemas, stream)
+
+    def read_exports(self, included_schemas=None, excluded_schemas=None, stream=False):
+        start = time.perf_counter()
+        tables_path, columns_path = self.find_export('tables'), self.find_export('columns')
+        if not tables_path or not columns_path:
+            raise FileNotFoundError(f"{self.path} needs tables and columns exports, named tables.<ext> and columns.<ext> "
+                                    f"with <ext> one of: {', '.join(EXPORT_EXTENSIONS)}")
+
+        tables = read_export(tables_path, TABLE_FIELDS + tuple(TABLE_EXPORT_ALIASES.values()) + ('TABLE_CATALOG',))
+        for field, alias in TABLE_EXPORT_ALIASES.items():
+            if all(value is None for value in tables[field]):
+                tables[field] = tables[alias]
+            del tables[alias]
+        columns = read_export(columns_path, COLUMN_EXPORT_FIELDS + ('TABLE_CATALOG',))
+
+        # TABLE_CATALOG stays in the rows until `filter_rows` has compared it with `database`
+        catalogs = {value for value in tables['TABLE_CATALOG'] if value is not None}
+        if self.database is None and len(catalogs) == 1:
+            self.database = next(iter(catalogs))
+        elif self.database is not None and catalogs and self.database not in catalogs:
+            raise ValueError(f"The exports in {self.path} hold no tables of database {self.database}; "
+                             f"they hold {', '.join(sorted(catalogs))}.")
+        table_rows = self.filter_rows(export_rows(tables), included_schemas, excluded_schemas)
+        column_rows = self.filter_rows(export_rows(columns), included_schemas, excluded_schemas)
+        for position, row in enumerate(column_rows):
+            # Exports without ordinal positions keep the file order
+            if row['ORDINAL_POSITION'] is None:
+                row['ORDINAL_POSITION'] = position
+        table_rows.sort(key=lambda row: (row['TABLE_SCHEMA'], row['TABLE_NAME']))
+        table_set = {(row['TABLE_SCHEMA'], row['TABLE_NAME']) for row in table_rows}
+
+        primary_keys = self.read_keys('primary_keys', PRIMARY_KEY_FIELDS, 'database_name')
+        foreign_keys = self.read_keys('foreign_keys', FOREIGN_KEY_FIELDS, 'fk_database_name')
+        primary_keys, foreign_keys = filter_keys(primary_keys, foreign_keys, table_set)
+
+        if stream:
+            data = Catalog()
+            for row in table_rows:
+                data.tables[(row['TABLE_SCHEMA'], row['TABLE_NAME'])] = TableRecord(**row)
+            column_rows.sort(key=lambda row: (row['TABLE_SCHEMA'], row['TABLE_NAME'], row['ORDINAL_POSITION']))
+            for row in column_rows:
+                table = data.tables.get((row['TABLE_SCHEMA'], row['TABLE_NAME']))
+                if table is not None and row['COLUMN_NAME'] is not None:
+                    table.columns.append(ColumnRecord(row['COLUMN_NAME'], row['DATA_TYPE'], row['COMMENT']))
+            data.primary_keys, data.foreign_keys = primary_keys, foreign_keys
+        else:
+            data = {'tables': join_tables_and_columns(table_rows, column_rows), 'primary_keys': primary_keys, 'foreign_keys': foreign_keys}
+
+        logger.info(f"Loaded {len(table_rows)} tables, {len(column_rows)} columns, {len(primary_keys)} primary key and "
+                    f"{len(foreign_keys)} foreign key rows from {self.path} in {time.perf_counter() - start:.2f}s")
+        return data
+
+    def filter_rows(self, rows, included_schemas=None, excluded_schemas=None):
+        """Keeps the rows of the included, non-excluded schemas (and of `database`), dropping TABLE_CATALOG."""
+        included = set(split_schemas(included_schemas))
+        excluded = set(split_schemas(excluded_schemas))
+        kept = []
+        for row in rows:
+            catalog = row.pop('TABLE_CATALOG', None)
+            if self.database and catalog is not None and catalog != self.database:
+                continue
+            if (included and row['TABLE_SCHEMA'] not in included) or row['TABLE_SCHEMA'] in excluded:
+                continue
+            kept.append(row)
+        return kept
+
+    def read_keys(self, kind, fields, database_field):
+        """Reads a key export into SHOW rows, or returns [] if there is none."""
+        path = self.find_export(kind)
+        if path is None:
+            logger.info(f"No {kind} export in {self.path}; continuing without {kind.replace('_', ' ')}.")
+            return []
+        rows = export_rows(read_export(path, fields))
+        if self.database:
+            rows = [row for row in rows if row[database_field] is None or row[database_field] == self.database]
+        return rows
+
+
+class SnowflakeSource:
+    """Metadata queried from a live Snowflake session with `fetch_data`; `options` are passed through to it."""
+
+    def __init__(self, connection_params, **options):
+        self.connection_params = connection_params
+        self.database = connection_params.get('database')
+        self.options = options
+
+    def fetch(self, included_schemas=None, excluded_schemas=None, stream=False):
+        return fetch_data(self.connection_params, included_schemas, excluded_schemas, stream=stream, **self.options)
+
+    def partitions(self, included_schemas=None, excluded_schemas=None, stream=False):
+        """Yields the metadata one schema partition at a time (see `iter_partitions`), so each can be released before the next."""
+        options = {name: value for name, value in self.options.items() if name in PARTITION_OPTIONS}
+        return iter_partitions(self.connection_params, included_schemas, excluded_schemas, stream=stream, **options)
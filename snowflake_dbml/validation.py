@@ -0,0 +1,242 @@
+# snowflake_dbml/validation.py
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from snowflake_dbml import metrics
+from snowflake_dbml.extract import dict_cursor, quote_identifier, split_databases
+from snowflake_dbml.model import column_location, iter_tables
+from snowflake_dbml.pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+VALIDATION_METHODS = ('containment', 'approximate')
+VALIDATION_ACTIONS = ('drop', 'annotate')
+DEFAULT_VALIDATION_BATCH_SIZE = 50  # candidate relationships checked per query
+DEFAULT_VALIDATION_SAMPLE_SIZE = 10000  # distinct referencing values checked per relationship with 'containment'
+DEFAULT_VALIDATION_WORKERS = 4
+# Missing values tolerated, as a fraction of the values checked
+DEFAULT_TOLERANCES = {'containment': 0.01, 'approximate': 0.05}
+APPROXIMATE_ERROR = 0.016  # typical relative error of APPROX_COUNT_DISTINCT
+
+
+class ValidationResult:
+    """
+    The outcome of validating one candidate relationship: 'passed', 'failed', 'error', 'skipped' (budget) or
+    'inconclusive' (approximate counts too coarse to tell).
+    """
+    __slots__ = ('status', 'checked', 'missing', 'target', 'detail')
+
+    def __init__(self, status, checked=None, missing=None, target=None, detail=None):
+        self.status = status
+        self.checked = checked
+        self.missing = missing
+        self.target = target
+        self.detail = detail
+
+
+def key_expressions(columns, alias_prefix):
+    """Returns ("col" AS K0, ..., predicate that every column is set) for a list of column names."""
+    selected = ', '.join(f"{quote_identifier(name)} AS {alias_prefix}{position}" for position, name in enumerate(columns))
+    not_null = ' AND '.join(f"{quote_identifier(name)} IS NOT NULL" for name in columns)
+    return selected, not_null
+
+
+def build_containment_query(candidate, from_table, from_columns, to_table, to_columns, sample_size):
+    """
+    Query counting how many of up to `sample_size` distinct non-null referencing values are missing from the
+    referenced columns.
+    """
+    from_selected, from_not_null = key_expressions(from_columns, 'K')
+    to_selected, to_not_null = key_expressions(to_columns, 'K')
+    join = ' AND '.join(f"f.K{position} = t.K{position}" for position in range(len(from_columns)))
+    return (f"SELECT {candidate} AS CANDIDATE, COUNT(*) AS CHECKED, COUNT_IF(t.K0 IS NULL) AS MISSING, NULL AS TARGET "
+            f"FROM (SELECT DISTINCT {from_selected} FROM {from_table} WHERE {from_not_null} LIMIT {sample_size}) f "
+            f"LEFT JOIN (SELECT DISTINCT {to_selected} FROM {to_table} WHERE {to_not_null}) t ON {join}")
+
+
+def build_approximate_query(candidate, from_table, from_columns, to_table, to_columns):
+    """
+    Query estimating the distinct referencing values missing from the referenced columns as
+    |referencing ∪ referenced| - |referenced|, from HyperLogLog distinct counts, without a join.
+    """
+    from_hash = f"HASH({', '.join(quote_identifier(name) for name in from_columns)})"
+    to_hash = f"HASH({', '.join(quote_identifier(name) for name in to_columns)})"
+    _, from_not_null = key_expressions(from_columns, 'K')
+    _, to_not_null = key_expressions(to_columns, 'K')
+    return (f"SELECT {candidate} AS CANDIDATE, f.N AS CHECKED, GREATEST(u.N - t.N, 0) AS MISSING, t.N AS TARGET "
+            f"FROM (SELECT APPROX_COUNT_DISTINCT({from_hash}) AS N FROM {from_table} WHERE {from_not_null}) f, "
+            f"(SELECT APPROX_COUNT_DISTINCT({to_hash}) AS N FROM {to_table} WHERE {to_not_null}) t, "
+            f"(SELECT APPROX_COUNT_DISTINCT(K) AS N FROM (SELECT {from_hash} AS K FROM {from_table} WHERE {from_not_null} "
+            f"UNION ALL SELECT {to_hash} FROM {to_table} WHERE {to_not_null})) u")
+
+
+class RelationshipValidator:
+    """
+    Checks inferred relationships against the data, in batches of `batch_size` candidates per query.
+
+    With method 'containment', each candidate checks up to `sample_size` distinct referencing values against
+    the referenced columns exactly; with 'approximate', it compares HyperLogLog distinct counts, which scans
+    both tables once and never joins. Batches run concurrently on `workers` pooled connections. When
+    `budget_seconds` is set, batches not started by then are skipped and running ones are cut off by a query
+    timeout, since warehouse credits are billed by running time. Relationships that fail (more than `tolerance`
+    of the checked values missing) are dropped or, with `on_failure='annotate'`, kept with the result in their
+    comment; those that could not be checked are kept and annotated as such. Approximate counts carry an error
+    proportional to the referenced column's distinct count, so a candidate whose error exceeds the missing values
+    tolerated among its referencing values can't be decided and counts as not checked.
+
+    `data` is the `fetch_data` result being rendered, used to map the lowercased DBML table names back to
+    Snowflake identifiers in `connection_params['database']`. It may be None when results are rendered in parts,
+    each passed to `add_tables` as it is read.
+    """
+
+    def __init__(self, connection_params, data, method='containment', on_failure='drop', batch_size=DEFAULT_VALIDATION_BATCH_SIZE,
+                 sample_size=DEFAULT_VALIDATION_SAMPLE_SIZE, workers=DEFAULT_VALIDATION_WORKERS, budget_seconds=None, tolerance=None, pool=None):
+        if method not in VALIDATION_METHODS:
+            raise ValueError(f"Unknown validation method {method}. Expected one of: {', '.join(VALIDATION_METHODS)}")
+        if on_failure not in VALIDATION_ACTIONS:
+            raise ValueError(f"Unknown validation action {on_failure}. Expected one of: {', '.join(VALIDATION_ACTIONS)}")
+        databases = split_databases(connection_params.get('database'))
+        if len(databases) != 1:
+            raise ValueError("Relationship validation needs exactly one database.")
+        self.connection_params = connection_params
+        self.database = databases[0]
+        self.method = method
+        self.on_failure = on_failure
+        self.batch_size = max(1, batch_size)
+        self.sample_size = sample_size
+        self.workers = max(1, workers)
+        self.budget_seconds = budget_seconds
+        self.tolerance = DEFAULT_TOLERANCES[method] if tolerance is None else tolerance
+        self.pool = pool
+        self.tables = {}
+        self.batches = []
+        if data is not None:
+            self.add_tables(data)
+
+    def add_tables(self, data):
+        """Adds the tables of a `fetch_data` result to those relationships may name; returns `data`, to map over partitions."""
+        for table_row, _ in iter_tables(data):
+            self.tables[(table_row['TABLE_SCHEMA'].lower(), table_row['TABLE_NAME'].lower())] = (table_row['TABLE_SCHEMA'], table_row['TABLE_NAME'])
+        return data
+
+    def qualified_table(self, column):
+        schema, table = self.tables[column_location(column)]
+        return f"{quote_identifier(self.database)}.{quote_identifier(schema)}.{quote_identifier(table)}"
+
+    def candidate_query(self, candidate, from_columns, to_columns):
+        from_table, to_table = self.qualified_table(from_columns[0]), self.qualified_table(to_columns[0])
+        from_names, to_names = [column.name for column in from_columns], [column.name for column in to_columns]
+        if self.method == 'approximate':
+            return build_approximate_query(candidate, from_table, from_names, to_table, to_names)
+        return build_containment_query(candidate, from_table, from_names, to_table, to_names, self.sample_size)
+
+    def validate(self, relationships):
+        """
+        Validates (from_columns, to_columns, comment) relationships and returns the ones to render, in order,
+        with comments annotated as described on the class.
+        """
+        relationships = list(relationships)
+        if not relationships:
+            return relationships
+        start = time.perf_counter()
+
+        # Identical column pairs are checked once
+        candidates = {}
+        queries = []
+        results = {}
+        for from_columns, to_columns, _ in relationships:
+            key = self.candidate_key(from_columns, to_columns)
+            if key in candidates:
+                continue
+            candidates[key] = len(candidates)
+            try:
+                queries.append(self.candidate_query(candidates[key], from_columns, to_columns))
+            except KeyError:
+                results[candidates[key]] = ValidationResult('error', detail='table not found in the extracted metadata')
+                queries.append(None)
+        batches = [[(candidate, query) for candidate, query in enumerate(queries[offset:offset + self.batch_size], start=offset) if query]
+                   for offset in range(0, len(queries), self.batch_size)]
+        batches = [batch for batch in batches if batch]
+
+        deadline = time.monotonic() + self.budget_seconds if self.budget_seconds else None
+        pool = self.pool or ConnectionPool(self.connection_params, size=self.workers)
+        try:
+            with metrics.stage('validate', method=self.method) as stage, ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for batch_results in executor.map(lambda item: self.run_batch(pool, item[0], item[1], len(batches), deadline), enumerate(batches, start=1)):
+                    results.update(batch_results)
+                stage.objects = len(candidates)
+        finally:
+            if self.pool is None:
+                pool.close()
+
+        validated = []
+        counts = dict.fromkeys(('passed', 'failed', 'error', 'skipped', 'inconclusive'), 0)
+        for from_columns, to_columns, comment in relationships:
+            result = results.get(candidates[self.candidate_key(from_columns, to_columns)]) or ValidationResult('error', detail='no result')
+            counts[result.status] += 1
+            if result.status == 'passed':
+                validated.append((from_columns, to_columns, comment))
+            elif result.status == 'failed':
+                if self.on_failure == 'annotate':
+                    validated.append((from_columns, to_columns, f"{comment} {self.describe(result)}"))
+            else:
+                validated.append((from_columns, to_columns, f"{comment} {self.describe(result)}"))
+        logger.info(f"Validated {len(relationships)} inferred relationships ({len(candidates)} distinct) in {len(batches)} batches "
+                    f"in {time.perf_counter() - start:.2f}s: {counts['passed']} passed, {counts['failed']} failed "
+                    f"({'annotated' if self.on_failure == 'annotate' else 'dropped'}), {counts['error']} errors, {counts['skipped']} skipped, "
+                    f"{counts['inconclusive']} inconclusive.")
+        return validated
+
+    @staticmethod
+    def candidate_key(from_columns, to_columns):
+        return (tuple((column_location(column), column.name) for column in from_columns),
+                tuple((column_location(column), column.name) for column in to_columns))
+
+    def run_batch(self, pool, index, batch, batch_count, deadline):
+        """Runs one batch query; returns {candidate: ValidationResult} and records its timing in `batches`."""
+        if deadline is not None and time.monotonic() >= deadline:
+            self.batches.append({'batch': index, 'candidates': len(batch), 'seconds': 0.0, 'status': 'skipped'})
+            return {candidate: ValidationResult('skipped', detail='validation budget exhausted') for candidate, _ in batch}
+
+        sql = '\nUNION ALL\n'.join(f"({query})" for _, query in batch)
+        start = time.perf_counter()
+        try:
+            with metrics.stage('validate.batch', batch=index) as stage, pool.connection() as conn:
+                cursor = dict_cursor(conn)
+                timeout = max(1, int(deadline - time.monotonic())) if deadline is not None else None
+                cursor.execute(sql, timeout=timeout)
+                rows = cursor.fetchall()
+                stage.rows = len(rows)
+        except Exception as e:
+            seconds = time.perf_counter() - start
+            self.batches.append({'batch': index, 'candidates': len(batch), 'seconds': seconds, 'status': 'error'})
+            logger.warning(f"Validation batch {index}/{batch_count} of {len(batch)} relationships failed after {seconds:.2f}s: {e}")
+            return {candidate: ValidationResult('error', detail=str(e).split('\n')[0]) for candidate, _ in batch}
+
+        seconds = time.perf_counter() - start
+        results = {}
+        for row in rows:
+            results[row['CANDIDATE']] = self.judge(row['CHECKED'] or 0, row['MISSING'] or 0, row['TARGET'])
+        for candidate, _ in batch:
+            results.setdefault(candidate, ValidationResult('error', detail='no result row'))
+        failed = sum(result.status == 'failed' for result in results.values())
+        self.batches.append({'batch': index, 'candidates': len(batch), 'seconds': seconds, 'status': 'ok', 'failed': failed})
+        logger.info(f"Validation batch {index}/{batch_count}: {len(batch)} relationships in {seconds:.2f}s, {failed} failed.")
+        return results
+
+    def judge(self, checked, missing, target):
+        """Returns the `ValidationResult` for the counts of one candidate; `target` is only set by 'approximate'."""
+        allowed = self.tolerance * checked
+        if target and checked and APPROXIMATE_ERROR * target > allowed:
+            return ValidationResult('inconclusive', checked, missing, target,
+                                    detail=f"approximate counts over {target} referenced values are too coarse to check {checked} referencing values")
+        return ValidationResult('passed' if missing <= allowed else 'failed', checked, missing, target)
+
+    def describe(self, result):
+        """Returns the comment annotation for a relationship that failed or could not be checked."""
+        if result.status == 'failed':
+            values = 'distinct values (approximately)' if self.method == 'approximate' else 'sampled distinct values'
+            return f"Validation failed: {result.missing} of {result.checked} {values} not found in the referenced columns."
+        return f"Not validated: {result.detail}."
@@ -0,0 +1,339 @@
+# snowflake_dbml/writer.py
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+
+from snowflake_dbml import metrics
+from snowflake_dbml.catalog import Catalog
+from snowflake_dbml.config import load_config, load_primary_key_hints
+from snowflake_dbml.model import (
+    build_key_index, collect_references, generate_table_notes, iter_tables, key_rows, project_note_text,
+    resolve_visualization_params, table_header,
+)
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Single quotes and triple quotes are escaped in DBML notes, as pydbml does
+NOTE_QUOTE_PATTERN = re.compile(r"('''|')")
+# TableGroup names written unquoted; others, such as database-qualified schemas, are quoted
+PLAIN_NAME = re.compile(r'[A-Za-z0-9_]+')
+
+SHARD_INDEX_FILE = 'index.dbml'
+MAX_OPEN_SHARDS = 64  # shard files kept open while references are appended
+
+
+class WriterColumn:
+    """The name of a written column and the schema, name and DBML name of its table, kept for references."""
+    __slots__ = ('name', 'schema', 'table', 'table_name')
+
+    def __init__(self, name, schema, table, table_name):
+        self.name = name
+        self.schema = schema
+        self.table = table
+        self.table_name = table_name
+
+
+class WriterTable:
+    """The columns of a written table, in the shape `iter_inferred_relationships` expects."""
+    __slots__ = ('columns',)
+
+    def __init__(self):
+        self.columns = []
+
+
+def indent(text, spaces=4):
+    """Indents every line of `text`."""
+    if text == '':
+        return text
+    return ' ' * spaces + text.replace('\n', '\n' + ' ' * spaces)
+
+
+def dbml_table_name(schema, table_name):
+    """Returns the quoted DBML name of a table; tables in the `public` schema are written without it."""
+    if schema == 'public':
+        return f'"{table_name}"'
+    return f'"{schema}"."{table_name}"'
+
+
+def escape_note_text(text):
+    return NOTE_QUOTE_PATTERN.sub(r'\\\1', text)
+
+
+def format_note(text):
+    """Returns a `Note { ... }` block."""
+    text = escape_note_text(text)
+    note_text = f"'''\n{text}\n'''" if '\n' in text else f"'{text}'"
+    return f'Note {{\n{indent(note_text)}\n}}'
+
+
+def format_note_option(text):
+    """Returns a `note: '...'` column setting."""
+    text = escape_note_text(text)
+    return f"note: '''{text}'''" if '\n' in text else f"note: '{text}'"
+
+
+def format_comment(text):
+    return '\n'.join(f'// {line}' for line in text.split('\n')) + '\n'
+
+
+def format_project(name, note_text):
+    return f'Project "{name}" {{\n{indent(format_note(note_text))}\n}}'
+
+
+def format_column(name, data_type, pk=False, comment=None):
+    options = []
+    if pk:
+        options.append('pk')
+    if comment:
+        options.append(format_note_option(str(comment)))
+    result = f'"{name}" {data_type}'
+    if options:
+        result += f' [{", ".join(options)}]'
+    return result
+
+
+def format_table(name, header_color, note_text, column_lines):
+    result = f'Table {name} '
+    if header_color:
+        result += f'[headercolor: {header_color}] '
+    result += '{\n'
+    result += indent('\n'.join(column_lines)) + '\n'
+    if note_text:
+        result += indent(format_note(note_text)) + '\n'
+    return result + '}'
+
+
+def format_reference(from_columns, to_columns, comment):
+    """Returns a standalone many-to-one `Ref` between lists of `WriterColumn`s."""
+    def column_names(columns):
+        if len(columns) == 1:
+            return f'"{columns[0].name}"'
+        return '(' + ', '.join(f'"{column.name}"' for column in columns) + ')'
+
+    result = format_comment(comment) if comment else ''
+    return (result + 'Ref {\n    '
+            f'{from_columns[0].table_name}.{column_names(from_columns)} > {to_columns[0].table_name}.{column_names(to_columns)}'
+            '\n}')
+
+
+def table_group_name(name):
+    """Returns a schema name as a TableGroup name, quoted unless it is a plain DBML name."""
+    return name if PLAIN_NAME.fullmatch(name) else f'"{name}"'
+
+
+def format_table_group(name, table_names):
+    return f'TableGroup {table_group_name(name)} {{\n' + ''.join(f'    {table_name}\n' for table_name in table_names) + '}'
+
+
+def index_table(table_row, column_rows, tables, column_index):
+    """
+    Records the column names of one table in `tables` ({"schema.table": WriterTable}) and `column_index`
+    ({(schema, table, column): WriterColumn}), as references need them. Returns (schema, table name, DBML name).
+    """
+    schema = table_row['TABLE_SCHEMA'].lower()
+    table_name = table_row['TABLE_NAME'].lower()
+    name = dbml_table_name(schema, table_name)
+    table = WriterTable()
+    for row in column_rows:
+        if row['COLUMN_NAME'] is None:
+            continue
+        column = WriterColumn(row['COLUMN_NAME'], schema, table_name, name)
+        table.columns.append(column)
+        column_index.setdefault((schema, table_name, row['COLUMN_NAME']), column)
+    tables[f"{schema}.{table_name}"] = table
+    return schema, table_name, name
+
+
+def render_table(table_row, column_rows, primary_key_index, visualization_params):
+    """Returns the DBML `Table` block for one table row and its column rows."""
+    schema = table_row['TABLE_SCHEMA'].lower()
+    table_name = table_row['TABLE_NAME'].lower()
+    column_lines = [format_column(row['COLUMN_NAME'], row['DATA_TYPE'], (schema, table_name, row['COLUMN_NAME']) in primary_key_index, row.get('COMMENT'))
+                    for row in column_rows if row['COLUMN_NAME'] is not None]
+    table_color, emoji = table_header(table_row, visualization_params)
+    note_text = generate_table_notes(table_row, table_row['TABLE_TYPE'], emoji=emoji)
+    return format_table(dbml_table_name(schema, table_name), table_color, note_text, column_lines)
+
+
+def write_dbml(data, output, connection_params=None, primary_key_hints=None, visualization_params=None, changes=None,
+               validator=None, relationship_rules=None):
+    """
+    Writes the DBML representation of `data` to the text stream `output`, table by table.
+
+    Produces the same document as `generate_dbml` (newline-terminated, as `main` prints it) without
+    building a pydbml `Database` or the whole document as one string: each table is written as soon as
+    it is read, and only column names are kept for the foreign key and inferred references written after
+    the tables.
+    With `changes`, a `TableManifest`, only tables added or changed since the last run with the same manifest
+    key are written, with the references between them and a closing comment listing added, changed and
+    removed tables.
+    Relationships are also inferred from `relationship_rules` (`RelationshipRules`) when given, and inferred
+    relationships are checked against the data by `validator` (a `RelationshipValidator`) when given.
+    Returns the number of tables written.
+    """
+    start = time.perf_counter()
+    visualization_params = resolve_visualization_params(visualization_params)
+    primary_key_hints = primary_key_hints or load_primary_key_hints()
+    connection_params = connection_params or load_config()
+
+    primary_keys, foreign_key_rows = key_rows(data)
+    primary_key_index = build_key_index(primary_keys)
+    column_index = {}
+    tables = {}
+    table_groups = {}
+
+    output.write(format_project(connection_params['database'], project_note_text(connection_params)))
+
+    changed = {'added': [], 'changed': []}
+    written = set()
+    with metrics.stage('write.tables') as stage:
+        for table_row, column_rows in iter_tables(data):
+            schema, _, name = index_table(table_row, column_rows, tables, column_index)
+            if changes is not None:
+                status = changes.table_status(name, table_row, column_rows, primary_key_index, visualization_params)
+                if status == 'unchanged':
+                    continue
+                changed[status].append(name)
+            output.write('\n\n' + render_table(table_row, column_rows, primary_key_index, visualization_params))
+            table_groups.setdefault(schema, []).append(name)
+            written.add(name)
+        stage.objects = len(written)
+
+    reference_count = 0
+    with metrics.stage('write.references') as stage:
+        references = collect_references(foreign_key_rows, column_index, tables, primary_key_hints, validator, relationship_rules)
+        for from_columns, to_columns, comment in references:
+            if changes is not None and (from_columns[0].table_name not in written or to_columns[0].table_name not in written):
+                continue
+            output.write('\n\n' + format_reference(from_columns, to_columns, comment))
+            reference_count += 1
+        stage.objects = reference_count
+
+    for schema, table_names in table_groups.items():
+        output.write('\n\n' + format_table_group(schema, table_names))
+    if changes is not None:
+        removed = changes.removed_tables()
+        summary = [f"Changed since the last run: {len(changed['added'])} added, {len(changed['changed'])} changed, {len(removed)} removed"]
+        for label, names in (('Added', changed['added']), ('Changed', changed['changed']), ('Removed', removed)):
+            summary.extend(f"{label}: {name}" for name in names)
+        output.write('\n\n' + format_comment('\n'.join(summary)).rstrip('\n'))
+        logger.info(summary[0])
+    output.write('\n')
+
+    logger.info(f"Wrote DBML for {len(written)} tables and {reference_count} references ({references.candidates} relationships "
+                f"before merging duplicates) in {time.perf_counter() - start:.2f}s")
+    return len(written)
+
+
+def shard_file_name(schema, taken):
+    """
+    Returns the file name of a schema's shard, with characters unsafe in file names replaced, and adds it to `taken`
+    (lowercased names in use). Names already taken, compared case-insensitively as some file systems do, and
+    `SHARD_INDEX_FILE` get a numeric suffix instead.
+    """
+    base = re.sub(r'[^\w.-]', '_', schema)
+    name, suffix = base + '.dbml', 1
+    while name.lower() in taken or name.lower() == SHARD_INDEX_FILE:
+        suffix += 1
+        name = f"{base}_{suffix}.dbml"
+    taken.add(name.lower())
+    return name
+
+
+def render_shard(path, tables, primary_key_index, visualization_params):
+    """
+    Writes the tables of one shard file, the (table_row, column_rows) pairs in `tables`; its references and
+    table group are appended once all schemas are known. Returns the number of tables written.
+    """
+    with open(path, 'w') as f:
+        for table_row, column_rows in tables:
+            f.write(render_table(table_row, column_rows, primary_key_index, visualization_params) + '\n\n')
+    return len(tables)
+
+
+def write_shards(data, output_dir, connection_params=None, primary_key_hints=None, visualization_params=None, validator=None,
+                 relationship_rules=None):
+    """
+    Writes the DBML representation of `data` as one file per schema in `output_dir`, plus an index file.
+
+    `data` is a `fetch_data` result, or an iterable of them such as `iter_partitions` yields, each holding whole
+    schemas. Each part is rendered schema by schema and released before the next is read, so only column names
+    are kept across schemas and rendering memory is bounded by the largest part. Shards are rendered in-process,
+    as pickling a schema's rows for a worker process costs more than rendering them. Each shard holds a schema's
+    tables, the references between them and its table group. References are resolved once all schemas are read,
+    from column names only (with `relationship_rules` and, for inferred ones, `validator` when given); those
+    crossing schemas are written to `SHARD_INDEX_FILE` with the project.
+    Shard names that collide, or that would overwrite the index, get a numeric suffix.
+    Returns {schema: shard path}.
+    """
+    start = time.perf_counter()
+    visualization_params = resolve_visualization_params(visualization_params)
+    primary_key_hints = primary_key_hints or load_primary_key_hints()
+    connection_params = connection_params or load_config()
+    os.makedirs(output_dir, exist_ok=True)
+
+    foreign_key_rows = []
+    column_index = {}
+    tables = {}
+    table_names = {}
+    paths = {}
+    taken = set()
+    with metrics.stage('write.shards') as stage:
+        for part in ([data] if isinstance(data, (dict, Catalog)) else data):
+            primary_keys, part_foreign_keys = key_rows(part)
+            foreign_key_rows.extend(part_foreign_keys)
+            primary_key_index = {}
+            for key in build_key_index(primary_keys):
+                primary_key_index.setdefault(key[0], set()).add(key)
+
+            schema_tables = {}
+            for table_row, column_rows in iter_tables(part):
+                schema, _, name = index_table(table_row, column_rows, tables, column_index)
+                if schema not in schema_tables and schema in paths:
+                    raise ValueError(f"Schema {schema} appears in more than one part; each part must hold whole schemas.")
+                schema_tables.setdefault(schema, []).append((table_row, column_rows))
+                table_names.setdefault(schema, []).append(name)
+
+            for schema, shard_tables in schema_tables.items():
+                paths[schema] = os.path.join(output_dir, shard_file_name(schema, taken))
+                render_shard(paths[schema], shard_tables, primary_key_index.get(schema, set()), visualization_params)
+            # Released before the next part is fetched
+            part = schema_tables = shard_tables = None
+        stage.objects = len(tables)
+
+    # References are streamed into the shards and the index as they are merged, keeping a few shard files open
+    index_path = os.path.join(output_dir, SHARD_INDEX_FILE)
+    open_files = OrderedDict()
+    cross_schema_references = 0
+    with metrics.stage('write.references') as stage, open(index_path, 'w') as index:
+        index.write(format_comment('Schema shards:\n' + '\n'.join(f"{schema}: {os.path.basename(path)}" for schema, path in paths.items())))
+        index.write(format_project(connection_params['database'], project_note_text(connection_params)) + '\n')
+
+        def shard_file(schema):
+            f = open_files.pop(schema, None) or open(paths[schema], 'a')
+            open_files[schema] = f
+            if len(open_files) > MAX_OPEN_SHARDS:
+                open_files.popitem(last=False)[1].close()
+            return f
+
+        try:
+            references = collect_references(foreign_key_rows, column_index, tables, primary_key_hints, validator, relationship_rules)
+            for from_columns, to_columns, comment in references:
+                if from_columns[0].schema == to_columns[0].schema:
+                    shard_file(from_columns[0].schema).write(format_reference(from_columns, to_columns, comment) + '\n\n')
+                else:
+                    index.write('\n' + format_reference(from_columns, to_columns, comment) + '\n')
+                    cross_schema_references += 1
+            for schema in paths:
+                shard_file(schema).write(format_table_group(schema, table_names[schema]) + '\n')
+        finally:
+            for f in open_files.values():
+                f.close()
+        stage.objects = len(references)
+
+    logger.info(f"Wrote {len(paths)} schema shards with {len(tables)} tables and {cross_schema_references} cross-schema "
+                f"references to {output_dir} in {time.perf_counter() - start:.2f}s")
+    return paths